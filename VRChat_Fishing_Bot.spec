@@ -3,7 +3,7 @@ from PyInstaller.utils.hooks import collect_all
 
 datas = [('fishing_bot_settings.json', '.')]
 binaries = []
-hiddenimports = ['comtypes.stream', 'pycaw.pycaw', 'pycaw.utils', 'win32gui', 'win32con', 'win32api', 'win32process', 'pyaudio', 'numpy', 'tkinter']
+hiddenimports = ['comtypes.stream', 'pycaw.pycaw', 'pycaw.utils', 'win32gui', 'win32con', 'win32api', 'win32process', 'pyaudio', 'pyaudiowpatch', 'numpy', 'tkinter']
 tmp_ret = collect_all('pycaw')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('comtypes')
@@ -0,0 +1,54 @@
+import logging
+import queue
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Ротация файла лога: размер одного файла (байты) и число старых файлов
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# Сколько строк ждут вывода в GUI, если он не успевает их забирать
+PENDING_LIMIT = 1000
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def start_file_logging(path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """Запись лога в файл с ротацией в фоновом потоке
+
+    Потоки бота только кладут запись в очередь, запись на диск идёт в потоке
+    QueueListener. Возвращает listener, который нужно остановить при выходе.
+    """
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                       encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    logging.getLogger().addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
+
+
+class PendingLines:
+    """Строки лога, ожидающие вывода в GUI
+
+    append безопасен из любого потока; при переполнении теряются самые
+    старые строки, так что память ограничена, даже если GUI не читает.
+    """
+
+    def __init__(self, limit=PENDING_LIMIT):
+        self.lines = deque(maxlen=limit)
+
+    def append(self, line):
+        self.lines.append(line)
+
+    def drain(self):
+        """Все накопленные строки (вызывается из потока GUI)"""
+        lines = []
+        popleft = self.lines.popleft
+        try:
+            while True:
+                lines.append(popleft())
+        except IndexError:
+            pass
+        return lines
@@ -0,0 +1,369 @@
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from discovery import SESSION_RETRY_INTERVAL
+from fishing_machine import FishingStateMachine, TransitionFileLog, STATE_IDLE
+from supervisor import HEALTHY_RESET, INITIAL_BACKOFF, MAX_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorKeyInjector:
+    """Ввод через отдельный поток, чтобы цикл событий не ждал активацию окна
+
+    Операции выполняются строго по порядку в однопоточном executor.
+    Отпускание клавиши откладывается так, чтобы удержание длилось столько
+    же, сколько прошло между key_down и key_up в цикле событий, даже если
+    перед нажатием окно пришлось активировать.
+    """
+
+    def __init__(self, injector, executor):
+        self.injector = injector
+        self.executor = executor
+        self.clock = injector.clock
+        self.requested = {}  # vk -> момент вызова key_down
+        self.pressed = {}  # vk -> момент фактического нажатия
+
+    @property
+    def activations(self):
+        return self.injector.activations
+
+    @property
+    def foreground_hits(self):
+        return self.injector.foreground_hits
+
+    def submit(self, function, *args):
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(_log_input_error)
+        return future
+
+    def ensure_foreground(self, hwnd, wait=None):
+        # Вызывается в потоке ввода из activate_vrchat_window (AsyncFishingRuntime.activate_window),
+        # поэтому нажатия, отправленные после результата, идут за активацией
+        return self.injector.ensure_foreground(hwnd, wait)
+
+    def release_foreground(self):
+        self.submit(self.injector.release_foreground)
+
+    def key_down(self, vk_code):
+        self.requested[vk_code] = self.clock()
+        self.submit(self._key_down, vk_code)
+
+    def key_up(self, vk_code):
+        now = self.clock()
+        hold = now - self.requested.pop(vk_code, now)
+        self.submit(self._key_up, vk_code, hold)
+
+    def press(self, vk_code, duration=None):
+        self.submit(self.injector.press, vk_code, duration)
+
+    def _key_down(self, vk_code):
+        self.injector.key_down(vk_code)
+        self.pressed[vk_code] = self.clock()
+
+    def _key_up(self, vk_code, hold):
+        pressed_at = self.pressed.pop(vk_code, None)
+        if pressed_at is not None:
+            delay = pressed_at + hold - self.clock()
+            if delay > 0:
+                self.injector.sleep(delay)
+        self.injector.key_up(vk_code)
+
+
+def _log_input_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Ошибка эмуляции ввода: {future.exception()}")
+
+
+class AsyncFishingRuntime:
+    """Цикл рыбалки на asyncio: опрос громкости, детекция, автомат состояний и ввод в одном цикле событий
+
+    Пиковый индикатор (GetPeakValue) не блокирует и читается прямо в цикле
+    событий. Блокирующие вызовы (поиск и переподключение сессии, чтение
+    трейса в реальном времени, активация окна и нажатия) уходят в два
+    однопоточных executor: для звука и для ввода. Дедлайны опроса и
+    таймеры автомата планируются через loop.call_at. Остановка отменяет
+    главную задачу: клавиша отпускается, таймеры снимаются, поток ввода
+    дорабатывает очередь.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.loop = None
+        self.thread = None
+        self.started = threading.Event()
+        self.main_task = None
+        self.tasks = set()
+        self.machine = None
+        self.sample_seq = 0
+        self.inputs = {}  # Имя источника -> выдаёт ли он данные
+        self.timer_handle = None
+        self.timer_deadline = None
+        self.sleeping = None  # Future сна до дедлайна опроса
+        self.wake_handle = None
+        self.meter_executor = None
+        self.input_executor = None
+        self.pcm_executor = None
+
+    def start(self):
+        """Запуск цикла событий в отдельном потоке (GUI остаётся в главном)"""
+        self.thread = threading.Thread(target=asyncio.run, args=(self.main(),), name="asyncio", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        """Отмена главной задачи и ожидание завершения цикла событий"""
+        if self.started.wait(timeout) and self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.main_task.cancel)
+            except RuntimeError:
+                pass  # Цикл событий уже закрыт
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    @property
+    def input_ok(self):
+        return bool(self.inputs) and all(self.inputs.values())
+
+    def loop_time(self, deadline):
+        """Перевод дедлайна по часам бота во время цикла событий"""
+        return self.loop.time() + (deadline - self.bot.clock())
+
+    def spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.bot.log_message(f"Ошибка в цикле рыбалки: {task.exception()}")
+
+    def run_blocking(self, function, *args):
+        return self.loop.run_in_executor(self.meter_executor, function, *args)
+
+    async def main(self):
+        bot = self.bot
+        self.loop = asyncio.get_running_loop()
+        self.main_task = asyncio.current_task()
+        self.meter_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="meter")
+        self.input_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="input")
+        injector = bot.injector
+        bot.injector = ExecutorKeyInjector(injector, self.input_executor)
+
+        bot.bite_events = bot.events.subscribe()
+        machine = self.machine = bot.machine = FishingStateMachine(bot, bot.clock)
+        machine.activator = self.activate_window
+        machine.transition_listeners.extend(bot.transition_listeners)
+        # Смена фазы меняет частоту опроса - будим ожидание отсчёта
+        machine.transition_listeners.append(lambda *record: self.wake_sampler())
+        transition_log = None
+        if bot.transitions_file:
+            transition_log = TransitionFileLog(bot.transitions_file)
+            machine.transition_listeners.append(transition_log.write)
+
+        bot.log_message("Запущен цикл рыбалки (asyncio)")
+        self.started.set()
+        try:
+            self.inputs['audio'] = False
+            self.spawn(self.supervise("audio", self.monitor_audio))
+            if bot.bite_detector == "spectral":
+                self.inputs['spectral'] = False
+                self.pcm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pcm")
+                self.spawn(self.supervise("spectral", self.monitor_spectral))
+            # Работаем до отмены из stop()
+            await self.loop.create_future()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            tasks = list(self.tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.timer_handle is not None:
+                self.timer_handle.cancel()
+            machine.stop("остановка")
+            # Отпускание E должно дойти до игры до выхода
+            self.input_executor.shutdown(wait=True)
+            self.meter_executor.shutdown(wait=False)
+            if self.pcm_executor is not None:
+                self.pcm_executor.shutdown(wait=False)
+            bot.injector = injector
+            if transition_log is not None:
+                transition_log.close()
+            bot.bite_events.close()
+            bot.log_run_summary()
+            bot.log_message("Цикл рыбалки завершен")
+
+    # Автомат состояний
+
+    def feed(self, timers_due=False):
+        """Передача автомату новых событий и отсчётов, запуск и пауза цикла"""
+        bot = self.bot
+        machine = self.machine
+        if bot.paused or not self.input_ok:
+            if machine.state != STATE_IDLE:
+                machine.stop("пауза" if bot.paused else "нет данных о звуке")
+            bot.bite_events.clear()
+            self.sample_seq = bot.samples.count
+        else:
+            if machine.state == STATE_IDLE:
+                self.sample_seq = bot.samples.count
+                machine.start_cycle()
+            events = bot.bite_events.drain()
+            # При ожидании клева отсчёты автомату не нужны, достаточно событий
+            if events or timers_due or machine.needs_samples:
+                self.sample_seq = bot.feed_machine(machine, events, self.sample_seq)
+        self.schedule_timers()
+
+    def schedule_timers(self):
+        """Один call_at на ближайший таймер автомата"""
+        deadline = self.machine.timers.next_deadline()
+        if deadline == self.timer_deadline:
+            return
+        if self.timer_handle is not None:
+            self.timer_handle.cancel()
+            self.timer_handle = None
+        self.timer_deadline = deadline
+        if deadline is not None:
+            self.timer_handle = self.loop.call_at(self.loop_time(deadline), self.on_timer)
+
+    def activate_window(self, wait, callback):
+        """Поиск и активация окна в потоке ввода, результат передаётся автомату в цикле событий"""
+        future = self.loop.run_in_executor(self.input_executor, self.bot.activate_vrchat_window, wait)
+        future.add_done_callback(lambda done: self.activated(done, callback))
+
+    def activated(self, future, callback):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.bot.log_message(f"Ошибка активации окна VRChat: {future.exception()}")
+            callback(False)
+        else:
+            callback(future.result())
+        self.schedule_timers()
+
+    def on_timer(self):
+        self.timer_handle = None
+        self.timer_deadline = None
+        self.feed(timers_due=True)
+
+    # Опрос громкости
+
+    def sleep_until(self, deadline):
+        """Сон до дедлайна опроса; wake_sampler прерывает его досрочно"""
+        self.sleeping = self.loop.create_future()
+        self.wake_handle = self.loop.call_at(self.loop_time(deadline), _resolve, self.sleeping)
+        return self.sleeping
+
+    def wake_sampler(self):
+        if self.sleeping is not None and not self.sleeping.done():
+            self.wake_handle.cancel()
+            self.sleeping.set_result(None)
+
+    async def supervise(self, name, monitor):
+        """Перезапуск источника данных с нарастающей задержкой, как у Supervisor"""
+        backoff = INITIAL_BACKOFF
+        while True:
+            started = self.bot.clock()
+            if await monitor():
+                return
+            self.inputs[name] = False
+            self.feed()
+            if self.bot.clock() - started >= HEALTHY_RESET:
+                backoff = INITIAL_BACKOFF
+            self.bot.log_message(f"Поток {name} остановился, перезапуск через {backoff:.1f}с")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    async def monitor_audio(self):
+        """Опрос источника громкости, возвращает False при сбое"""
+        bot = self.bot
+        source = await self.run_blocking(bot.create_meter_source)
+        if source is None:
+            bot.log_message("Аудио сессия VRChat не найдена!")
+            return False
+
+        bot.log_message("Запущен мониторинг аудио из VRChat")
+        detector = bot.create_detector()
+        self.inputs['audio'] = True
+        try:
+            while True:
+                if source.is_live:
+                    # Ждём следующий дедлайн, частота зависит от фазы цикла
+                    now = bot.clock()
+                    deadline = bot.sampler.deadline(now)
+                    if deadline > now:
+                        await self.sleep_until(deadline)
+                        continue
+                    bot.sampler.tick(now)
+
+                try:
+                    # Трейс в реальном времени спит внутри read - только через executor
+                    sample = source.read() if source.is_live else await self.run_blocking(source.read)
+                except Exception as e:
+                    if not source.is_live or bot.discovery is None:
+                        bot.log_message(f"Ошибка чтения аудио: {e}")
+                        return False
+                    # Игра перезапущена или сессия пересоздана: ждём и переподключаемся
+                    bot.log_message(f"Аудио сессия VRChat потеряна: {e}")
+                    self.inputs['audio'] = False
+                    self.feed()
+                    if not await self.rebind(source):
+                        return False
+                    self.inputs['audio'] = True
+                    continue
+
+                if sample is None:
+                    bot.log_message("Источник аудио исчерпан")
+                    self.inputs['audio'] = False
+                    self.feed()
+                    return True
+
+                bot.process_sample(detector, *sample)
+                self.feed()
+        finally:
+            self.inputs['audio'] = False
+            self.meter_executor.submit(source.close)
+            bot.log_message("Мониторинг аудио остановлен")
+
+    async def rebind(self, source):
+        binding = await self.run_blocking(self.bot.discovery.session_lost)
+        while True:
+            result = await self.run_blocking(self.bot.try_rebind_audio_source, source, binding)
+            if result is not None:
+                return result
+            await asyncio.sleep(SESSION_RETRY_INTERVAL)
+            binding = await self.run_blocking(self.bot.discovery.ensure_bound)
+
+    async def monitor_spectral(self):
+        """Спектральный детектор по PCM потоку, возвращает False при сбое"""
+        bot = self.bot
+        try:
+            source, detector = await self.loop.run_in_executor(self.pcm_executor, bot.create_spectral_detector)
+        except Exception as e:
+            bot.log_message(f"Ошибка инициализации спектрального детектора: {e}")
+            return False
+
+        bot.log_message("Запущен спектральный детектор клева")
+        self.inputs['spectral'] = True
+        try:
+            while True:
+                try:
+                    chunk = await self.loop.run_in_executor(self.pcm_executor, source.read)
+                    bot.publish_spectral_matches(detector.process(chunk))
+                except Exception as e:
+                    bot.log_message(f"Ошибка спектрального анализа: {e}")
+                    return False
+                self.feed()
+        finally:
+            self.inputs['spectral'] = False
+            self.pcm_executor.submit(source.close)
+            bot.log_message("Спектральный детектор остановлен")
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,162 @@
+import ctypes
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AudioMeterSource:
+    """Базовый источник пиковых значений громкости"""
+
+    # Живой источник нужно опрашивать с заданной частотой,
+    # записанный трейс сам определяет темп воспроизведения
+    is_live = True
+
+    def read(self):
+        """Чтение одного отсчёта: (timestamp, peak) или None, если данные закончились
+
+        Многоканальные источники возвращают (timestamp, peak, channels) с пиками каналов.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождение ресурсов источника"""
+        pass
+
+    def rebind(self, session):
+        """Переключение на новую аудио сессию без остановки мониторинга
+
+        Возвращает True, если источник поддерживает переподключение.
+        """
+        return False
+
+
+class PycawMeterSource(AudioMeterSource):
+    """Пиковый индикатор аудио сессии VRChat через pycaw
+
+    При channels=True пики всех каналов читаются одним вызовом
+    GetChannelsPeakValues в заранее выделенный буфер, пик сессии - их
+    максимум. Если индикатор не отдаёт хотя бы два канала, используется
+    GetPeakValue.
+    """
+
+    def __init__(self, session, channels=False):
+        # Импорт здесь, чтобы трейсы можно было проигрывать без Windows
+        from pycaw.pycaw import IAudioMeterInformation
+
+        self.meter_interface = IAudioMeterInformation
+        self.channels = channels
+        self.channel_peaks = None  # Буфер c_float на все каналы
+        self.bind(session)
+
+    def bind(self, session):
+        self.session = session
+        self.meter = session._ctl.QueryInterface(self.meter_interface)
+        self.channel_peaks = None
+        if not self.channels:
+            return
+        try:
+            count = self.meter.GetMeteringChannelCount()
+            if count >= 2:
+                peaks = (ctypes.c_float * count)()
+                self.meter.GetChannelsPeakValues(count, peaks)
+                self.channel_peaks = peaks
+        except Exception as e:
+            logger.warning(f"Пики каналов недоступны, используется общий пик: {e}")
+
+    def read(self):
+        peaks = self.channel_peaks
+        if peaks is None:
+            return time.perf_counter(), self.meter.GetPeakValue()
+        self.meter.GetChannelsPeakValues(len(peaks), peaks)
+        channels = tuple(peaks)
+        return time.perf_counter(), max(channels), channels
+
+    def rebind(self, session):
+        self.bind(session)
+        return True
+
+
+class FakeChannelMeterSource(AudioMeterSource):
+    """Многоканальный источник для проверки без Windows
+
+    levels(timestamp) возвращает пики каналов (например, SimulatedGame.channel_levels).
+    """
+
+    def __init__(self, levels, clock=time.perf_counter):
+        self.levels = levels
+        self.clock = clock
+
+    def read(self):
+        now = self.clock()
+        channels = tuple(self.levels(now))
+        return now, max(channels), channels
+
+
+class TraceFileSource(AudioMeterSource):
+    """Воспроизведение записанного трейса (timestamp, peak)
+
+    При realtime=True отсчёты выдаются с исходными интервалами,
+    иначе - так быстро, как позволяет процессор.
+    """
+
+    is_live = False
+
+    def __init__(self, path, realtime=True):
+        self.path = path
+        self.realtime = realtime
+        self.timestamps, self.peaks = load_trace(path)
+        self.position = 0
+        self._start_wall = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def duration(self):
+        """Длительность трейса в секундах"""
+        if len(self.timestamps) < 2:
+            return 0.0
+        return float(self.timestamps[-1] - self.timestamps[0])
+
+    def read(self):
+        if self.position >= len(self.timestamps):
+            return None
+
+        timestamp = float(self.timestamps[self.position])
+        peak = float(self.peaks[self.position])
+        self.position += 1
+
+        if self.realtime:
+            now = time.perf_counter()
+            if self._start_wall is None:
+                self._start_wall = now - (timestamp - float(self.timestamps[0]))
+            delay = self._start_wall + (timestamp - float(self.timestamps[0])) - now
+            if delay > 0:
+                time.sleep(delay)
+
+        return timestamp, peak
+
+    def rewind(self):
+        """Возврат к началу трейса"""
+        self.position = 0
+        self._start_wall = None
+
+
+def load_trace(path):
+    """Загрузка трейса из CSV файла со столбцами timestamp,peak"""
+    data = np.loadtxt(path, delimiter=",", comments="#", dtype=np.float64, ndmin=2)
+    if data.size == 0:
+        return np.empty(0), np.empty(0)
+    if data.shape[1] < 2:
+        raise ValueError(f"Трейс {path} должен содержать столбцы timestamp,peak")
+    return data[:, 0].copy(), data[:, 1].copy()
+
+
+def save_trace(path, timestamps, peaks):
+    """Сохранение трейса в CSV файл"""
+    data = np.column_stack((np.asarray(timestamps, dtype=np.float64),
+                            np.asarray(peaks, dtype=np.float64)))
+    np.savetxt(path, data, delimiter=",", fmt="%.6f", header="timestamp,peak")
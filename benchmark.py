@@ -0,0 +1,289 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from audio_sources import TraceFileSource
+from detection import create_detector, run_detector
+from fishing_machine import REEL_TIMEOUT
+
+# Настройки детектора, участвующие в прогоне, и значения по умолчанию
+DEFAULT_SETTINGS = {
+    'audio_threshold': 0.05,
+    'music_threshold': 0.01,
+    'smoothing_alpha': 0.3,
+    'peak_detector': "ema",
+    'envelope_fast_time': 0.005,
+    'envelope_slow_time': 0.5,
+    'hysteresis_ratio': 0.5,
+    'onset_detection': True,
+    'spike_cooldown': 0.5,
+    'additional_wait': 1.5,
+    'min_reel_time': 5.0,
+    'spectral_similarity': 0.8,
+}
+
+# Окно сопоставления обнаружения с размеченным клевом (секунды)
+MATCH_BEFORE = 0.1
+MATCH_AFTER = 1.0
+
+
+def load_labels(path):
+    """Разметка записи: {"bites": [t, ...], "music": [[start, end], ...]}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    return {
+        'bites': sorted(float(t) for t in labels.get('bites', [])),
+        'music': sorted((float(s), float(e)) for s, e in labels.get('music', [])),
+    }
+
+
+def match_detections(detections, bites, music, before=MATCH_BEFORE, after=MATCH_AFTER):
+    """Сопоставление обнаружений с клевом
+
+    Обнаружения во время музыки подсечки не считаются ложными: в это время
+    бот уже держит E. Возвращает (задержки совпавших, число ложных).
+    """
+    latencies = []
+    false_positives = 0
+    matched = set()
+
+    for detection in detections:
+        if any(start <= detection <= end for start, end in music):
+            continue
+
+        hit = None
+        for index, bite in enumerate(bites):
+            if index not in matched and bite - before <= detection <= bite + after:
+                hit = index
+                break
+
+        if hit is None:
+            false_positives += 1
+        else:
+            matched.add(hit)
+            latencies.append(detection - bites[hit])
+
+    return latencies, false_positives
+
+
+def find_music_release(timestamps, smoothed, start, settings):
+    """Момент отпускания E по правилу автомата состояний для подсечки, начатой в start"""
+    threshold = settings['music_threshold']
+    listen_from = start + settings['min_reel_time']
+    mask = (timestamps >= listen_from) & (timestamps <= start + REEL_TIMEOUT)
+    times = timestamps[mask]
+    loud = smoothed[mask] > threshold
+    if not loud.any():
+        return None
+
+    # После первого громкого отсчёта ищем тишину длиной additional_wait
+    last_loud = None
+    for t, is_loud in zip(times, loud):
+        if is_loud:
+            last_loud = t
+        elif last_loud is not None and t - last_loud > settings['additional_wait']:
+            return float(t)
+    return None
+
+
+def run_trace(trace_path, labels, settings):
+    """Прогон одного трейса детектором по пиковой громкости"""
+    source = TraceFileSource(trace_path, realtime=False)
+    detector = create_detector(settings)
+
+    started = time.perf_counter()
+    timestamps, smoothed, detections = run_detector(source, detector)
+    elapsed = time.perf_counter() - started
+
+    latencies, false_positives = match_detections(detections, labels['bites'], labels['music'])
+
+    # Задержка определения конца музыки относительно разметки
+    music_latencies = []
+    for bite in labels['bites']:
+        music = next(((s, e) for s, e in labels['music'] if s >= bite - MATCH_BEFORE), None)
+        if music is None:
+            continue
+        release = find_music_release(timestamps, smoothed, bite, settings)
+        if release is not None:
+            music_latencies.append(release - music[1])
+
+    duration = float(timestamps[-1] - timestamps[0]) if len(timestamps) > 1 else 0.0
+    return {
+        'samples': int(len(timestamps)),
+        'duration': duration,
+        'elapsed': elapsed,
+        'bites': len(labels['bites']),
+        'detections': int(len(detections)),
+        'latencies': latencies,
+        'false_positives': false_positives,
+        'music_latencies': music_latencies,
+    }
+
+
+def run_recording(wav_path, labels, settings, templates):
+    """Прогон WAV записи спектральным детектором"""
+    from spectral import scan_wav
+
+    started = time.perf_counter()
+    events, duration = scan_wav(wav_path, templates, settings['spectral_similarity'])
+    elapsed = time.perf_counter() - started
+
+    detections = [t for t, name, _ in events if name == templates[0].name]
+    latencies, false_positives = match_detections(detections, labels['bites'], labels['music'])
+    return {
+        'samples': int(duration * templates[0].sample_rate),
+        'duration': duration,
+        'elapsed': elapsed,
+        'bites': len(labels['bites']),
+        'detections': len(detections),
+        'latencies': latencies,
+        'false_positives': false_positives,
+        'music_latencies': [],
+    }
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def summarize(results):
+    """Итоговые метрики по всем записям"""
+    latencies = [v for r in results for v in r['latencies']]
+    music_latencies = [v for r in results for v in r['music_latencies']]
+    true_positives = len(latencies)
+    false_positives = sum(r['false_positives'] for r in results)
+    bites = sum(r['bites'] for r in results)
+    duration = sum(r['duration'] for r in results)
+    elapsed = sum(r['elapsed'] for r in results)
+    samples = sum(r['samples'] for r in results)
+
+    return {
+        'precision': true_positives / (true_positives + false_positives) if true_positives + false_positives else None,
+        'recall': true_positives / bites if bites else None,
+        'latency_median_ms': _ms(percentile(latencies, 50)),
+        'latency_p95_ms': _ms(percentile(latencies, 95)),
+        'music_end_latency_median_ms': _ms(percentile(music_latencies, 50)),
+        'music_end_latency_p95_ms': _ms(percentile(music_latencies, 95)),
+        'false_positives_per_hour': false_positives / (duration / 3600) if duration else None,
+        'samples_per_second': samples / elapsed if elapsed else None,
+        'realtime_factor': duration / elapsed if elapsed else None,
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'bites': bites,
+        'duration_hours': duration / 3600,
+    }
+
+
+def _ms(value):
+    return None if value is None else value * 1000
+
+
+def find_dataset(directory):
+    """Пары (запись, разметка): запись .csv или .wav, разметка <имя>.json рядом"""
+    pairs = []
+    for labels_path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        base = labels_path[:-len('.json')]
+        for extension in ('.csv', '.wav'):
+            if os.path.exists(base + extension):
+                pairs.append((base + extension, labels_path))
+                break
+    return pairs
+
+
+def run_benchmark(directory, settings, templates=None):
+    """Прогон всех записей каталога, возвращает (итоги, результаты по записям)"""
+    per_recording = {}
+    for recording, labels_path in find_dataset(directory):
+        labels = load_labels(labels_path)
+        if recording.endswith('.wav'):
+            if not templates:
+                continue
+            result = run_recording(recording, labels, settings, templates)
+        else:
+            result = run_trace(recording, labels, settings)
+        per_recording[os.path.basename(recording)] = result
+    return summarize(list(per_recording.values())), per_recording
+
+
+def load_settings(path, overrides):
+    settings = dict(DEFAULT_SETTINGS)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        settings.update({k: v for k, v in stored.items() if k in DEFAULT_SETTINGS})
+    for override in overrides:
+        key, value = override.split('=', 1)
+        if key not in DEFAULT_SETTINGS:
+            raise ValueError(f"Неизвестная настройка: {key}")
+        default = DEFAULT_SETTINGS[key]
+        if isinstance(default, bool):
+            settings[key] = value.lower() in ("1", "true", "yes")
+        elif isinstance(default, str):
+            settings[key] = value
+        else:
+            settings[key] = float(value)
+    return settings
+
+
+def format_summary(summary):
+    lines = []
+    for key, value in summary.items():
+        if isinstance(value, float):
+            lines.append(f"  {key:<30} {value:.4f}")
+        else:
+            lines.append(f"  {key:<30} {value}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк детекции клева по размеченным записям")
+    parser.add_argument("dataset", help="Каталог с записями (.csv трейсы или .wav) и разметкой .json")
+    parser.add_argument("--settings", default=None, help="Файл настроек бота")
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        help="Переопределение настройки, например audio_threshold=0.04")
+    parser.add_argument("--template", action="append", default=[],
+                        help="Спектральные шаблоны .npz для .wav записей (первый - звук клева)")
+    parser.add_argument("-o", "--output", default="benchmark_result.json", help="Файл результата JSON")
+    parser.add_argument("--baseline", help="Результат предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings, args.overrides)
+    templates = None
+    if args.template:
+        from spectral import SpectralTemplate
+        templates = [SpectralTemplate.load(path) for path in args.template]
+
+    summary, per_recording = run_benchmark(args.dataset, settings, templates)
+
+    result = {
+        'settings': settings,
+        'summary': summary,
+        'recordings': {
+            name: {k: v for k, v in r.items() if k not in ('latencies', 'music_latencies')}
+            for name, r in per_recording.items()
+        },
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=4, ensure_ascii=False)
+
+    print(f"Записей: {len(per_recording)}")
+    print(format_summary(summary))
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['summary']
+        print("Изменение относительно базового прогона:")
+        for key, value in summary.items():
+            old = baseline.get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)):
+                print(f"  {key:<30} {old:.4f} -> {value:.4f} ({value - old:+.4f})")
+
+    print(f"Результат сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
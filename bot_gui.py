@@ -0,0 +1,460 @@
+import logging
+import tkinter as tk
+from collections import deque
+from tkinter import ttk, messagebox
+
+from activity_log import PendingLines
+
+logger = logging.getLogger(__name__)
+
+# Период кадра GUI (мс): статус, график и лог перерисовываются не чаще, чем раз в кадр,
+# независимо от частоты опроса и числа изменений состояния
+FRAME_INTERVAL_MS = 50
+# Лог выводится раз в несколько кадров, в окне хранится не больше LOG_MAX_LINES строк
+LOG_FLUSH_FRAMES = 4
+LOG_MAX_LINES = 500
+
+
+class FishingBotGUI:
+    """Графический интерфейс бота (необязательный, подключается к ядру как слушатель)"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.gui_sample_seq = 0  # Последний отрисованный отсчёт
+        self.pending_log = PendingLines()  # Строки лога из потоков бота
+        self.rendered_version = None  # Версия состояния бота, показанная на экране
+        self.frame = 0
+        self.ticking = False  # Запланирован ли следующий кадр
+        self.minimized = False
+        self.setup_gui()
+        bot.add_listener(self)
+    
+    def setup_gui(self):
+        """Создание графического интерфейса"""
+        self.root = tk.Tk()
+        self.root.title("VRChat Fishing Bot")
+        self.root.geometry("540x700")
+        self.root.resizable(False, False)
+        
+        # Главный фрейм
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Заголовок
+        title_label = ttk.Label(main_frame, text="VRChat Fishing Bot", 
+                               font=("Arial", 16, "bold"))
+        title_label.grid(row=0, column=0, columnspan=2, pady=(0, 20))
+        
+        # Настройки
+        settings_frame = ttk.LabelFrame(main_frame, text="Настройки", padding="10")
+        settings_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        # Время заброса
+        ttk.Label(settings_frame, text="Время заброса (сек):").grid(row=0, column=0, sticky=tk.W)
+        self.cast_duration_var = tk.DoubleVar(value=self.bot.cast_duration)
+        cast_spinbox = ttk.Spinbox(settings_frame, from_=0.1, to=2.0, increment=0.1, 
+                                  textvariable=self.cast_duration_var, width=10)
+        cast_spinbox.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Минимальное время подсечки
+        ttk.Label(settings_frame, text="Мин. время до музыки (сек):").grid(row=1, column=0, sticky=tk.W)
+        self.min_reel_time_var = tk.DoubleVar(value=self.bot.min_reel_time)
+        reel_spinbox = ttk.Spinbox(settings_frame, from_=5.0, to=30.0, increment=1.0, 
+                                  textvariable=self.min_reel_time_var, width=10)
+        reel_spinbox.grid(row=1, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Порог громкости для клева
+        ttk.Label(settings_frame, text="Порог клева:").grid(row=2, column=0, sticky=tk.W)
+        self.audio_threshold_var = tk.DoubleVar(value=self.bot.audio_threshold)
+        threshold_spinbox = ttk.Spinbox(settings_frame, from_=0.01, to=1.0, increment=0.01, 
+                                       textvariable=self.audio_threshold_var, width=10,
+                                       command=self.on_threshold_changed)
+        threshold_spinbox.grid(row=2, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Порог громкости для музыки
+        ttk.Label(settings_frame, text="Порог музыки:").grid(row=3, column=0, sticky=tk.W)
+        self.music_threshold_var = tk.DoubleVar(value=self.bot.music_threshold)
+        music_spinbox = ttk.Spinbox(settings_frame, from_=0.01, to=1.0, increment=0.01, 
+                                   textvariable=self.music_threshold_var, width=10)
+        music_spinbox.grid(row=3, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Дополнительное время после музыки
+        ttk.Label(settings_frame, text="Доп. время после музыки (сек):").grid(row=4, column=0, sticky=tk.W)
+        self.additional_wait_var = tk.DoubleVar(value=self.bot.additional_wait)
+        wait_spinbox = ttk.Spinbox(settings_frame, from_=1.0, to=15.0, increment=0.5, 
+                                  textvariable=self.additional_wait_var, width=10)
+        wait_spinbox.grid(row=4, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Пауза после заброса
+        ttk.Label(settings_frame, text="Пауза после заброса (сек):").grid(row=5, column=0, sticky=tk.W)
+        self.cooldown_after_cast_var = tk.DoubleVar(value=self.bot.cooldown_after_cast)
+        cooldown_spinbox = ttk.Spinbox(settings_frame, from_=0.0, to=15.0, increment=0.5, 
+                                      textvariable=self.cooldown_after_cast_var, width=10)
+        cooldown_spinbox.grid(row=5, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Интервал между звуками
+        ttk.Label(settings_frame, text="Интервал между звуками (сек):").grid(row=6, column=0, sticky=tk.W)
+        self.spike_cooldown_var = tk.DoubleVar(value=self.bot.spike_cooldown)
+        spike_spinbox = ttk.Spinbox(settings_frame, from_=0.1, to=2.0, increment=0.1, 
+                                   textvariable=self.spike_cooldown_var, width=10)
+        spike_spinbox.grid(row=6, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Сглаживание аудио
+        ttk.Label(settings_frame, text="Сглаживание аудио (0.1-0.9):").grid(row=7, column=0, sticky=tk.W)
+        self.smoothing_alpha_var = tk.DoubleVar(value=self.bot.smoothing_alpha)
+        smooth_spinbox = ttk.Spinbox(settings_frame, from_=0.1, to=0.9, increment=0.1, 
+                                    textvariable=self.smoothing_alpha_var, width=10)
+        smooth_spinbox.grid(row=7, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # Привязываем событие изменения
+        self.audio_threshold_var.trace_add('write', lambda *args: self.on_threshold_changed())
+        
+        # Кнопки управления
+        control_frame = ttk.Frame(main_frame)
+        control_frame.grid(row=2, column=0, columnspan=2, pady=10)
+        
+        self.start_button = ttk.Button(control_frame, text="Запустить бота", 
+                                      command=self.start_bot, style="Accent.TButton")
+        self.start_button.grid(row=0, column=0, padx=(0, 5))
+        
+        self.stop_button = ttk.Button(control_frame, text="Остановить бота", 
+                                     command=self.stop_bot, state="disabled")
+        self.stop_button.grid(row=0, column=1, padx=(5, 5))
+        
+        self.save_button = ttk.Button(control_frame, text="Сохранить настройки", 
+                                     command=self.save_settings_from_gui)
+        self.save_button.grid(row=0, column=2, padx=(5, 0))
+        
+        # Статус
+        self.status_var = tk.StringVar(value="Готов к запуску")
+        status_label = ttk.Label(main_frame, textvariable=self.status_var, 
+                                font=("Arial", 10, "italic"))
+        status_label.grid(row=3, column=0, columnspan=2, pady=10)
+        
+        # Визуализация громкости
+        volume_frame = ttk.LabelFrame(main_frame, text="Мониторинг звука", padding="10")
+        volume_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        
+        # Метка текущей громкости
+        volume_info_frame = ttk.Frame(volume_frame)
+        volume_info_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        
+        ttk.Label(volume_info_frame, text="Текущая громкость:").grid(row=0, column=0, sticky=tk.W)
+        self.current_volume_label = ttk.Label(volume_info_frame, text="0.000", 
+                                             font=("Arial", 10, "bold"), foreground="blue")
+        self.current_volume_label.grid(row=0, column=1, sticky=tk.W, padx=(10, 20))
+        
+        ttk.Label(volume_info_frame, text="Порог:").grid(row=0, column=2, sticky=tk.W)
+        self.threshold_label = ttk.Label(volume_info_frame, text="0.150", 
+                                        font=("Arial", 10, "bold"), foreground="red")
+        self.threshold_label.grid(row=0, column=3, sticky=tk.W, padx=(10, 20))
+        
+        ttk.Label(volume_info_frame, text="Срабатываний:").grid(row=0, column=4, sticky=tk.W)
+        self.detections_label = ttk.Label(volume_info_frame, text="0", font=("Arial", 10, "bold"))
+        self.detections_label.grid(row=0, column=5, sticky=tk.W, padx=(10, 0))
+        
+        # Canvas для визуализации
+        self.volume_canvas = tk.Canvas(volume_frame, height=60, bg="white", highlightthickness=1, 
+                                      highlightbackground="gray")
+        self.volume_canvas.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        # Метка статуса обнаружения
+        self.detection_label = ttk.Label(volume_frame, text="● Ожидание звука...", 
+                                        font=("Arial", 9), foreground="gray")
+        self.detection_label.grid(row=2, column=0, columnspan=2, pady=(5, 0))
+        
+        # Лог
+        log_frame = ttk.LabelFrame(main_frame, text="Лог активности", padding="5")
+        log_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        
+        self.log_text = tk.Text(log_frame, height=6, width=50, state="disabled")
+        scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self.log_text.yview)
+        self.log_text.configure(yscrollcommand=scrollbar.set)
+        
+        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        # Настройка весов для растягивания
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(5, weight=1)
+        log_frame.columnconfigure(0, weight=1)
+        log_frame.rowconfigure(0, weight=1)
+        volume_frame.columnconfigure(0, weight=1)
+        
+        # Переменные для визуализации
+        self.max_history = 100  # Храним последние 100 значений
+        self.volume_history = deque(maxlen=self.max_history)
+        self.create_volume_graph()
+    
+    def on_threshold_changed(self):
+        """Обработка изменения порога громкости"""
+        try:
+            self.bot.audio_threshold = self.audio_threshold_var.get()
+            self.threshold_label.config(text=f"{self.bot.audio_threshold:.3f}")
+        except Exception as e:
+            pass  # Игнорируем ошибки при инициализации
+    
+    def apply_settings_from_gui(self):
+        """Перенос настроек из полей GUI в бота"""
+        self.bot.cast_duration = self.cast_duration_var.get()
+        self.bot.min_reel_time = self.min_reel_time_var.get()
+        self.bot.audio_threshold = self.audio_threshold_var.get()
+        self.bot.music_threshold = self.music_threshold_var.get()
+        self.bot.additional_wait = self.additional_wait_var.get()
+        self.bot.cooldown_after_cast = self.cooldown_after_cast_var.get()
+        self.bot.spike_cooldown = self.spike_cooldown_var.get()
+        self.bot.smoothing_alpha = self.smoothing_alpha_var.get()
+    
+    def save_settings_from_gui(self):
+        """Сохранение настроек из GUI"""
+        try:
+            # Обновляем все настройки из GUI
+            self.apply_settings_from_gui()
+            
+            # Сохраняем в файл
+            self.bot.save_settings()
+            
+            self.bot.log_message("Настройки сохранены!")
+            messagebox.showinfo("Успех", "Настройки успешно сохранены!")
+        except Exception as e:
+            self.bot.log_message(f"Ошибка сохранения настроек: {e}")
+            messagebox.showerror("Ошибка", f"Не удалось сохранить настройки: {e}")
+    
+    def create_volume_graph(self):
+        """Создание элементов графика громкости (один раз, дальше они только двигаются)"""
+        canvas = self.volume_canvas
+        
+        # Порядок создания определяет порядок отрисовки
+        self.graph_grid = [canvas.create_line(0, 0, 0, 0, fill="#e0e0e0", width=1, state="hidden")
+                           for _ in range(11)]
+        self.graph_threshold_line = canvas.create_line(0, 0, 0, 0, fill="red", width=2,
+                                                       dash=(5, 3), state="hidden")
+        self.graph_threshold_text = canvas.create_text(0, 0, text="", anchor="e", fill="red",
+                                                       font=("Arial", 8), state="hidden")
+        self.graph_segments = [canvas.create_line(0, 0, 0, 0, fill="#3366ff", width=1,
+                                                  smooth=True, state="hidden")
+                               for _ in range(self.max_history - 1)]
+        self.graph_marker = canvas.create_oval(0, 0, 0, 0, fill="blue", outline="darkblue",
+                                               width=2, state="hidden")
+        
+        # Кэш отрисованного состояния, чтобы не трогать неизменившиеся элементы
+        self.graph_segment_above = [False] * len(self.graph_segments)
+        self.graph_visible_segments = 0
+        self.graph_size = None
+        self.graph_threshold = None
+        self.graph_detected = None
+    
+    def update_volume_visualization(self, volume):
+        """Обновление визуализации громкости"""
+        try:
+            canvas = self.volume_canvas
+            
+            # Обновляем метку текущей громкости
+            self.current_volume_label.config(text=f"{volume:.3f}")
+            
+            # Добавляем значение в историю
+            self.volume_history.append(volume)
+            
+            canvas_width = canvas.winfo_width()
+            canvas_height = canvas.winfo_height()
+            
+            if canvas_width <= 1:  # Canvas еще не отрисован
+                canvas_width = 480
+            if canvas_height <= 1:
+                canvas_height = 60
+            
+            # Сетка меняется только при изменении размера canvas
+            if self.graph_size != (canvas_width, canvas_height):
+                for i, line in enumerate(self.graph_grid):
+                    y = canvas_height - (i * canvas_height / 10)
+                    canvas.coords(line, 0, y, canvas_width, y)
+                    canvas.itemconfig(line, state="normal")
+                canvas.itemconfig(self.graph_marker, state="normal")
+                self.graph_size = (canvas_width, canvas_height)
+                self.graph_threshold = None
+            
+            # Линия порога - только при изменении порога
+            threshold = self.bot.effective_audio_threshold
+            if self.graph_threshold != threshold:
+                self.threshold_label.config(text=f"{threshold:.3f}")
+                threshold_y = canvas_height - (threshold * canvas_height)
+                canvas.coords(self.graph_threshold_line, 0, threshold_y, canvas_width, threshold_y)
+                canvas.coords(self.graph_threshold_text, canvas_width - 5, threshold_y - 10)
+                canvas.itemconfig(self.graph_threshold_text, text=f"Порог: {threshold:.2f}")
+                canvas.itemconfig(self.graph_threshold_line, state="normal")
+                canvas.itemconfig(self.graph_threshold_text, state="normal")
+                self.graph_threshold = threshold
+            
+            # График громкости: сдвигаем существующие отрезки
+            count = len(self.volume_history)
+            if count > 1:
+                step = canvas_width / (count - 1)
+                ys = [canvas_height - (min(vol, 1.0) * canvas_height) for vol in self.volume_history]
+                
+                for i in range(count - 1):
+                    segment = self.graph_segments[i]
+                    canvas.coords(segment, i * step, ys[i], (i + 1) * step, ys[i + 1])
+                    
+                    # Цвет зависит от того, превышает ли порог
+                    above = self.volume_history[i] > threshold
+                    if above != self.graph_segment_above[i]:
+                        if above:
+                            canvas.itemconfig(segment, fill="#00cc00", width=2)  # Зеленый, если выше порога
+                        else:
+                            canvas.itemconfig(segment, fill="#3366ff", width=1)  # Синий, если ниже
+                        self.graph_segment_above[i] = above
+                
+                for i in range(self.graph_visible_segments, count - 1):
+                    canvas.itemconfig(self.graph_segments[i], state="normal")
+                self.graph_visible_segments = max(self.graph_visible_segments, count - 1)
+            
+            # Текущее значение
+            current_y = canvas_height - (min(volume, 1.0) * canvas_height)
+            canvas.coords(self.graph_marker, canvas_width - 8, current_y - 4,
+                          canvas_width - 2, current_y + 4)
+            
+            # Обновляем статус обнаружения
+            detected = volume > threshold
+            if detected != self.graph_detected:
+                if detected:
+                    self.detection_label.config(text="● ЗВУК ОБНАРУЖЕН!", foreground="green")
+                    self.current_volume_label.config(foreground="green")
+                else:
+                    self.detection_label.config(text="● Ожидание звука...", foreground="gray")
+                    self.current_volume_label.config(foreground="blue")
+                self.graph_detected = detected
+                
+        except Exception as e:
+            logger.error(f"Ошибка визуализации: {e}")
+        
+    def start_bot(self):
+        """Запуск бота с настройками из GUI"""
+        self.apply_settings_from_gui()
+        
+        if not self.bot.start_bot():
+            messagebox.showerror("Ошибка", "VRChat не найден! Убедитесь, что игра запущена.")
+            return
+        
+        # Рисуем только отсчёты, пришедшие после запуска
+        self.gui_sample_seq = self.bot.samples.count
+    
+    def stop_bot(self):
+        """Остановка бота"""
+        self.bot.stop_bot()
+    
+    # Обработчики событий бота
+    
+    def on_log(self, timestamp, message):
+        """Добавление сообщения в лог (из любого потока, виджет обновляется в flush_log)"""
+        self.pending_log.append(f"{timestamp} - {message}\n")
+    
+    def flush_log(self):
+        """Вывод накопленных строк лога одной вставкой (вызывается из render_tick)"""
+        try:
+            lines = self.pending_log.drain()
+            if lines:
+                self.log_text.config(state="normal")
+                self.log_text.insert(tk.END, "".join(lines))
+                
+                # Старые строки удаляем, чтобы виджет не рос бесконечно
+                line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                if line_count > LOG_MAX_LINES:
+                    self.log_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+                
+                self.log_text.see(tk.END)
+                self.log_text.config(state="disabled")
+        except Exception as e:
+            logger.error(f"Ошибка вывода лога: {e}")
+    
+    def on_status(self, status):
+        """Строка статуса берётся из bot.state в render_tick, здесь ничего не делаем"""
+        pass
+    
+    def on_running_changed(self, running):
+        """Кнопки обновляются из bot.state в render_tick"""
+        pass
+    
+    def render_state(self):
+        """Отрисовка последнего снимка состояния бота, если он изменился"""
+        state = self.bot.state
+        if state.version == self.rendered_version:
+            return
+        self.rendered_version = state.version
+        
+        self.status_var.set(state.status)
+        self.detections_label.config(text=str(state.detections))
+        if state.running:
+            self.start_button.config(state="disabled")
+            self.stop_button.config(state="normal")
+        else:
+            self.start_button.config(state="normal")
+            self.stop_button.config(state="disabled")
+    
+    def render_tick(self):
+        """Один кадр GUI: состояние, график громкости и лог"""
+        if self.minimized:
+            # Свёрнутое окно не перерисовываем, тик возобновится в on_map
+            self.ticking = False
+            return
+        
+        try:
+            self.render_state()
+        except Exception as e:
+            logger.error(f"Ошибка отрисовки состояния: {e}")
+        
+        if self.bot.running:
+            self.process_audio_updates()
+        
+        if self.frame % LOG_FLUSH_FRAMES == 0:
+            self.flush_log()
+        self.frame += 1
+        
+        self.root.after(FRAME_INTERVAL_MS, self.render_tick)
+    
+    def start_ticking(self):
+        if not self.ticking:
+            self.ticking = True
+            self.render_tick()
+    
+    def on_unmap(self, event):
+        if event.widget is self.root:
+            self.minimized = True
+    
+    def on_map(self, event):
+        if event.widget is self.root and self.minimized:
+            self.minimized = False
+            # Пропущенные за время сворачивания отсчёты не рисуем
+            self.gui_sample_seq = self.bot.samples.count
+            self.start_ticking()
+    
+    def process_audio_updates(self):
+        """Отрисовка новых отсчётов громкости в главном потоке GUI"""
+        try:
+            # Отсчёты читаются из буфера без извлечения,
+            # события детектора обрабатываются в потоке бота
+            _, values, self.gui_sample_seq = self.bot.samples.read_since(self.gui_sample_seq)
+            
+            # Одна точка графика за период перерисовки: максимум новых отсчётов,
+            # чтобы короткие всплески не терялись при высокой частоте опроса
+            if len(values):
+                self.update_volume_visualization(float(values.max()))
+                    
+        except Exception as e:
+            logger.error(f"Ошибка обработки отсчётов: {e}")
+    
+    def run(self):
+        """Запуск приложения"""
+        self.bot.log_message("VRChat Fishing Bot готов к работе")
+        self.bot.log_message("Убедитесь, что VRChat запущен и находится в режиме рыбалки")
+        
+        # Обработка закрытия окна
+        def on_closing():
+            if self.bot.running:
+                self.bot.stop_bot()
+            self.root.destroy()
+        
+        self.root.protocol("WM_DELETE_WINDOW", on_closing)
+        self.root.bind("<Unmap>", self.on_unmap)
+        self.root.bind("<Map>", self.on_map)
+        self.start_ticking()
+        self.root.mainloop()
@@ -0,0 +1,35 @@
+import itertools
+
+
+class BotState:
+    """Последнее состояние бота для отображения
+
+    Потоки бота просто перезаписывают поля (присваивание атомарно под GIL),
+    без блокировок и без вызовов Tk. Каждое изменение получает новый номер
+    версии из itertools.count (next() тоже атомарен), так что отрисовка видит
+    только факт изменения и берёт последние значения, сколько бы обновлений
+    ни пришло между кадрами.
+    """
+
+    __slots__ = ("status", "running", "detections", "last_detection", "version", "_versions")
+
+    def __init__(self, status=""):
+        self._versions = itertools.count(1)
+        self.status = status
+        self.running = False
+        self.detections = 0  # Сколько раз детектор сработал
+        self.last_detection = None  # Громкость последнего срабатывания
+        self.version = 0
+
+    def set_status(self, status):
+        self.status = status
+        self.version = next(self._versions)
+
+    def set_running(self, running):
+        self.running = running
+        self.version = next(self._versions)
+
+    def add_detection(self, value):
+        self.last_detection = value
+        self.detections += 1
+        self.version = next(self._versions)
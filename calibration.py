@@ -0,0 +1,136 @@
+class P2Quantile:
+    """Потоковая оценка квантиля алгоритмом P² (Jain, Chlamtac) с памятью O(1)"""
+
+    __slots__ = ("q", "count", "heights", "positions", "desired", "increments")
+
+    def __init__(self, q):
+        self.q = q
+        self.reset()
+
+    def reset(self):
+        """Сброс оценки"""
+        q = self.q
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1.0, 1.0 + 2 * q, 1.0 + 4 * q, 3.0 + 2 * q, 5.0]
+        self.increments = [0.0, q / 2, q, (1 + q) / 2, 1.0]
+
+    def add(self, value):
+        """Добавление наблюдения"""
+        heights = self.heights
+        self.count += 1
+
+        # Первые пять наблюдений становятся начальными маркерами
+        if self.count <= 5:
+            heights.append(value)
+            if self.count == 5:
+                heights.sort()
+            return
+
+        positions = self.positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Корректировка трёх средних маркеров
+        for i in range(1, 4):
+            delta = self.desired[i] - positions[i]
+            if ((delta >= 1 and positions[i + 1] - positions[i] > 1)
+                    or (delta <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i])
+            / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1])
+            / (positions[i] - positions[i - 1]))
+
+    def _linear(self, i, step):
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+
+    def value(self):
+        """Текущая оценка квантиля или None, если наблюдений нет"""
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(int(self.q * len(ordered)), len(ordered) - 1)]
+        return self.heights[2]
+
+
+class ThresholdCalibrator:
+    """Калибровка порогов клева и музыки по уровню шума
+
+    Уровень шума - медиана сглаженной громкости за паузу после заброса
+    (медиана не реагирует на всплеск от падения поплавка). Пороги равны
+    уровню шума, умноженному на коэффициенты, и ограничены диапазоном
+    [ручное значение / band, ручное значение * band]. Окно достаточно,
+    если покрывает min_duration секунд: число отсчётов зависит от
+    частоты опроса и длины паузы.
+    """
+
+    def __init__(self, audio_factor=4.0, music_factor=2.0, band=4.0, min_duration=0.5, min_samples=5):
+        self.audio_factor = audio_factor
+        self.music_factor = music_factor
+        self.band = band
+        self.min_duration = min_duration
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        """Начало нового окна калибровки"""
+        # Новый объект вместо сброса: поток мониторинга может писать в старый
+        self.noise_floor = P2Quantile(0.5)
+        self.started = None
+        self.latest = None
+
+    def add(self, timestamp, volume):
+        """Добавление отсчёта сглаженной громкости"""
+        if self.started is None:
+            self.started = timestamp
+        self.latest = timestamp
+        self.noise_floor.add(volume)
+
+    @property
+    def duration(self):
+        """Сколько секунд покрывает текущее окно"""
+        if self.started is None:
+            return 0.0
+        return self.latest - self.started
+
+    def calibrate(self, manual_audio_threshold, manual_music_threshold):
+        """Пороги по текущему окну: (audio, music, noise_floor) или None, если данных мало"""
+        estimator = self.noise_floor
+        if estimator.count < self.min_samples or self.duration < self.min_duration:
+            return None
+
+        floor = estimator.value()
+        audio = self._clamp(floor * self.audio_factor, manual_audio_threshold)
+        music = self._clamp(floor * self.music_factor, manual_music_threshold)
+        return audio, music, floor
+
+    def _clamp(self, value, manual):
+        return min(max(value, manual / self.band), manual * self.band)
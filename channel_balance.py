@@ -0,0 +1,133 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Сколько отсчётов после срабатывания оценивается баланс (секунды, ~10 отсчётов при 200 Гц)
+BALANCE_WINDOW = 0.05
+# Подтверждённых клевов до первых отказов и сколько последних клевов помнить
+MIN_BITES = 3
+BALANCE_HISTORY = 30
+# Допуск к балансу клевов: не меньше tolerance и не меньше разброса прошлых клевов
+SPREAD_FACTOR = 3.0
+
+
+def channel_balance(channels):
+    """Баланс пары каналов (-1 - только левый, +1 - только правый) и громкость или None"""
+    left = channels[0]
+    right = channels[1]
+    total = left + right
+    if total <= 0:
+        return None
+    return (right - left) / total, total
+
+
+class ChannelBalance:
+    """Баланс каналов за окно и его разброс
+
+    Отсчёты взвешиваются квадратом громкости: баланс определяет звук
+    срабатывания, а не фон перед ним.
+    """
+
+    __slots__ = ("weight", "total", "total_sq")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.weight = 0.0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, channels):
+        result = channel_balance(channels)
+        if result is None:
+            return
+        balance, level = result
+        weight = level * level
+        self.weight += weight
+        self.total += weight * balance
+        self.total_sq += weight * balance * balance
+
+    @property
+    def mean(self):
+        return self.total / self.weight if self.weight else None
+
+    @property
+    def jitter(self):
+        if not self.weight:
+            return None
+        mean = self.total / self.weight
+        return math.sqrt(max(self.total_sq / self.weight - mean * mean, 0.0))
+
+
+class BalanceGate:
+    """Отсев звуков клева по балансу каналов
+
+    Поплавок слышен с одной стороны, поэтому баланс каналов у настоящих
+    клевов почти одинаков, а громкий игрок рядом звучит с другой стороны
+    или с меняющимся балансом. После срабатывания в ожидании клева баланс
+    оценивается за BALANCE_WINDOW; образец - медиана баланса последних
+    клевов, после которых рыба поймана (confirm). Пока образцов меньше
+    MIN_BITES, срабатывания проходят без задержки.
+    """
+
+    def __init__(self, tolerance=0.3, max_jitter=0.3, window=BALANCE_WINDOW,
+                 history=BALANCE_HISTORY, min_bites=MIN_BITES):
+        self.tolerance = tolerance
+        self.max_jitter = max_jitter
+        self.window = window
+        self.min_bites = min_bites
+        self.bites = deque(maxlen=history)
+        self.feature = ChannelBalance()
+        self.pending = None  # (время, громкость, момент обнаружения, удерживается) срабатывания в окне
+        self.candidate = None  # Баланс последнего пропущенного срабатывания
+        self.last = None  # (баланс, разброс) последнего оценённого срабатывания
+
+    @property
+    def ready(self):
+        return len(self.bites) >= self.min_bites
+
+    def begin(self, timestamp, value, wall_time):
+        """Срабатывание в ожидании клева, возвращает True, если событие удерживается до решения"""
+        hold = self.ready
+        self.pending = (timestamp, value, wall_time, hold)
+        self.feature.reset()
+        return hold
+
+    def add(self, timestamp, channels):
+        """Отсчёт каналов, возвращает удерживаемое срабатывание (время, громкость, момент, принято) по окончании окна"""
+        pending = self.pending
+        if pending is None:
+            return None
+        self.feature.add(channels)
+        if timestamp - pending[0] < self.window:
+            return None
+
+        self.pending = None
+        balance = self.feature.mean
+        jitter = self.feature.jitter
+        self.last = (balance, jitter)
+        accepted = balance is None or not self.ready or self.accepts(balance, jitter)
+        if accepted:
+            self.candidate = balance
+        if not pending[3]:
+            return None
+        return pending[0], pending[1], pending[2], accepted
+
+    def reference(self):
+        """Баланс клевов и допуск"""
+        bites = np.fromiter(self.bites, dtype=np.float64)
+        center = float(np.median(bites))
+        spread = float(np.median(np.abs(bites - center)))
+        return center, max(self.tolerance, SPREAD_FACTOR * spread)
+
+    def accepts(self, balance, jitter):
+        center, tolerance = self.reference()
+        return abs(balance - center) <= tolerance and jitter <= self.max_jitter
+
+    def confirm(self):
+        """Рыба поймана: баланс клева, с которого началась подсечка, становится образцом"""
+        if self.candidate is not None:
+            self.bites.append(self.candidate)
+            self.candidate = None
@@ -0,0 +1,213 @@
+import math
+
+import numpy as np
+
+# Порог тишины: ниже него сглаженное значение плавно затухает
+SILENCE_THRESHOLD = 0.001
+# Коэффициент затухания в тишине
+SILENCE_DECAY = 0.95
+# Интервал отсчётов, для которого заданы smoothing_alpha и SILENCE_DECAY (20 Гц)
+REFERENCE_INTERVAL = 0.05
+# Постоянные времени быстрой и медленной огибающих EnvelopeDetector (секунды)
+DEFAULT_FAST_TIME = 0.005
+DEFAULT_SLOW_TIME = 0.5
+
+
+class PeakDetector:
+    """Сглаживание пиковой громкости и обнаружение звука клева
+
+    Коэффициенты сглаживания и затухания пересчитываются по фактическому
+    интервалу между отсчётами, поэтому постоянная времени не зависит
+    от частоты опроса.
+    """
+
+    def __init__(self, smoothing_alpha=0.3, audio_threshold=0.05, spike_cooldown=0.5):
+        self.smoothing_alpha = smoothing_alpha
+        self.audio_threshold = audio_threshold
+        self.spike_cooldown = spike_cooldown
+        self.reset()
+
+    def reset(self):
+        """Сброс состояния детектора"""
+        self.smoothed_volume = 0.0
+        self.last_spike_time = float("-inf")
+        self.last_timestamp = None
+
+    def process(self, timestamp, peak_value):
+        """Обработка одного отсчёта, возвращает (smoothed_volume, detected)"""
+        # Интервал в долях опорного интервала 20 Гц
+        if self.last_timestamp is None or timestamp <= self.last_timestamp:
+            scale = 1.0
+        else:
+            scale = (timestamp - self.last_timestamp) / REFERENCE_INTERVAL
+        self.last_timestamp = timestamp
+
+        # Экспоненциальное сглаживание с настраиваемым коэффициентом
+        if peak_value > SILENCE_THRESHOLD:
+            keep = (1 - self.smoothing_alpha) ** scale
+            self.smoothed_volume = (1 - keep) * peak_value + keep * self.smoothed_volume
+        else:
+            self.smoothed_volume *= SILENCE_DECAY ** scale  # Медленное затухание
+
+        # Резкий скачок громкости с cooldown против дублирования
+        detected = False
+        if self.smoothed_volume > self.audio_threshold:
+            if timestamp - self.last_spike_time > self.spike_cooldown:
+                self.last_spike_time = timestamp
+                detected = True
+
+        return self.smoothed_volume, detected
+
+
+class EnvelopeFollower:
+    """Огибающая сигнала с постоянной времени time_constant (секунды)"""
+
+    __slots__ = ("time_constant", "value")
+
+    def __init__(self, time_constant):
+        self.time_constant = time_constant
+        self.value = 0.0
+
+    def process(self, value, dt):
+        if dt <= 0 or self.time_constant <= 0:
+            self.value = value
+        else:
+            self.value += (value - self.value) * (1.0 - math.exp(-dt / self.time_constant))
+        return self.value
+
+
+class Hysteresis:
+    """Гистерезис: срабатывание выше on_level, сброс только ниже on_level * off_ratio
+
+    process возвращает True только в момент срабатывания, так что шумное
+    плато около порога не даёт повторных событий.
+    """
+
+    __slots__ = ("on_level", "off_ratio", "active")
+
+    def __init__(self, on_level, off_ratio=0.5):
+        self.on_level = on_level
+        self.off_ratio = off_ratio
+        self.active = False
+
+    def process(self, value):
+        if self.active:
+            if value < self.on_level * self.off_ratio:
+                self.active = False
+            return False
+        if value > self.on_level:
+            self.active = True
+            return True
+        return False
+
+
+class Debounce:
+    """Не чаще одного события за min_interval секунд"""
+
+    __slots__ = ("min_interval", "last_time")
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.last_time = float("-inf")
+
+    def process(self, timestamp, triggered):
+        if triggered and timestamp - self.last_time > self.min_interval:
+            self.last_time = timestamp
+            return True
+        return False
+
+
+class EnvelopeDetector:
+    """Конвейер обнаружения клева: пик -> быстрая и медленная огибающие -> начало звука -> гистерезис -> debounce
+
+    Быстрая огибающая (единицы миллисекунд) поднимается за один-два
+    отсчёта и служит уровнем громкости для автомата цикла. При
+    onset=True срабатывание идёт по разности быстрой и медленной
+    огибающих: ровная музыка или шум не дают повторных событий, пока
+    громкость не вырастет снова. Каждый отсчёт - O(1).
+    """
+
+    __slots__ = ("fast", "slow", "hysteresis", "debounce", "onset", "last_timestamp")
+
+    def __init__(self, audio_threshold=0.05, spike_cooldown=0.5, fast_time=DEFAULT_FAST_TIME,
+                 slow_time=DEFAULT_SLOW_TIME, off_ratio=0.5, onset=True):
+        self.fast = EnvelopeFollower(fast_time)
+        self.slow = EnvelopeFollower(slow_time)
+        self.hysteresis = Hysteresis(audio_threshold, off_ratio)
+        self.debounce = Debounce(spike_cooldown)
+        self.onset = onset
+        self.last_timestamp = None
+
+    # Те же настройки, что у PeakDetector, меняются на ходу
+
+    @property
+    def audio_threshold(self):
+        return self.hysteresis.on_level
+
+    @audio_threshold.setter
+    def audio_threshold(self, value):
+        self.hysteresis.on_level = value
+
+    @property
+    def spike_cooldown(self):
+        return self.debounce.min_interval
+
+    @spike_cooldown.setter
+    def spike_cooldown(self, value):
+        self.debounce.min_interval = value
+
+    def reset(self):
+        self.fast.value = 0.0
+        self.slow.value = 0.0
+        self.hysteresis.active = False
+        self.debounce.last_time = float("-inf")
+        self.last_timestamp = None
+
+    def process(self, timestamp, peak_value):
+        """Обработка одного отсчёта, возвращает (громкость, detected)"""
+        if self.last_timestamp is None or timestamp <= self.last_timestamp:
+            dt = REFERENCE_INTERVAL
+        else:
+            dt = timestamp - self.last_timestamp
+        self.last_timestamp = timestamp
+
+        level = self.fast.process(peak_value, dt)
+        background = self.slow.process(peak_value, dt)
+        trigger = level - background if self.onset else level
+        detected = self.debounce.process(timestamp, self.hysteresis.process(trigger))
+        return level, detected
+
+
+def create_detector(settings):
+    """Детектор по пиковой громкости по настройкам (ключи как в fishing_bot_settings.json)"""
+    if settings.get('peak_detector', "ema") == "envelope":
+        return EnvelopeDetector(settings['audio_threshold'], settings['spike_cooldown'],
+                                settings.get('envelope_fast_time', DEFAULT_FAST_TIME),
+                                settings.get('envelope_slow_time', DEFAULT_SLOW_TIME),
+                                settings.get('hysteresis_ratio', 0.5),
+                                settings.get('onset_detection', True))
+    return PeakDetector(settings['smoothing_alpha'], settings['audio_threshold'], settings['spike_cooldown'])
+
+
+def run_detector(source, detector):
+    """Прогон источника через детектор до конца данных
+
+    Возвращает (timestamps, smoothed, detection_times) в виде массивов NumPy.
+    """
+    timestamps = []
+    smoothed = []
+    detections = []
+
+    while True:
+        sample = source.read()
+        if sample is None:
+            break
+        # Многоканальные источники добавляют пики каналов третьим элементом
+        timestamp, peak = sample[0], sample[1]
+        volume, detected = detector.process(timestamp, peak)
+        timestamps.append(timestamp)
+        smoothed.append(volume)
+        if detected:
+            detections.append(timestamp)
+
+    return np.asarray(timestamps), np.asarray(smoothed), np.asarray(detections)
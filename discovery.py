@@ -0,0 +1,306 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+VRCHAT_WINDOW_TITLE = "VRChat"
+# Как часто можно перебирать аудио сессии, пока сессия игры не появилась (секунды)
+SESSION_RETRY_INTERVAL = 1.0
+
+
+class WindowProvider:
+    """Доступ к окнам верхнего уровня"""
+
+    def find_by_title(self, title):
+        """Окно с точным заголовком или None"""
+        raise NotImplementedError
+
+    def find_containing(self, text):
+        """Первое окно, в заголовке которого есть text (без учёта регистра), или None"""
+        raise NotImplementedError
+
+    def find_all(self, text):
+        """Все окна, в заголовке которых есть text (без учёта регистра)"""
+        raise NotImplementedError
+
+    def is_window(self, hwnd):
+        raise NotImplementedError
+
+    def get_pid(self, hwnd):
+        raise NotImplementedError
+
+    def get_title(self, hwnd):
+        raise NotImplementedError
+
+
+class Win32WindowProvider(WindowProvider):
+    def __init__(self):
+        import win32gui
+        import win32process
+
+        self.win32gui = win32gui
+        self.win32process = win32process
+
+    def find_by_title(self, title):
+        return self.win32gui.FindWindow(None, title) or None
+
+    def find_containing(self, text):
+        results = self.find_all(text)
+        return results[0] if results else None
+
+    def find_all(self, text):
+        text = text.lower()
+        results = []
+
+        def enum_windows_callback(hwnd, results):
+            if text in self.win32gui.GetWindowText(hwnd).lower():
+                results.append(hwnd)
+
+        self.win32gui.EnumWindows(enum_windows_callback, results)
+        return results
+
+    def is_window(self, hwnd):
+        return bool(self.win32gui.IsWindow(hwnd))
+
+    def get_pid(self, hwnd):
+        _, process_id = self.win32process.GetWindowThreadProcessId(hwnd)
+        return process_id
+
+    def get_title(self, hwnd):
+        return self.win32gui.GetWindowText(hwnd)
+
+
+class SessionProvider:
+    """Доступ к аудио сессиям процессов"""
+
+    def find_session(self, pid):
+        """Аудио сессия процесса или None"""
+        raise NotImplementedError
+
+
+class PycawSessionProvider(SessionProvider):
+    def __init__(self):
+        from pycaw.pycaw import AudioUtilities
+
+        self.audio_utilities = AudioUtilities
+
+    def find_session(self, pid):
+        for session in self.audio_utilities.GetAllSessions():
+            if session.Process and session.Process.pid == pid:
+                return session
+        return None
+
+
+class FakeWindowProvider(WindowProvider):
+    """Окна в памяти: {hwnd: (title, pid)}"""
+
+    def __init__(self, windows=None):
+        self.windows = dict(windows or {})
+        self.enum_calls = 0
+
+    def find_by_title(self, title):
+        for hwnd, (window_title, _) in self.windows.items():
+            if window_title == title:
+                return hwnd
+        return None
+
+    def find_containing(self, text):
+        results = self.find_all(text)
+        return results[0] if results else None
+
+    def find_all(self, text):
+        self.enum_calls += 1
+        return [hwnd for hwnd, (window_title, _) in self.windows.items()
+                if text.lower() in window_title.lower()]
+
+    def is_window(self, hwnd):
+        return hwnd in self.windows
+
+    def get_pid(self, hwnd):
+        return self.windows[hwnd][1]
+
+    def get_title(self, hwnd):
+        return self.windows[hwnd][0]
+
+
+class FakeSessionProvider(SessionProvider):
+    """Аудио сессии в памяти: {pid: session}"""
+
+    def __init__(self, sessions=None):
+        self.sessions = dict(sessions or {})
+        self.lookups = 0
+
+    def find_session(self, pid):
+        self.lookups += 1
+        return self.sessions.get(pid)
+
+
+class Binding:
+    """Связка процесс -> окно -> аудио сессия"""
+
+    __slots__ = ("pid", "hwnd", "title", "session")
+
+    def __init__(self, pid, hwnd, title, session=None):
+        self.pid = pid
+        self.hwnd = hwnd
+        self.title = title
+        self.session = session
+
+
+class ClientClaims:
+    """Какой процесс VRChat каким сервисом поиска занят (несколько клиентов в одном процессе)
+
+    Каждый бот привязывается к своему клиенту: сервис поиска берёт первое
+    окно VRChat, процесс которого ещё не занят другим сервисом.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owners = {}  # pid -> DiscoveryService
+
+    def claim(self, pid, owner):
+        """Занять процесс, если он свободен или уже занят этим же владельцем"""
+        with self.lock:
+            current = self.owners.get(pid)
+            if current is not None and current is not owner:
+                return False
+            self.owners[pid] = owner
+            return True
+
+    def release(self, owner):
+        with self.lock:
+            for pid in [pid for pid, current in self.owners.items() if current is owner]:
+                del self.owners[pid]
+
+
+class DiscoveryService:
+    """Поиск окна и аудио сессии VRChat с кэшированием и переподключением
+
+    Найденная связка кэшируется; перед использованием проверяется только
+    IsWindow и PID окна. Полный поиск (FindWindow, перебор окон и сессий)
+    выполняется лишь при потере окна или сессии. Считает число
+    переподключений и суммарное время без связки. С общим ClientClaims
+    несколько сервисов делят окна VRChat так, что каждый получает свой клиент.
+    Вызывается из потока аудио и потока цикла, поэтому состояние под замком.
+    """
+
+    def __init__(self, windows, sessions, title=VRCHAT_WINDOW_TITLE, clock=time.perf_counter, claims=None):
+        self.windows = windows
+        self.sessions = sessions
+        self.title = title
+        self.clock = clock
+        self.claims = claims
+        self.lock = threading.Lock()
+        self.binding = None
+        self.rebinds = 0
+        self.downtime = 0.0  # Суммарное время без связки (секунды)
+        self.lost_at = None  # Момент потери связки
+        self.last_session_lookup = None
+
+    def discover(self):
+        """Полный поиск окна и сессии, возвращает Binding или None"""
+        if self.claims is not None:
+            return self._discover_unclaimed()
+
+        hwnd = self.windows.find_by_title(self.title)
+        if not hwnd:
+            # Если не найдено, попробуем найти по частичному совпадению
+            hwnd = self.windows.find_containing(self.title)
+            if not hwnd:
+                return None
+
+        pid = self.windows.get_pid(hwnd)
+        binding = Binding(pid, hwnd, self.windows.get_title(hwnd))
+        binding.session = self._lookup_session(pid)
+        return binding
+
+    def _discover_unclaimed(self):
+        """Первое окно VRChat, процесс которого не занят другим ботом"""
+        self.claims.release(self)
+        for hwnd in self.windows.find_all(self.title):
+            pid = self.windows.get_pid(hwnd)
+            if self.claims.claim(pid, self):
+                break
+        else:
+            return None
+
+        binding = Binding(pid, hwnd, self.windows.get_title(hwnd))
+        binding.session = self._lookup_session(pid)
+        return binding
+
+    def _lookup_session(self, pid):
+        self.last_session_lookup = self.clock()
+        return self.sessions.find_session(pid)
+
+    def is_valid(self):
+        """Дешёвая проверка кэша: окно существует и принадлежит тому же процессу"""
+        binding = self.binding
+        if binding is None:
+            return False
+        try:
+            return self.windows.is_window(binding.hwnd) and self.windows.get_pid(binding.hwnd) == binding.pid
+        except Exception:
+            return False
+
+    def ensure_bound(self):
+        """Актуальная связка (с переподключением при необходимости) или None
+
+        Связка без аудио сессии тоже возвращается: окно уже можно
+        активировать, а сессия ищется повторно не чаще SESSION_RETRY_INTERVAL.
+        """
+        with self.lock:
+            return self._ensure_bound()
+
+    def _ensure_bound(self):
+        if self.is_valid():
+            binding = self.binding
+            if binding.session is None:
+                self._retry_session(binding)
+        else:
+            self._mark_lost()
+            binding = self.discover()
+            if binding is None:
+                return None
+            self.binding = binding
+
+        if binding.session is not None:
+            self._mark_bound(binding)
+        return binding
+
+    def session_lost(self):
+        """Сессия перестала отвечать: ищем новую сессию того же процесса или новое окно"""
+        with self.lock:
+            self._mark_lost()
+            if self.binding is not None:
+                self.binding.session = None
+                self.last_session_lookup = None  # Повторный поиск сразу
+            return self._ensure_bound()
+
+    def _retry_session(self, binding):
+        now = self.clock()
+        if self.last_session_lookup is None or now - self.last_session_lookup >= SESSION_RETRY_INTERVAL:
+            binding.session = self._lookup_session(binding.pid)
+
+    def _mark_lost(self):
+        if self.lost_at is None and self.binding is not None:
+            self.lost_at = self.clock()
+
+    def _mark_bound(self, binding):
+        self.binding = binding
+        if self.lost_at is not None:
+            self.downtime += self.clock() - self.lost_at
+            self.lost_at = None
+            self.rebinds += 1
+
+    def stats(self):
+        """Число переподключений и время без связки"""
+        with self.lock:
+            downtime = self.downtime
+            if self.lost_at is not None:
+                downtime += self.clock() - self.lost_at
+            return {
+                'rebinds': self.rebinds,
+                'downtime': downtime,
+                'bound': self.binding is not None and self.binding.session is not None and self.lost_at is None,
+            }
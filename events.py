@@ -0,0 +1,109 @@
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionEvent:
+    """Событие детектора (например, обнаружение звука клева)"""
+
+    __slots__ = ("kind", "value", "timestamp", "wall_time")
+
+    def __init__(self, kind, value, timestamp, wall_time=None):
+        self.kind = kind
+        self.value = value
+        self.timestamp = timestamp  # Время отсчёта по часам источника
+        # Момент публикации по time.perf_counter() для измерения задержек
+        self.wall_time = time.perf_counter() if wall_time is None else wall_time
+
+    def __repr__(self):
+        return f"DetectionEvent({self.kind!r}, {self.value:.4f}, {self.timestamp:.3f})"
+
+
+class Subscription:
+    """Очередь событий одного подписчика"""
+
+    def __init__(self, channel, maxlen=1024):
+        self.channel = channel
+        self.events = deque(maxlen=maxlen)
+        self.dropped = 0  # События, вытесненные из переполненной очереди
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+    def _deliver(self, event):
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+                if self.dropped == 1:
+                    logger.warning(f"Очередь событий переполнена ({self.events.maxlen}), старые события теряются")
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Ожидание следующего события не дольше timeout секунд
+
+        Возвращает событие сразу после публикации или None по таймауту.
+        """
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            if self.events:
+                return self.events.popleft()
+            return None
+
+    def wake(self):
+        """Пробуждение ожидающего потока (например, при остановке бота)"""
+        with self.condition:
+            self.condition.notify_all()
+
+    def get_nowait(self):
+        """Следующее событие или None"""
+        with self.lock:
+            if self.events:
+                return self.events.popleft()
+            return None
+
+    def drain(self):
+        """Все накопившиеся события по порядку"""
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+    def clear(self):
+        """Отбросить накопившиеся события"""
+        with self.lock:
+            self.events.clear()
+
+    def close(self):
+        """Отписка от канала"""
+        self.channel.unsubscribe(self)
+
+
+class EventChannel:
+    """Канал публикации событий: каждый подписчик получает каждое событие ровно один раз"""
+
+    def __init__(self):
+        self.subscribers = ()
+        self.lock = threading.Lock()
+
+    def subscribe(self, maxlen=1024):
+        """Создание новой подписки"""
+        subscription = Subscription(self, maxlen)
+        with self.lock:
+            self.subscribers = self.subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Удаление подписки"""
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscription)
+
+    def publish(self, kind, value, timestamp, wall_time=None):
+        """Публикация события всем подписчикам"""
+        event = DetectionEvent(kind, value, timestamp, wall_time)
+        for subscription in self.subscribers:
+            subscription._deliver(event)
+        return event
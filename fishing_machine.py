@@ -0,0 +1,461 @@
+import json
+import time
+from collections import deque
+
+from metrics import TIMING_MUSIC_TAIL
+from phases import (PHASE_IDLE, PHASE_CASTING, PHASE_COOLDOWN, PHASE_BITE_WAIT,
+                    PHASE_REELING, PHASE_PAUSE)
+from timers import TimerScheduler
+
+# Состояния цикла рыбалки
+STATE_IDLE = "idle"  # Цикл не идёт (остановка, пауза, нет звука)
+STATE_CASTING = "casting"  # E зажата для заброса, затем ждём всплеск поплавка
+STATE_COOLDOWN = "cooldown"  # Пауза после заброса, звуки не считаются клевом
+STATE_WAITING_FOR_BITE = "waiting_for_bite"
+STATE_REELING = "reeling"  # E зажата, музыка подсечки играет или ещё не началась
+STATE_MUSIC_TAIL = "music_tail"  # Музыка стихла, ждём additional_wait (или предсказанную тишину) до отпускания E
+STATE_PAUSE = "pause"  # Пауза между циклами
+
+# Фаза определяет частоту опроса громкости и метрики длительности
+STATE_PHASES = {
+    STATE_IDLE: PHASE_IDLE,
+    STATE_CASTING: PHASE_CASTING,
+    STATE_COOLDOWN: PHASE_COOLDOWN,
+    STATE_WAITING_FOR_BITE: PHASE_BITE_WAIT,
+    STATE_REELING: PHASE_REELING,
+    STATE_MUSIC_TAIL: PHASE_REELING,
+    STATE_PAUSE: PHASE_PAUSE,
+}
+
+# Максимальное ожидание клева от конца заброса и максимальная длительность подсечки (секунды)
+BITE_TIMEOUT = 300.0
+REEL_TIMEOUT = 120.0
+# Пауза перед повтором после неудачного заброса (секунды)
+CAST_FAILURE_PAUSE = 5.0
+# Повторных забросов без всплеска подряд, потом бот всё равно ждёт клев (всплеск мог быть не слышен)
+MAX_RECASTS = 2
+# Сколько клев ждёт ввод, занятый другим клиентом: позже рыба уже уйдёт (секунды)
+HOOK_INPUT_WAIT = 1.0
+# Музыка короче не подтверждает улов (одиночный громкий звук, а не музыка подсечки)
+MIN_MUSIC_TIME = 1.0
+# Сколько последних переходов хранится в памяти
+TRANSITION_HISTORY = 1000
+
+
+class FishingStateMachine:
+    """Автомат состояний цикла рыбалки
+
+    Автомат пассивный: сам не спит и не опрашивает. Владелец передаёт ему
+    события детектора (handle_event), новые отсчёты громкости
+    (handle_samples) и вызывает timers.run_due() к ближайшему дедлайну.
+    Настройки, ввод и лог берутся из бота. Каждый переход записывается как
+    (время, из, в, причина). Окно VRChat активирует activator(wait, callback):
+    по умолчанию сразу, владелец может подменить его асинхронным.
+    """
+
+    def __init__(self, bot, clock=time.perf_counter):
+        self.bot = bot
+        self.clock = clock
+        self.timers = TimerScheduler(clock)
+        self.state = STATE_IDLE
+        self.state_timers = []  # Таймеры текущего состояния, отменяются при выходе из него
+        self.transitions = deque(maxlen=TRANSITION_HISTORY)
+        self.transition_listeners = []  # Вызываются с (время, из, в, причина)
+        self.cycle_count = 0
+        self.key_held = False
+        self.activator = self.activate_now
+        self.activation_count = 0
+        self.pending_activation = None  # Номер активации окна, результат которой ждём
+
+        self.wait_started = None  # Начало ожидания клева (с паузой после заброса)
+        self.reel_started = None
+        self.reel_timer = None
+        self.listening = False  # Прошло min_reel_time, слушаем музыку
+        self.music_playing = False
+        self.music_started = None
+        self.last_sound_time = None
+        self.tail_wait = None  # Тишина до отпускания E в текущей паузе музыки
+
+        # Ожидание тишины: пауза заканчивается по звуку или по верхней границе
+        self.quiet_wait_active = False
+        self.quiet_floor = None
+        self.quiet_deadline = None
+        self.quiet_done = None
+        self.quiet_since = None
+        self.require_splash = False
+        self.splash_heard = False
+        self.cast_started = None
+        self.recasts_in_row = 0
+
+    @property
+    def needs_samples(self):
+        """Нужны ли автомату отсчёты громкости (иначе достаточно событий детектора)"""
+        return self.state not in (STATE_IDLE, STATE_WAITING_FOR_BITE)
+
+    def transition(self, state, reason):
+        now = self.clock()
+        previous = self.state
+        for timer in self.state_timers:
+            timer.cancel()
+        self.state_timers = []
+        self.quiet_wait_active = False
+        self.pending_activation = None
+        self.state = state
+
+        record = (now, previous, state, reason)
+        self.transitions.append(record)
+        for listener in self.transition_listeners:
+            listener(*record)
+        self.bot.set_phase(STATE_PHASES[state])
+
+    def after(self, delay, callback):
+        """Таймер текущего состояния"""
+        timer = self.timers.call_later(delay, callback)
+        self.state_timers.append(timer)
+        return timer
+
+    def wait_quietly(self, min_wait, max_wait, done, require_splash=False):
+        """Вызов done, когда громкость settle_time ниже порога музыки, но не раньше min_wait и не позже max_wait"""
+        now = self.clock()
+        self.quiet_wait_active = True
+        self.quiet_floor = now + min(min_wait, max_wait)
+        self.quiet_deadline = now + max_wait
+        self.quiet_done = done
+        self.quiet_since = None
+        self.require_splash = require_splash
+        self.after(max_wait, done)
+
+    @property
+    def activating(self):
+        return self.pending_activation is not None
+
+    def activate(self, wait, then):
+        """Активация окна VRChat, затем then(activated), если состояние не сменилось"""
+        self.activation_count += 1
+        token = self.pending_activation = self.activation_count
+
+        def done(activated):
+            if self.pending_activation != token:
+                # Остановка, таймаут или новая активация, пока окно активировалось
+                self.discard_activation(activated)
+                return
+            self.pending_activation = None
+            then(activated)
+
+        self.activator(wait, done)
+
+    def discard_activation(self, activated):
+        """Результат устаревшей активации: ввод не нужен, очередь к нему освобождается"""
+        if activated and not self.activating and not self.key_held:
+            self.bot.injector.release_foreground()
+
+    def activate_now(self, wait, callback):
+        callback(self.bot.activate_vrchat_window(wait))
+
+    def release_key(self):
+        if self.key_held:
+            self.bot.injector.key_up(self.bot.VK_E)
+            self.key_held = False
+
+    def stop(self, reason):
+        """Прерывание цикла: E отпускается, таймеры отменяются"""
+        if self.state in (STATE_REELING, STATE_MUSIC_TAIL):
+            self.bot.log_message("Подсечка завершена без результата")
+        self.release_key()
+        self.timers.cancel_all()
+        self.reel_timer = None
+        if self.state != STATE_IDLE:
+            self.transition(STATE_IDLE, reason)
+
+    # Заброс
+
+    def start_cycle(self):
+        bot = self.bot
+        self.cycle_count += 1
+        bot.cycle_saved = 0.0
+        bot.metrics.increment('cycles')
+        bot.log_message(f"=== Цикл рыбалки #{self.cycle_count} ===")
+
+        self.transition(STATE_CASTING, "новый цикл")
+        bot.log_message("Закидываю удочку...")
+        bot.set_status("Закидываю удочку...")
+        self.activate(None, self.cast)
+
+    def cast(self, activated):
+        bot = self.bot
+        if not activated:
+            bot.log_message("Не удалось активировать окно VRChat")
+            bot.log_message("Ошибка заброса, пропускаю цикл")
+            bot.metrics.increment('cast_failures')
+            self.transition(STATE_PAUSE, "ошибка заброса")
+            self.after(CAST_FAILURE_PAUSE, self.start_cycle)
+            return
+
+        bot.injector.key_down(bot.VK_E)
+        self.key_held = True
+        self.cast_started = self.clock()
+        self.after(bot.cast_duration, self.finish_cast)
+
+    def finish_cast(self):
+        self.release_key()
+        self.bot.log_message(f"Удочка заброшена (удержание {self.bot.cast_duration}с)")
+        # Всплеск поплавка ищется только в отсчётах после отпускания E
+        self.splash_heard = False
+        self.wait_quietly(self.bot.min_post_cast_wait, self.bot.post_cast_wait, self.start_cooldown)
+
+    def start_cooldown(self):
+        bot = self.bot
+        self.transition(STATE_COOLDOWN, "заброс завершён")
+        bot.log_message("Жду клев рыбы...")
+        self.wait_started = self.clock()
+
+        if bot.cooldown_after_cast > 0:
+            limit = "до " if bot.audio_transitions else ""
+            bot.log_message(f"Пауза {limit}{bot.cooldown_after_cast:.0f} сек после заброса...")
+            bot.set_status(f"Пауза после заброса ({limit}{bot.cooldown_after_cast:.1f}с)...")
+            # С переходами по звуку пауза заканчивается, когда всплеск поплавка затих
+            self.wait_quietly(bot.min_cooldown_after_cast, bot.cooldown_after_cast, self.finish_cooldown,
+                              require_splash=True)
+        else:
+            self.start_waiting()
+
+    def finish_cooldown(self):
+        bot = self.bot
+        if bot.audio_transitions and bot.input_available and not self.splash_heard:
+            if self.recasts_in_row < MAX_RECASTS:
+                # Всплеска не было - игра не приняла заброс, клева не будет до BITE_TIMEOUT
+                bot.log_message("Всплеск поплавка не слышен, повторяю заброс")
+                self.recasts_in_row += 1
+                bot.metrics.increment('recasts')
+                bot.cycle_saved -= self.clock() - self.cast_started
+                bot.report_transition_savings()
+                self.start_cycle()
+                return
+            bot.log_message(f"Всплеск поплавка не слышен {MAX_RECASTS + 1} раза подряд, жду клев")
+        self.start_waiting()
+
+    # Ожидание клева
+
+    def start_waiting(self):
+        bot = self.bot
+        self.recasts_in_row = 0
+        if bot.auto_calibrate:
+            bot.apply_calibration()
+
+        self.transition(STATE_WAITING_FOR_BITE, "пауза после заброса завершена")
+        # Отбрасываем события, пришедшие до конца паузы
+        bot.bite_events.clear()
+        bot.set_status("Жду клев рыбы...")
+        self.after(self.wait_started + BITE_TIMEOUT - self.clock(), self.bite_timeout)
+
+    def bite_timeout(self):
+        self.bot.log_message("Таймаут ожидания клева")
+        self.bot.metrics.increment('bite_timeouts')
+        self.bot.log_message("Клев не обнаружен, повторяю заброс")
+        self.bot.report_transition_savings()
+        self.start_cycle()
+
+    # Подсечка
+
+    def start_reeling(self, event):
+        self.activate(HOOK_INPUT_WAIT, lambda activated: self.hook(event, activated))
+
+    def hook(self, event, activated):
+        bot = self.bot
+        if not activated:
+            bot.log_message("Не удалось активировать окно VRChat")
+            self.start_pause()
+            return
+
+        # Нажимаем и удерживаем E, лог - уже после нажатия
+        bot.injector.key_down(bot.VK_E)
+        self.key_held = True
+        self.transition(STATE_REELING, "клев")
+
+        # Задержка от обнаружения клева до нажатия E
+        latency = self.clock() - event.wall_time
+        bot.reaction_stats.add(latency)
+        stats = bot.reaction_stats.summary()
+        bot.log_message(f"Обнаружен звук клева! Громкость: {event.value:.3f}")
+        bot.log_message(f"Реакция на клев: {latency * 1000:.0f} мс "
+                        f"(медиана {stats['median'] * 1000:.0f} мс, p95 {stats['p95'] * 1000:.0f} мс)")
+
+        bot.log_message("Начинаю подсечку...")
+        bot.set_status("Подсекаю рыбу...")
+        bot.log_message(f"Слушаю музыку подсечки... (порог: {bot.effective_music_threshold:.3f}, "
+                        f"доп. время: {bot.additional_wait:.1f}с)")
+
+        self.reel_started = self.clock()
+        self.last_sound_time = self.reel_started
+        self.listening = False
+        self.music_playing = False
+        bot.music_end_model.begin(self.reel_started)
+        self.after(bot.min_reel_time, self.start_listening)
+        # Таймаут подсечки общий для REELING и MUSIC_TAIL
+        self.reel_timer = self.timers.call_later(REEL_TIMEOUT, self.reel_timeout)
+
+    def start_listening(self):
+        self.listening = True
+
+    def music_heard(self, now):
+        self.last_sound_time = now
+        if not self.music_playing:
+            self.music_playing = True
+            self.music_started = now
+            self.bot.log_message("Музыка началась - продолжаю подсечку")
+        if self.state == STATE_MUSIC_TAIL:
+            if self.bot.music_end_model.resumed(now):
+                self.bot.metrics.increment('music_end_mispredictions')
+            self.transition(STATE_REELING, "музыка снова играет")
+            self.bot.set_status("Музыка играет...")
+
+    def music_stopped(self, now):
+        bot = self.bot
+        self.transition(STATE_MUSIC_TAIL, "музыка стихла")
+        # Модель прошлых подсечек может подтвердить конец музыки раньше additional_wait
+        self.tail_wait = bot.additional_wait
+        predicted = bot.music_end_model.quiet(self.last_sound_time)
+        if bot.predict_music_end and predicted is not None and predicted < self.tail_wait:
+            self.tail_wait = predicted
+        bot.set_status(f"Ожидание завершения ({self.tail_wait:.1f}с)...")
+        self.after(self.last_sound_time + self.tail_wait - now, self.music_finished)
+
+    def music_finished(self):
+        since = self.clock() - self.last_sound_time
+        self.bot.log_message(f"Музыка закончилась {since:.1f} сек назад - завершаю подсечку")
+        self.bot.metrics.observe(TIMING_MUSIC_TAIL, since)
+        # Улов - только музыка подсечки, а не короткий посторонний звук
+        caught = self.music_confirmed
+        if caught:
+            self.bot.music_end_model.ended()
+        self.finish_reel(caught)
+
+    @property
+    def music_confirmed(self):
+        """Музыка подсечки играла не меньше MIN_MUSIC_TIME"""
+        return self.music_playing and self.last_sound_time - self.music_started >= MIN_MUSIC_TIME
+
+    def reel_timeout(self):
+        self.bot.log_message(f"Таймаут подсечки ({REEL_TIMEOUT:.0f} сек)")
+        self.bot.metrics.increment('reel_timeouts')
+        self.finish_reel(False)
+
+    def finish_reel(self, fish_caught):
+        bot = self.bot
+        if self.reel_timer is not None:
+            self.reel_timer.cancel()
+            self.reel_timer = None
+        self.release_key()
+
+        # Отбрасываем события, накопившиеся за подсечку
+        bot.bite_events.clear()
+
+        if fish_caught:
+            bot.log_message(f"Рыба успешно поймана за {self.clock() - self.reel_started:.1f} секунд")
+            bot.metrics.increment('catches')
+            bot.balance_gate.confirm()
+            bot.report_music_end_savings(bot.additional_wait - self.tail_wait)
+        elif self.music_playing:
+            # Звук был, но музыка подсечки не подтвердилась - рыба не поймана
+            bot.log_message(f"Подсечка без улова: звук {self.last_sound_time - self.music_started:.1f}с")
+            bot.metrics.increment('empty_reels')
+        else:
+            bot.log_message("Подсечка завершена без результата")
+            # Музыки подсечки не было - клев был ложным
+            bot.metrics.increment('false_hooks')
+
+        self.start_pause()
+
+    # Пауза между циклами
+
+    def start_pause(self):
+        bot = self.bot
+        self.transition(STATE_PAUSE, "подсечка завершена")
+        bot.log_message("Пауза перед следующим циклом...")
+        sampling = bot.format_sampling_stats(PHASE_BITE_WAIT)
+        if sampling:
+            bot.log_message(f"Опрос при ожидании клева: {sampling}")
+        # Ждём окончания звука улова, но не дольше post_reel_wait
+        self.wait_quietly(bot.min_post_reel_wait, bot.post_reel_wait, self.finish_cycle)
+
+    def finish_cycle(self):
+        self.bot.report_transition_savings()
+        self.bot.write_metrics_snapshot()
+        self.start_cycle()
+
+    # Входные данные
+
+    def handle_event(self, event):
+        """Событие детектора"""
+        bot = self.bot
+        if self.state == STATE_WAITING_FOR_BITE:
+            if event.kind == bot.bite_event_kind and not self.activating:
+                self.start_reeling(event)
+        elif self.state in (STATE_REELING, STATE_MUSIC_TAIL) and self.listening:
+            if event.kind == 'sound_detected' and event.value > bot.effective_music_threshold:
+                # Звук обнаружен - если это громкая музыка, обновляем время
+                bot.log_message(f"Музыка играет! Громкость: {event.value:.3f}")
+                self.music_heard(self.clock())
+            elif event.kind == 'spectral_music':
+                # Спектральный шаблон музыки подтверждает, что музыка ещё играет
+                self.music_heard(self.clock())
+
+    def handle_samples(self, timestamps, values):
+        """Новые отсчёты сглаженной громкости"""
+        if not len(values):
+            return
+        bot = self.bot
+        now = self.clock()
+
+        if self.quiet_wait_active:
+            self.track_quiet(timestamps, values, now)
+
+        if self.state in (STATE_REELING, STATE_MUSIC_TAIL) and self.listening:
+            threshold = bot.effective_music_threshold
+            model = bot.music_end_model
+            for timestamp, value in zip(timestamps, values):
+                model.add(timestamp, value, threshold)
+            # Текущая громкость - последний новый отсчёт
+            if float(values[-1]) > threshold:
+                self.music_heard(now)
+            elif self.music_playing and self.state == STATE_REELING:
+                self.music_stopped(now)
+
+    def track_quiet(self, timestamps, values, now):
+        bot = self.bot
+        if not bot.audio_transitions or not bot.input_available:
+            return
+
+        # Всплеск поплавка тише клева: слышен любой звук выше порога музыки
+        quiet_threshold = bot.effective_music_threshold
+        for timestamp, value in zip(timestamps, values):
+            if value > quiet_threshold:
+                self.quiet_since = None
+                self.splash_heard = True
+            elif self.quiet_since is None:
+                self.quiet_since = timestamp
+
+        # Время тишины считаем по меткам отсчётов, а не по часам потока рыбалки
+        if self.require_splash and not self.splash_heard:
+            return
+        if now < self.quiet_floor:
+            return
+        if self.quiet_since is not None and timestamps[-1] - self.quiet_since >= bot.settle_time:
+            bot.cycle_saved += max(self.quiet_deadline - now, 0.0)
+            self.quiet_wait_active = False
+            self.quiet_done()
+
+
+class TransitionFileLog:
+    """Запись переходов автомата в файл JSON lines для анализа циклов"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, timestamp, previous, state, reason):
+        record = {'time': time.time(), 'clock': timestamp, 'from': previous, 'to': state, 'reason': reason}
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
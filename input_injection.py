@@ -0,0 +1,229 @@
+import threading
+import time
+
+# Коды клавиш Windows
+VK_E = 0x45
+KEYEVENTF_KEYUP = 0x0002
+
+# Задержка после SetForegroundWindow, пока окно принимает ввод (секунды)
+ACTIVATION_DELAY = 0.1
+# Сколько по умолчанию ждать, пока другой клиент освободит ввод (секунды)
+FOREGROUND_WAIT = 5.0
+
+
+class KeyInjector:
+    """Базовый интерфейс эмуляции нажатий клавиш в окне игры"""
+
+    def __init__(self, clock=time.perf_counter, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.activations = 0  # Сколько раз окно пришлось активировать
+        self.foreground_hits = 0  # Сколько раз окно уже было активным
+
+    def is_foreground(self, hwnd):
+        """Находится ли окно на переднем плане"""
+        raise NotImplementedError
+
+    def activate(self, hwnd):
+        """Вывод окна на передний план"""
+        raise NotImplementedError
+
+    def key_down(self, vk_code):
+        raise NotImplementedError
+
+    def key_up(self, vk_code):
+        raise NotImplementedError
+
+    def ensure_foreground(self, hwnd, wait=None):
+        """Активация окна только если оно ещё не на переднем плане
+
+        wait - сколько ждать очереди к вводу, если его делят несколько клиентов.
+        """
+        if self.is_foreground(hwnd):
+            self.foreground_hits += 1
+            return True
+
+        self.activate(hwnd)
+        self.sleep(ACTIVATION_DELAY)  # Небольшая задержка для активации
+        self.activations += 1
+        return True
+
+    def release_foreground(self):
+        """Окно активировано, но нажатий не будет (очередь к вводу освобождается)"""
+        pass
+
+    def press(self, vk_code, duration=None):
+        """Нажатие клавиши с опциональным удержанием"""
+        self.key_down(vk_code)
+        if duration:
+            # Удерживаем клавишу указанное время
+            self.sleep(duration)
+        self.key_up(vk_code)
+
+
+class Win32KeyInjector(KeyInjector):
+    """Эмуляция клавиатуры через keybd_event"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import win32api
+        import win32gui
+
+        self.win32api = win32api
+        self.win32gui = win32gui
+
+    def is_foreground(self, hwnd):
+        # GetForegroundWindow не блокирует и стоит микросекунды
+        return self.win32gui.GetForegroundWindow() == hwnd
+
+    def activate(self, hwnd):
+        self.win32gui.SetForegroundWindow(hwnd)
+
+    def key_down(self, vk_code):
+        self.win32api.keybd_event(vk_code, 0, 0, 0)
+
+    def key_up(self, vk_code):
+        self.win32api.keybd_event(vk_code, 0, KEYEVENTF_KEYUP, 0)
+
+
+class FakeKeyInjector(KeyInjector):
+    """Запись нажатий без реального ввода (для тестов и симуляции)
+
+    Каждое нажатие и отпускание сохраняется как (timestamp, vk_code, "down"/"up").
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.foreground = None  # Окно на переднем плане
+        self.events = []
+        self.listeners = []  # Вызываются с (timestamp, vk_code, action)
+
+    def is_foreground(self, hwnd):
+        return self.foreground == hwnd
+
+    def activate(self, hwnd):
+        self.foreground = hwnd
+
+    def _record(self, vk_code, action):
+        event = (self.clock(), vk_code, action)
+        self.events.append(event)
+        for listener in self.listeners:
+            listener(*event)
+
+    def key_down(self, vk_code):
+        self._record(vk_code, "down")
+
+    def key_up(self, vk_code):
+        self._record(vk_code, "up")
+
+    def holds(self, vk_code=VK_E):
+        """Список удержаний клавиши: (время нажатия, длительность)"""
+        result = []
+        pressed_at = None
+        for timestamp, code, action in self.events:
+            if code != vk_code:
+                continue
+            if action == "down" and pressed_at is None:
+                pressed_at = timestamp
+            elif action == "up" and pressed_at is not None:
+                result.append((pressed_at, timestamp - pressed_at))
+                pressed_at = None
+        return result
+
+
+class ForegroundLock:
+    """Очередь к клавиатуре для нескольких клиентов VRChat
+
+    Нажатия уходят в окно на переднем плане, поэтому от активации окна до
+    отпускания клавиши ввод принадлежит одному клиенту. Владелец может
+    захватывать блокировку повторно.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.owner = None
+        self.acquisitions = 0
+        self.contended = 0  # Сколько раз пришлось ждать другого клиента
+        self.timeouts = 0
+        self.wait_time = 0.0  # Суммарное ожидание (секунды)
+
+    def acquire(self, owner, timeout):
+        if self.owner is owner:
+            return True
+        if self.lock.acquire(blocking=False):
+            self.owner = owner
+            self.acquisitions += 1
+            return True
+
+        started = self.clock()
+        acquired = self.lock.acquire(timeout=timeout)
+        self.contended += 1
+        self.wait_time += self.clock() - started
+        if not acquired:
+            self.timeouts += 1
+            return False
+        self.owner = owner
+        self.acquisitions += 1
+        return True
+
+    def release(self, owner):
+        if self.owner is owner:
+            self.owner = None
+            self.lock.release()
+
+    def stats(self):
+        return {
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'timeouts': self.timeouts,
+            'wait_time': self.wait_time,
+        }
+
+
+class SharedKeyInjector(KeyInjector):
+    """Ввод одного клиента через общий injector и общую ForegroundLock
+
+    Блокировка берётся при активации окна и отпускается, когда отпущены
+    все клавиши, так что нажатия разных клиентов не пересекаются.
+    """
+
+    def __init__(self, injector, lock):
+        super().__init__(clock=injector.clock, sleep=injector.sleep)
+        self.injector = injector
+        self.lock = lock
+        self.pressed = set()
+
+    def is_foreground(self, hwnd):
+        return self.injector.is_foreground(hwnd)
+
+    def activate(self, hwnd):
+        self.injector.activate(hwnd)
+
+    def ensure_foreground(self, hwnd, wait=None):
+        if not self.lock.acquire(self, FOREGROUND_WAIT if wait is None else wait):
+            return False
+        try:
+            activated = super().ensure_foreground(hwnd)
+        except Exception:
+            self.lock.release(self)
+            raise
+        if not activated:
+            self.lock.release(self)
+        return activated
+
+    def release_foreground(self):
+        if not self.pressed:
+            self.lock.release(self)
+
+    def key_down(self, vk_code):
+        self.injector.key_down(vk_code)
+        self.pressed.add(vk_code)
+
+    def key_up(self, vk_code):
+        try:
+            self.injector.key_up(vk_code)
+        finally:
+            self.pressed.discard(vk_code)
+            if not self.pressed:
+                self.lock.release(self)
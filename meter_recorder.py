@@ -0,0 +1,223 @@
+import argparse
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+import numpy as np
+
+from audio_sources import save_trace
+from phases import ALL_PHASES
+
+logger = logging.getLogger(__name__)
+
+# Запись: время отсчёта, сырой GetPeakValue, сглаженная громкость, номер фазы в ALL_PHASES
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('raw', '<f4'),
+    ('smoothed', '<f4'),
+    ('phase', 'u1'),
+])
+# Заголовок файла; count обновляется после каждой порции записей
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('record_size', '<u4'),
+    ('count', '<u8'),
+    ('wall_start', '<f8'),  # time.time() в момент открытия файла
+    ('clock_start', '<f8'),  # Часы отсчётов в тот же момент
+    ('chunk', '<u4'),
+])
+HEADER_SIZE = 64
+MAGIC = b"VRFMETER"
+VERSION = 1
+RECORD_SUFFIX = ".meter"
+
+# Записей в одном файле: ~1.5 часа при 200 Гц, 17 МБ
+CHUNK_RECORDS = 1 << 20
+# Как часто фоновый поток переносит отсчёты в файл (секунды)
+WRITE_INTERVAL = 0.25
+# Сколько отсчётов может ждать записи (~80 секунд при 200 Гц)
+QUEUE_LIMIT = 1 << 14
+
+PHASE_IDS = {phase: index for index, phase in enumerate(ALL_PHASES)}
+
+
+class MeterRecorder:
+    """Запись сырого и сглаженного сигнала в файлы np.memmap фиксированного размера
+
+    append вызывается из потока мониторинга и только кладёт кортеж в
+    deque; перенос в файл, смена фазы на номер и переход к следующему
+    файлу делает фоновый поток. Если он отстаёт больше чем на
+    QUEUE_LIMIT отсчётов, самые старые теряются (считаются в dropped).
+    """
+
+    def __init__(self, directory, chunk_records=CHUNK_RECORDS, clock=time.perf_counter):
+        self.directory = directory
+        self.chunk_records = chunk_records
+        self.clock = clock
+        self.queue = deque(maxlen=QUEUE_LIMIT)
+        self.appended = 0
+        self.written = 0
+        self.files = []  # Завершённые и текущий файлы записи
+        self.prefix = None
+        self.header = None
+        self.records = None
+        self.position = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def dropped(self):
+        return self.appended - self.written - len(self.queue)
+
+    def append(self, timestamp, raw, smoothed, phase):
+        """Отсчёт для записи (вызывается из потока мониторинга)"""
+        self.queue.append((timestamp, raw, smoothed, phase))
+        self.appended += 1
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.prefix = os.path.join(self.directory, time.strftime("meter_%Y%m%d_%H%M%S"))
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="meter-recorder", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        """Запись оставшихся отсчётов и закрытие файла"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def _run(self):
+        try:
+            while not self.stop_event.wait(WRITE_INTERVAL):
+                self.write_pending()
+            self.write_pending()
+        except Exception as e:
+            logger.error(f"Ошибка записи сигнала: {e}")
+        finally:
+            self._close_chunk()
+
+    def write_pending(self):
+        """Перенос накопившихся отсчётов в файл, возвращает их число"""
+        queue = self.queue
+        batch = []
+        try:
+            while True:
+                batch.append(queue.popleft())
+        except IndexError:
+            pass
+        if not batch:
+            return 0
+
+        data = np.array([(timestamp, raw, smoothed, PHASE_IDS.get(phase, 0))
+                         for timestamp, raw, smoothed, phase in batch], dtype=RECORD_DTYPE)
+        offset = 0
+        while offset < len(data):
+            if self.records is None or self.position >= self.chunk_records:
+                self._open_chunk(float(data['timestamp'][offset]))
+            n = min(len(data) - offset, self.chunk_records - self.position)
+            self.records[self.position:self.position + n] = data[offset:offset + n]
+            self.position += n
+            offset += n
+            # Счётчик - после данных: читатель файла не увидит незаписанные записи
+            self.header['count'] = self.position
+        self.written += len(batch)
+        return len(batch)
+
+    def _open_chunk(self, clock_start):
+        self._close_chunk()
+        chunk = len(self.files)
+        path = f"{self.prefix}_{chunk:04d}{RECORD_SUFFIX}"
+        size = HEADER_SIZE + self.chunk_records * RECORD_DTYPE.itemsize
+        # Файл выделяется сразу целиком, запись дальше - только в отображённую память
+        with open(path, 'wb') as f:
+            f.truncate(size)
+
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        self.header['magic'] = MAGIC
+        self.header['version'] = VERSION
+        self.header['record_size'] = RECORD_DTYPE.itemsize
+        self.header['count'] = 0
+        self.header['wall_start'] = time.time() - (self.clock() - clock_start)
+        self.header['clock_start'] = clock_start
+        self.header['chunk'] = chunk
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r+', offset=HEADER_SIZE,
+                                 shape=(self.chunk_records,))
+        self.position = 0
+        self.files.append(path)
+        logger.info(f"Запись сигнала в {path}")
+
+    def _close_chunk(self):
+        if self.records is None:
+            return
+        path = self.files[-1]
+        self.records.flush()
+        self.header.flush()
+        # Отображение нужно закрыть до обрезки файла (Windows не даёт менять размер)
+        self.records = None
+        self.header = None
+        with open(path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + self.position * RECORD_DTYPE.itemsize)
+
+    def stats(self):
+        return {'files': len(self.files), 'written': self.written, 'dropped': self.dropped}
+
+
+def read_header(path):
+    """Заголовок файла записи (копия, файл не остаётся открытым)"""
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header[0]['magic'] != MAGIC:
+        raise ValueError(f"{path} не является записью сигнала")
+    if header[0]['version'] != VERSION or header[0]['record_size'] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"Неподдерживаемая версия записи {path}")
+    return header[0]
+
+
+def load_recording(path):
+    """Записи файла как np.memmap только для чтения (без копирования в память)
+
+    Поля: timestamp, raw, smoothed, phase (номер в ALL_PHASES). Файл
+    можно читать, пока в него ещё идёт запись: видны записи до count.
+    """
+    count = int(read_header(path)['count'])
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def phase_names(records):
+    """Названия фаз для записей"""
+    return np.asarray(ALL_PHASES)[records['phase']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Просмотр и экспорт записей сигнала (.meter)")
+    parser.add_argument("files", nargs="+", help="Файлы записи")
+    parser.add_argument("--trace", help="Каталог для экспорта в трейсы CSV (timestamp,peak) для бенчмарка")
+    args = parser.parse_args()
+
+    for path in args.files:
+        header = read_header(path)
+        records = load_recording(path)
+        print(f"{path}: {len(records)} отсчётов, начало {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['wall_start']))}")
+        if not len(records):
+            continue
+        duration = float(records['timestamp'][-1] - records['timestamp'][0])
+        print(f"  длительность {duration:.1f} с, средняя частота {(len(records) - 1) / duration if duration else 0:.1f} Гц, "
+              f"макс. громкость {float(records['raw'].max()):.4f}")
+        counts = np.bincount(records['phase'], minlength=len(ALL_PHASES))
+        print("  фазы: " + ", ".join(f"{phase} {count}" for phase, count in zip(ALL_PHASES, counts) if count))
+
+        if args.trace:
+            os.makedirs(args.trace, exist_ok=True)
+            name = os.path.splitext(os.path.basename(path))[0] + ".csv"
+            save_trace(os.path.join(args.trace, name), records['timestamp'], records['raw'])
+            print(f"  трейс сохранён в {os.path.join(args.trace, name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class LatencyStats:
+    """Статистика задержек по скользящему окну последних измерений"""
+
+    def __init__(self, window=500):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.last = None
+
+    def add(self, value):
+        """Добавление измерения (секунды)"""
+        self.values.append(value)
+        self.count += 1
+        self.last = value
+
+    def summary(self):
+        """Сводка: count, last, mean, median, p95, max (секунды)"""
+        if not self.values:
+            return {'count': 0}
+        data = np.fromiter(self.values, dtype=np.float64)
+        return {
+            'count': self.count,
+            'last': self.last,
+            'mean': float(data.mean()),
+            'median': float(np.median(data)),
+            'p95': float(np.percentile(data, 95)),
+            'max': float(data.max()),
+        }
+
+
+# Границы корзин гистограммы длительностей фаз (секунды)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Длительности вне фаз цикла
+TIMING_ACTIVATE = "activate"  # Поиск и активация окна VRChat
+TIMING_MUSIC_TAIL = "music_tail"  # От конца музыки до отпускания E
+
+# Счётчики цикла
+COUNTERS = ("cycles", "catches", "cast_failures", "bite_timeouts", "reel_timeouts", "false_hooks",
+            "empty_reels", "recasts", "saved_seconds", "music_end_predictions", "music_end_mispredictions", "music_end_saved_seconds",
+            "balance_rejections")
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как в Prometheus)"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds=PHASE_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Последняя корзина - больше всех границ
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        for bound in self.bounds:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Пары (граница, число наблюдений <= границы), последняя граница - +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class CycleMetrics:
+    """Длительности фаз цикла рыбалки и счётчики результатов
+
+    Запись идёт из потока рыбалки при смене фаз (не на каждом отсчёте
+    громкости), чтение - из потока HTTP сервера, поэтому нужна блокировка.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.started_at = clock()
+        self.histograms = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, name, seconds):
+        """Длительность фазы или операции (секунды)"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] += value
+
+    def fish_per_hour(self):
+        uptime = self.clock() - self.started_at
+        return self.counters['catches'] / (uptime / 3600) if uptime > 0 else 0.0
+
+    def snapshot(self):
+        """Снимок всех метрик для JSON"""
+        with self.lock:
+            return {
+                'uptime': self.clock() - self.started_at,
+                'fish_per_hour': self.fish_per_hour(),
+                'counters': dict(self.counters),
+                'phases': {
+                    name: {
+                        'count': histogram.count,
+                        'sum': histogram.sum,
+                        'mean': histogram.sum / histogram.count if histogram.count else None,
+                        'buckets': [[_format_bound(bound), count] for bound, count in histogram.cumulative()],
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def write_snapshot(self, path):
+        """Запись снимка в JSON файл (через временный файл, чтобы читатель не увидел половину)"""
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def prometheus_text(self, prefix="vrchat_fishing"):
+        """Метрики в текстовом формате Prometheus"""
+        with self.lock:
+            lines = [f"# TYPE {prefix}_phase_seconds histogram"]
+            for name, histogram in sorted(self.histograms.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{prefix}_phase_seconds_bucket{{phase="{name}",le="{_format_bound(bound)}"}} {count}')
+                lines.append(f'{prefix}_phase_seconds_sum{{phase="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_phase_seconds_count{{phase="{name}"}} {histogram.count}')
+            for counter, value in self.counters.items():
+                lines.append(f"# TYPE {prefix}_{counter}_total counter")
+                lines.append(f"{prefix}_{counter}_total {value}")
+            lines.append(f"# TYPE {prefix}_fish_per_hour gauge")
+            lines.append(f"{prefix}_fish_per_hour {self.fish_per_hour():.3f}")
+            lines.append(f"# TYPE {prefix}_uptime_seconds gauge")
+            lines.append(f"{prefix}_uptime_seconds {self.clock() - self.started_at:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float('inf') else repr(bound)
+
+
+class MetricsServer:
+    """HTTP сервер метрик на localhost: /metrics (Prometheus) и /metrics.json"""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics_ref.prometheus_text().encode('utf-8')
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics_ref.snapshot(), ensure_ascii=False).encode('utf-8')
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Запросы не засоряют лог бота
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,256 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+import logging
+
+from activity_log import start_file_logging
+from discovery import (ClientClaims, DiscoveryService, PycawSessionProvider, Win32WindowProvider,
+                       SESSION_RETRY_INTERVAL)
+from input_injection import ForegroundLock, SharedKeyInjector, Win32KeyInjector
+from sampling import MAX_SLEEP_SLICE
+from vrchat_fishing_bot import JsonLinesReporter, VRChatFishingBot
+
+logger = logging.getLogger(__name__)
+
+# Как часто поток мониторинга клиента проверяет остановку (секунды)
+CHANNEL_CHECK_INTERVAL = 0.5
+# Сон общего потока опроса, когда ни один клиент не подключён (секунды)
+IDLE_WAIT = 0.5
+
+
+class MeterChannel:
+    """Источник громкости одного клиента в общем потоке опроса"""
+
+    __slots__ = ("bot", "source", "detector", "done", "completed", "retry_at", "lock", "closed")
+
+    def __init__(self, bot, source, detector):
+        self.bot = bot
+        self.source = source
+        self.detector = detector
+        self.done = threading.Event()  # Канал закрыт потоком опроса (сбой или конец данных)
+        self.completed = True
+        self.retry_at = None  # Следующая попытка переподключения к аудио сессии
+        self.lock = threading.Lock()  # Удерживается на время опроса источника
+        self.closed = False
+
+    def deadline(self, now):
+        if self.retry_at is not None:
+            return self.retry_at
+        return self.bot.sampler.deadline(now)
+
+
+class SharedMeterPoller:
+    """Один поток опрашивает источники громкости всех клиентов
+
+    Каждый клиент опрашивается по своему SamplingScheduler (частота зависит
+    от фазы его цикла), поток спит до ближайшего дедлайна среди всех
+    клиентов. Потерянная аудио сессия переподключается без блокировки
+    остальных клиентов. Общий lock защищает только список каналов: опрос
+    идёт по снимку списка, чтобы подключение клиента не ждало чтения
+    источника или переподключения другого клиента.
+    """
+
+    def __init__(self, clock=time.perf_counter, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.channels = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.reads = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="meter-poller", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    def serve(self, bot, source, detector, stop_event):
+        """Опрос источника клиента до остановки, возвращает False при сбое
+
+        Вызывается из потока мониторинга бота вместо его собственного цикла чтения.
+        """
+        channel = MeterChannel(bot, source, detector)
+        with self.lock:
+            self.channels.append(channel)
+        self.wakeup.set()
+
+        while bot.running and not stop_event.is_set():
+            if channel.done.wait(CHANNEL_CHECK_INTERVAL):
+                break
+
+        with self.lock:
+            if channel in self.channels:
+                self.channels.remove(channel)
+        # Дожидаемся идущего опроса: после возврата источник закрывается
+        with channel.lock:
+            channel.closed = True
+        # Остановка по запросу супервизора (зависание) - тоже сбой
+        return channel.completed and not stop_event.is_set()
+
+    def run(self):
+        while self.running:
+            now = self.clock()
+            with self.lock:
+                channels = list(self.channels)
+            channel = min(channels, key=lambda c: c.deadline(now), default=None)
+            if channel is None:
+                self.wakeup.wait(IDLE_WAIT)
+                self.wakeup.clear()
+                continue
+
+            # Спим отрезками: клиент мог сменить фазу и частоту опроса
+            remaining = channel.deadline(now) - now
+            if remaining > 0:
+                self.sleep(min(remaining, MAX_SLEEP_SLICE))
+                continue
+
+            with channel.lock:
+                if not channel.closed:
+                    self.poll(channel, now)
+
+    def poll(self, channel, now):
+        bot = channel.bot
+        try:
+            if channel.retry_at is not None:
+                self.rebind(channel, bot.discovery.ensure_bound())
+                return
+
+            bot.sampler.tick(now)
+            try:
+                sample = channel.source.read()
+            except Exception as e:
+                if not channel.source.is_live or bot.discovery is None:
+                    bot.log_message(f"Ошибка чтения аудио: {e}")
+                    self.close(channel, False)
+                    return
+                bot.log_message(f"Аудио сессия VRChat потеряна: {e}")
+                self.rebind(channel, bot.discovery.session_lost())
+                return
+
+            if sample is None:
+                bot.log_message("Источник аудио исчерпан")
+                self.close(channel, True)
+                return
+            self.reads += 1
+            bot.process_sample(channel.detector, *sample)
+
+        except Exception as e:
+            bot.log_message(f"Ошибка опроса аудио: {e}")
+            self.close(channel, False)
+
+    def rebind(self, channel, binding):
+        result = channel.bot.try_rebind_audio_source(channel.source, binding)
+        if result is None:
+            channel.retry_at = self.clock() + SESSION_RETRY_INTERVAL
+        elif result:
+            channel.retry_at = None
+        else:
+            self.close(channel, False)
+
+    def close(self, channel, completed):
+        channel.completed = completed
+        channel.closed = True
+        with self.lock:
+            if channel in self.channels:
+                self.channels.remove(channel)
+        channel.done.set()
+
+
+class MultiInstanceRuntime:
+    """Несколько клиентов VRChat в одном процессе
+
+    У каждого бота свой профиль настроек, источник громкости, детектор и
+    автомат цикла. Общие: поток опроса громкости, поиск окон (каждый бот
+    занимает свой клиент) и очередь к клавиатуре, чтобы нажатия в разные
+    окна не пересекались.
+    """
+
+    def __init__(self, settings_files, injector=None, windows=None, sessions=None, clock=time.perf_counter):
+        self.clock = clock
+        self.claims = ClientClaims()
+        self.foreground = ForegroundLock(clock)
+        self.poller = SharedMeterPoller(clock)
+
+        injector = injector or Win32KeyInjector()
+        windows = windows or Win32WindowProvider()
+        sessions = sessions or PycawSessionProvider()
+
+        self.bots = []
+        names = [os.path.splitext(os.path.basename(path))[0] for path in settings_files]
+        for index, (settings_file, name) in enumerate(zip(settings_files, names), 1):
+            discovery = DiscoveryService(windows, sessions, clock=clock, claims=self.claims)
+            bot = VRChatFishingBot(settings_file, SharedKeyInjector(injector, self.foreground),
+                                   discovery, clock)
+            # Один профиль можно запустить для нескольких клиентов
+            bot.name = name if names.count(name) == 1 else f"{name}#{index}"
+            bot.audio_poller = self.poller
+            self.bots.append(bot)
+
+    def start(self):
+        """Запуск всех ботов, возвращает число запущенных"""
+        self.poller.start()
+        started = 0
+        for bot in self.bots:
+            if bot.start_bot():
+                started += 1
+        logger.info(f"Запущено ботов: {started} из {len(self.bots)}")
+        return started
+
+    def stop(self):
+        for bot in self.bots:
+            if bot.running:
+                bot.stop_bot()
+        self.poller.stop()
+
+        stats = self.foreground.stats()
+        logger.info(f"Очередь к вводу: захватов {stats['acquisitions']}, ожиданий {stats['contended']}, "
+                    f"таймаутов {stats['timeouts']}, суммарное ожидание {stats['wait_time']:.1f}с")
+
+    @property
+    def running(self):
+        return any(bot.running for bot in self.bots)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Несколько клиентов VRChat в одном процессе")
+    parser.add_argument("settings", nargs="+", help="Файлы настроек, по одному на клиент")
+    args = parser.parse_args()
+
+    runtime = MultiInstanceRuntime(args.settings)
+
+    # Статус и лог всех ботов в stdout в формате JSON lines с именем клиента
+    lock = threading.Lock()
+    for bot in runtime.bots:
+        bot.add_listener(JsonLinesReporter(sys.stdout, bot.name, lock))
+
+    log_file = runtime.bots[0].log_file
+    log_listener = start_file_logging(log_file) if log_file else None
+
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_requested.set())
+    try:
+        if not runtime.start():
+            return 1
+        while runtime.running and not stop_requested.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runtime.stop()
+        if log_listener is not None:
+            log_listener.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+from collections import deque
+
+import numpy as np
+
+from calibration import P2Quantile
+
+# Сколько последних подсечек помнит модель
+MUSIC_END_HISTORY = 50
+# Подсечек с концом музыки до первых предсказаний
+MIN_OBSERVATIONS = 5
+# Тишина должна быть длиннее самой длинной паузы внутри музыки с запасом
+GAP_MARGIN = 1.5
+# Минимальная тишина перед отпусканием E (секунды)
+MIN_CONFIRM = 0.5
+# Тишина раньше этого процентиля длительности музыки считается паузой
+DURATION_PERCENTILE = 5
+# Окно оценки затухания перед тишиной (секунды) и допуск к затуханию прошлых концов
+FADE_WINDOW = 0.5
+FADE_TOLERANCE = 0.1
+# Каждая N-я подсечка завершается по фиксированному правилу: модель видит длинные паузы
+CHECK_INTERVAL = 10
+
+
+class MusicEndModel:
+    """Модель окончания музыки подсечки по прошлым циклам
+
+    Запоминает длительность музыки от начала подсечки, паузы внутри
+    музыки (тишина, после которой музыка продолжилась) и затухание перед
+    концом: средняя громкость за FADE_WINDOW до тишины относительно
+    медианной громкости музыки. Когда музыка стихает, quiet возвращает,
+    сколько тишины достаточно для отпускания E, или None, если конец не
+    подтверждается статистикой (тогда работает additional_wait).
+    """
+
+    def __init__(self, history=MUSIC_END_HISTORY, min_observations=MIN_OBSERVATIONS):
+        self.min_observations = min_observations
+        self.durations = deque(maxlen=history)
+        self.gaps = deque(maxlen=history)
+        self.fades = deque(maxlen=history)
+        self.reels = 0
+        self.checking = False
+        self._clear(0.0)
+
+    @property
+    def ready(self):
+        return len(self.durations) >= self.min_observations
+
+    def begin(self, reel_started):
+        """Начало подсечки"""
+        self.reels += 1
+        self.checking = self.reels % CHECK_INTERVAL == 0
+        self._clear(reel_started)
+
+    def _clear(self, reel_started):
+        self.reel_started = reel_started
+        self.music_level = P2Quantile(0.5)
+        self.recent = deque()  # (время, громкость) за последние FADE_WINDOW секунд
+        self.quiet_since = None
+        self.quiet_fade = None
+        self.predicted = None  # Предсказанная тишина для текущей паузы
+
+    def add(self, timestamp, value, threshold):
+        """Отсчёт сглаженной громкости во время подсечки"""
+        if value > threshold:
+            self.music_level.add(value)
+        recent = self.recent
+        recent.append((timestamp, value))
+        while recent[0][0] < timestamp - FADE_WINDOW:
+            recent.popleft()
+
+    def fade(self):
+        """Средняя громкость последнего окна относительно медианы музыки"""
+        level = self.music_level.value()
+        if not level or not self.recent:
+            return None
+        return sum(value for _, value in self.recent) / len(self.recent) / level
+
+    def quiet(self, last_sound_time):
+        """Музыка стихла: достаточная тишина от last_sound_time (секунды) или None"""
+        self.quiet_since = last_sound_time
+        self.quiet_fade = self.fade()
+        self.predicted = self.confirm_wait(last_sound_time, self.quiet_fade)
+        return None if self.checking else self.predicted
+
+    def confirm_wait(self, quiet_since, fade):
+        if not self.ready:
+            return None
+        # Слишком рано для конца музыки
+        if quiet_since - self.reel_started < np.percentile(self.durations, DURATION_PERCENTILE):
+            return None
+        # Громкость перед тишиной не похожа на прошлые концы музыки
+        if fade is not None and self.fades and fade > np.percentile(self.fades, 95) + FADE_TOLERANCE:
+            return None
+        return max(max(self.gaps, default=0.0) * GAP_MARGIN, MIN_CONFIRM)
+
+    def resumed(self, now):
+        """Музыка продолжилась после паузы, True - если предсказание отпустило бы E раньше"""
+        if self.quiet_since is None:
+            return False
+        gap = now - self.quiet_since
+        self.gaps.append(gap)
+        mispredicted = self.predicted is not None and gap > self.predicted
+        self.quiet_since = None
+        self.predicted = None
+        return mispredicted
+
+    def ended(self):
+        """Подсечка завершена после конца музыки"""
+        if self.quiet_since is None:
+            return
+        self.durations.append(self.quiet_since - self.reel_started)
+        if self.quiet_fade is not None:
+            self.fades.append(self.quiet_fade)
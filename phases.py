@@ -0,0 +1,9 @@
+# Фазы цикла рыбалки
+PHASE_IDLE = "idle"  # Бот не рыбачит (остановлен или на паузе)
+PHASE_CASTING = "casting"  # Заброс удочки
+PHASE_COOLDOWN = "cooldown"  # Пауза после заброса
+PHASE_BITE_WAIT = "bite_wait"  # Ожидание клева
+PHASE_REELING = "reeling"  # Подсечка, ожидание окончания музыки
+PHASE_PAUSE = "pause"  # Пауза между циклами
+
+ALL_PHASES = (PHASE_IDLE, PHASE_CASTING, PHASE_COOLDOWN, PHASE_BITE_WAIT, PHASE_REELING, PHASE_PAUSE)
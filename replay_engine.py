@@ -0,0 +1,297 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from audio_sources import load_trace
+from benchmark import MATCH_AFTER, MATCH_BEFORE, REEL_TIMEOUT, find_dataset, load_labels
+from detection import REFERENCE_INTERVAL, SILENCE_DECAY, SILENCE_THRESHOLD
+
+# Сетка перебора по умолчанию
+DEFAULT_GRID = {
+    'smoothing_alpha': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9],
+    'audio_threshold': [float(v) for v in np.round(np.geomspace(0.01, 0.3, 12), 4)],
+    'music_threshold': [float(v) for v in np.round(np.geomspace(0.003, 0.05, 8), 4)],
+    'spike_cooldown': [0.2, 0.5, 1.0],
+    'additional_wait': [0.5, 1.0, 1.5, 2.0, 2.5, 3.0],
+}
+
+# Порядок осей полной сетки в evaluate_grid
+GRID_ORDER = ('smoothing_alpha', 'audio_threshold', 'spike_cooldown', 'music_threshold', 'additional_wait')
+
+
+def smooth_many(timestamps, peaks, alphas):
+    """Сглаживание трейса сразу для нескольких smoothing_alpha
+
+    Та же логика, что в PeakDetector.process, по строке на каждый коэффициент.
+    Возвращает массив [len(alphas) x len(timestamps)].
+    """
+    alphas = np.asarray(alphas, dtype=np.float64)
+    log_keep = np.log1p(-alphas)
+    log_decay = np.log(SILENCE_DECAY)
+
+    intervals = np.diff(timestamps, prepend=timestamps[0])
+    scales = np.where(intervals > 0, intervals / REFERENCE_INTERVAL, 1.0)
+    scales[0] = 1.0
+
+    smoothed = np.empty((len(alphas), len(timestamps)), dtype=np.float64)
+    state = np.zeros(len(alphas), dtype=np.float64)
+    loud = peaks > SILENCE_THRESHOLD
+    for i in range(len(timestamps)):
+        if loud[i]:
+            keep = np.exp(log_keep * scales[i])
+            state = (1 - keep) * peaks[i] + keep * state
+        else:
+            state = state * np.exp(log_decay * scales[i])
+        smoothed[:, i] = state
+    return smoothed
+
+
+def detect_many(timestamps, smoothed, rows, thresholds, cooldowns):
+    """Обнаружения для набора комбинаций (строка сглаживания, порог, cooldown)
+
+    Перебираются только отсчёты, где хотя бы одна комбинация выше порога;
+    на каждом из них все комбинации обновляются одной операцией.
+    Возвращает список массивов времён обнаружения по комбинациям.
+    """
+    rows = np.asarray(rows)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    cooldowns = np.asarray(cooldowns, dtype=np.float64)
+
+    candidates = np.nonzero(smoothed.max(axis=0) > thresholds.min())[0]
+    last_spike = np.full(len(rows), -np.inf)
+    fired_times = []
+    fired_combos = []
+
+    for i in candidates:
+        t = timestamps[i]
+        fire = (smoothed[rows, i] > thresholds) & (t - last_spike > cooldowns)
+        if fire.any():
+            last_spike[fire] = t
+            combos = np.nonzero(fire)[0]
+            fired_combos.append(combos)
+            fired_times.append(np.full(len(combos), t))
+
+    if not fired_combos:
+        return [np.empty(0) for _ in range(len(rows))]
+
+    combos = np.concatenate(fired_combos)
+    times = np.concatenate(fired_times)
+    order = np.argsort(combos, kind='stable')
+    combos, times = combos[order], times[order]
+    bounds = np.searchsorted(combos, np.arange(len(rows) + 1))
+    return [times[bounds[k]:bounds[k + 1]] for k in range(len(rows))]
+
+
+def release_many(timestamps, smoothed, rows, music_thresholds, waits, start, min_reel_time):
+    """Момент отпускания E по правилу автомата состояний для набора комбинаций
+
+    Возвращает массив времён (NaN, если музыка не закончилась до таймаута).
+    """
+    first = np.searchsorted(timestamps, start + min_reel_time)
+    last = np.searchsorted(timestamps, start + REEL_TIMEOUT, side='right')
+    times = timestamps[first:last]
+    if len(times) == 0:
+        return np.full(len(rows), np.nan)
+
+    window = smoothed[np.asarray(rows), first:last]
+    loud = window > np.asarray(music_thresholds)[:, None]
+    last_loud = np.maximum.accumulate(np.where(loud, times, -np.inf), axis=1)
+    done = (times - last_loud) > np.asarray(waits)[:, None]
+    found = done.any(axis=1)
+    index = done.argmax(axis=1)
+    return np.where(found, times[index], np.nan)
+
+
+def evaluate_grid(dataset, grid, settings):
+    """Оценка всех комбинаций сетки на размеченных трейсах
+
+    Детекция зависит только от (alpha, порог, cooldown), окончание музыки -
+    от (alpha, порог музыки, доп. время), поэтому обе части считаются
+    отдельно и объединяются broadcasting'ом по полной сетке.
+    """
+    alphas = np.asarray(grid['smoothing_alpha'])
+    audio = np.asarray(grid['audio_threshold'])
+    cooldowns = np.asarray(grid['spike_cooldown'])
+    music = np.asarray(grid['music_threshold'])
+    waits = np.asarray(grid['additional_wait'])
+
+    det_a, det_t, det_c = (x.ravel() for x in np.meshgrid(np.arange(len(alphas)), audio, cooldowns, indexing='ij'))
+    rel_a, rel_m, rel_w = (x.ravel() for x in np.meshgrid(np.arange(len(alphas)), music, waits, indexing='ij'))
+
+    hits = np.zeros(len(det_a))
+    latency_sum = np.zeros(len(det_a))
+    false_hooks = np.zeros(len(det_a))
+    reel_sum = np.zeros(len(rel_a))
+    early = np.zeros(len(rel_a))
+    bites_total = 0
+    wait_seconds = 0.0
+    bite_waits = []
+    samples = 0
+
+    for recording, labels_path in dataset:
+        if not recording.endswith('.csv'):
+            continue
+        labels = load_labels(labels_path)
+        timestamps, peaks = load_trace(recording)
+        samples += len(timestamps)
+        smoothed = smooth_many(timestamps, peaks, alphas)
+        bites = np.asarray(labels['bites'])
+        music_spans = labels['music']
+        bites_total += len(bites)
+
+        music_time = sum(e - s for s, e in music_spans)
+        wait_seconds += max(float(timestamps[-1] - timestamps[0]) - music_time, 0.0)
+
+        # Время ожидания клева: от конца предыдущей музыки до следующего клева
+        previous_end = float(timestamps[0])
+        for bite in bites:
+            bite_waits.append(bite - previous_end)
+            span = next(((s, e) for s, e in music_spans if s >= bite - MATCH_BEFORE), None)
+            if span is not None:
+                previous_end = span[1]
+
+        # Детекция по всем комбинациям
+        detections = detect_many(timestamps, smoothed, det_a, det_t, det_c)
+        for k, times in enumerate(detections):
+            if len(times) == 0:
+                continue
+            in_music = np.zeros(len(times), dtype=bool)
+            for s, e in music_spans:
+                in_music |= (times >= s) & (times <= e)
+            times = times[~in_music]
+            matched = np.zeros(len(times), dtype=bool)
+            for bite in bites:
+                near = np.nonzero(~matched & (times >= bite - MATCH_BEFORE) & (times <= bite + MATCH_AFTER))[0]
+                if len(near):
+                    matched[near[0]] = True
+                    hits[k] += 1
+                    latency_sum[k] += times[near[0]] - bite
+            false_hooks[k] += np.count_nonzero(~matched)
+
+        # Окончание музыки (подсечка считается начатой в момент клева)
+        for bite in bites:
+            span = next(((s, e) for s, e in music_spans if s >= bite - MATCH_BEFORE), None)
+            release = release_many(timestamps, smoothed, rel_a, rel_m, rel_w, bite,
+                                   settings['min_reel_time'])
+            missing = np.isnan(release)
+            reel_sum += np.where(missing, REEL_TIMEOUT, release - bite)
+            if span is not None:
+                early += ~missing & (release < span[1])
+
+    if bites_total == 0:
+        raise ValueError("В наборе нет размеченного клева")
+
+    detection_shape = (len(alphas), len(audio), len(cooldowns))
+    release_shape = (len(alphas), len(music), len(waits))
+    recall = (hits / bites_total).reshape(detection_shape)
+    latency = np.where(hits > 0, latency_sum / np.maximum(hits, 1), MATCH_AFTER).reshape(detection_shape)
+    false_per_hour = (false_hooks / max(wait_seconds / 3600, 1e-9)).reshape(detection_shape)
+    reel = (reel_sum / bites_total).reshape(release_shape)
+    early_rate = (early / bites_total).reshape(release_shape)
+
+    # Полная сетка: (alpha, порог, cooldown, порог музыки, доп. время)
+    recall = recall[:, :, :, None, None]
+    latency = latency[:, :, :, None, None]
+    false_per_hour = false_per_hour[:, :, :, None, None]
+    reel = reel[:, None, None, :, :]
+    early_rate = early_rate[:, None, None, :, :]
+
+    bite_wait = float(np.mean(bite_waits)) if bite_waits else 0.0
+    # Паузы цикла без ожидания клева и подсечки: заброс, паузы после заброса и между циклами
+    overhead = (settings['cast_duration'] + settings['cooldown_after_cast']
+                + settings['post_cast_wait'] + settings['post_reel_wait'])
+    # Ложная подсечка без музыки держит E до таймаута и начинает цикл заново
+    false_hooks_per_cycle = false_per_hour / 3600 * bite_wait
+    cycle = overhead + bite_wait + latency + reel + false_hooks_per_cycle * (REEL_TIMEOUT + overhead)
+    success = np.maximum(recall * (1 - early_rate), 1e-9)
+
+    return {
+        'grid': grid,
+        'seconds_per_fish': cycle / success,
+        'recall': np.broadcast_to(recall, cycle.shape),
+        'false_hooks_per_hour': np.broadcast_to(false_per_hour, cycle.shape),
+        'early_release_rate': np.broadcast_to(early_rate, cycle.shape),
+        'latency': np.broadcast_to(latency, cycle.shape),
+        'reel_time': np.broadcast_to(reel, cycle.shape),
+        'samples': samples,
+        'combinations': int(cycle.size),
+    }
+
+
+def tune(evaluation, false_hook_limit, top=5):
+    """Лучшие комбинации по времени на рыбу при ограничении ложных подсечек в час"""
+    cost = np.where(evaluation['false_hooks_per_hour'] <= false_hook_limit,
+                    evaluation['seconds_per_fish'], np.inf)
+    order = np.argsort(cost, axis=None)[:top]
+    results = []
+    for flat in order:
+        if not np.isfinite(cost.flat[flat]):
+            break
+        index = np.unravel_index(flat, cost.shape)
+        params = {name: float(evaluation['grid'][name][i]) for name, i in zip(GRID_ORDER, index)}
+        results.append({
+            'settings': params,
+            'seconds_per_fish': float(cost[index]),
+            'recall': float(evaluation['recall'][index]),
+            'false_hooks_per_hour': float(evaluation['false_hooks_per_hour'][index]),
+            'early_release_rate': float(evaluation['early_release_rate'][index]),
+            'latency': float(evaluation['latency'][index]),
+            'reel_time': float(evaluation['reel_time'][index]),
+        })
+    return results
+
+
+def parse_values(text):
+    """Список значений: "0.1,0.2,0.3" или диапазон "start:stop:count" """
+    if ':' in text:
+        start, stop, count = text.split(':')
+        return [float(v) for v in np.linspace(float(start), float(stop), int(count))]
+    return [float(v) for v in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор настроек детекции по размеченным трейсам")
+    parser.add_argument("dataset", help="Каталог с трейсами .csv и разметкой .json (как для benchmark.py)")
+    parser.add_argument("--settings", default="fishing_bot_settings.json", help="Исходный файл настроек")
+    parser.add_argument("-o", "--output", default="tuned_settings.json", help="Файл подобранных настроек")
+    parser.add_argument("--max-false-hooks", type=float, default=1.0,
+                        help="Допустимое число ложных подсечек в час")
+    for name in GRID_ORDER:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=parse_values,
+                            help="Значения через запятую или start:stop:count")
+    args = parser.parse_args()
+
+    with open(args.settings, 'r', encoding='utf-8') as f:
+        settings = json.load(f)
+    for key, default in (('cast_duration', 0.5), ('cooldown_after_cast', 5.0), ('min_reel_time', 5.0),
+                         ('post_cast_wait', 1.0), ('post_reel_wait', 3.0)):
+        settings.setdefault(key, default)
+
+    grid = {name: getattr(args, name) or DEFAULT_GRID[name] for name in GRID_ORDER}
+
+    started = time.perf_counter()
+    evaluation = evaluate_grid(find_dataset(args.dataset), grid, settings)
+    elapsed = time.perf_counter() - started
+    print(f"Оценено {evaluation['combinations']} комбинаций на {evaluation['samples']} отсчётах "
+          f"за {elapsed:.1f} с")
+
+    best = tune(evaluation, args.max_false_hooks)
+    if not best:
+        print(f"Нет комбинаций с ложными подсечками не более {args.max_false_hooks} в час")
+        return
+
+    for rank, result in enumerate(best, 1):
+        params = ", ".join(f"{k}={v:g}" for k, v in result['settings'].items())
+        print(f"{rank}. {result['seconds_per_fish']:.1f} с/рыба, recall {result['recall']:.2f}, "
+              f"ложных {result['false_hooks_per_hour']:.2f}/ч: {params}")
+
+    settings.update(best[0]['settings'])
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=4, ensure_ascii=False)
+    print(f"Настройки сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+
+
+class SampleRingBuffer:
+    """Кольцевой буфер отсчётов громкости (timestamp, value) на NumPy
+
+    Память выделяется один раз. Запись идёт из потока мониторинга,
+    читать может любой поток, не забирая данные у других читателей.
+    Каждому отсчёту соответствует порядковый номер (seq), по которому
+    читатель может получить только новые отсчёты.
+    """
+
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0  # Всего записано отсчётов (seq следующего отсчёта)
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+    def append(self, timestamp, value):
+        """Добавление отсчёта"""
+        with self.condition:
+            index = self.count % self.capacity
+            self.timestamps[index] = timestamp
+            self.values[index] = value
+            self.count += 1
+            self.condition.notify_all()
+
+    def wait_for_samples(self, seq, timeout=None):
+        """Ожидание отсчётов новее seq, возвращает True, если они появились"""
+        with self.condition:
+            if self.count <= seq:
+                self.condition.wait(timeout)
+            return self.count > seq
+
+    def clear(self):
+        """Удаление всех отсчётов"""
+        with self.lock:
+            self.count = 0
+
+    def latest(self):
+        """Последний отсчёт (timestamp, value) или None"""
+        with self.lock:
+            if self.count == 0:
+                return None
+            index = (self.count - 1) % self.capacity
+            return float(self.timestamps[index]), float(self.values[index])
+
+    def _copy_range(self, start, stop):
+        """Копия отсчётов с номерами [start, stop) в хронологическом порядке"""
+        n = stop - start
+        if n <= 0:
+            return np.empty(0), np.empty(0)
+        first = start % self.capacity
+        indices = (first + np.arange(n)) % self.capacity
+        return self.timestamps[indices], self.values[indices]
+
+    def view(self, n=None):
+        """Последние n отсчётов (timestamps, values) без их извлечения"""
+        with self.lock:
+            available = min(self.count, self.capacity)
+            if n is None or n > available:
+                n = available
+            return self._copy_range(self.count - n, self.count)
+
+    def read_since(self, seq):
+        """Отсчёты, записанные после seq: (timestamps, values, новый seq)
+
+        Если читатель отстал больше чем на ёмкость буфера,
+        возвращаются только сохранившиеся отсчёты.
+        """
+        with self.lock:
+            start = max(seq, self.count - self.capacity, 0)
+            timestamps, values = self._copy_range(start, self.count)
+            return timestamps, values, self.count
@@ -0,0 +1,113 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from phases import (PHASE_IDLE, PHASE_CASTING, PHASE_COOLDOWN, PHASE_BITE_WAIT,
+                    PHASE_REELING, PHASE_PAUSE)
+
+# Частота опроса громкости по фазам цикла (Гц)
+SAMPLE_RATE_LOW = 5.0  # Отсчёты не используются для детекции
+SAMPLE_RATE_NORMAL = 20.0
+SAMPLE_RATE_BURST = 200.0  # Критичные по времени фазы
+
+PHASE_SAMPLE_RATES = {
+    PHASE_IDLE: SAMPLE_RATE_NORMAL,
+    PHASE_CASTING: SAMPLE_RATE_NORMAL,
+    PHASE_COOLDOWN: SAMPLE_RATE_LOW,
+    PHASE_BITE_WAIT: SAMPLE_RATE_BURST,
+    PHASE_REELING: SAMPLE_RATE_BURST,
+    PHASE_PAUSE: SAMPLE_RATE_LOW,
+}
+
+# Максимальный отрезок одного сна, чтобы быстро реагировать на смену частоты
+MAX_SLEEP_SLICE = 0.02
+
+
+class SamplingScheduler:
+    """Планировщик опроса по абсолютным дедлайнам без накопления дрейфа
+
+    Следующий дедлайн отсчитывается от предыдущего, а не от момента
+    пробуждения, поэтому время чтения и неточность сна не снижают частоту.
+    Если опрос отстал больше чем на период, дедлайны пересинхронизируются
+    без серии догоняющих отсчётов.
+    """
+
+    def __init__(self, rate=SAMPLE_RATE_NORMAL, clock=time.perf_counter, sleep=time.sleep, window=256):
+        self.clock = clock
+        self.sleep = sleep
+        self.window = window
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.next_deadline = None
+        self.last_tick = None
+        self.missed = 0  # Пропущенные дедлайны
+        self.tick_times = deque(maxlen=window)
+        self.lateness = deque(maxlen=window)
+
+    def set_rate(self, rate):
+        """Смена целевой частоты (можно вызывать из другого потока)"""
+        if rate == self.rate:
+            return
+        self.rate = rate
+        self.period = 1.0 / rate
+        # Статистика относится к текущей частоте
+        self.tick_times.clear()
+        self.lateness.clear()
+        if self.last_tick is not None and self.next_deadline is not None:
+            self.next_deadline = min(self.next_deadline, self.last_tick + self.period)
+
+    def wait(self):
+        """Ожидание следующего дедлайна опроса"""
+        now = self.clock()
+        # Спим отрезками: дедлайн может сдвинуться при смене частоты
+        while True:
+            remaining = self.deadline(now) - now
+            if remaining <= 0:
+                break
+            self.sleep(min(remaining, MAX_SLEEP_SLICE))
+            now = self.clock()
+
+        return self.tick(now)
+
+    def deadline(self, now):
+        """Дедлайн следующего отсчёта (первый отсчёт - сразу)"""
+        if self.next_deadline is None:
+            self.next_deadline = now
+        return self.next_deadline
+
+    def tick(self, now):
+        """Учёт отсчёта, сделанного в момент now, и расчёт следующего дедлайна
+
+        Нужен, когда ждёт не сам планировщик, а общий поток опроса нескольких клиентов.
+        """
+        self.deadline(now)
+        self.lateness.append(now - self.next_deadline)
+        self.tick_times.append(now)
+        self.last_tick = now
+
+        self.next_deadline += self.period
+        if now - self.next_deadline > self.period:
+            skipped = int((now - self.next_deadline) / self.period)
+            self.missed += skipped
+            self.next_deadline += skipped * self.period
+
+        return now
+
+    def stats(self):
+        """Фактическая частота и джиттер за последние отсчёты"""
+        result = {
+            'target_rate': self.rate,
+            'rate': 0.0,
+            'jitter_ms': 0.0,
+            'max_lateness_ms': 0.0,
+            'missed': self.missed,
+        }
+        if len(self.tick_times) >= 2:
+            span = self.tick_times[-1] - self.tick_times[0]
+            if span > 0:
+                result['rate'] = (len(self.tick_times) - 1) / span
+            lateness = np.fromiter(self.lateness, dtype=np.float64)
+            result['jitter_ms'] = float(lateness.std() * 1000)
+            result['max_lateness_ms'] = float(lateness.max() * 1000)
+        return result
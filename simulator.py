@@ -0,0 +1,398 @@
+import argparse
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+from audio_sources import FakeChannelMeterSource, load_trace
+from discovery import DiscoveryService, FakeSessionProvider, FakeWindowProvider
+from fishing_machine import STATE_CASTING
+from input_injection import FakeKeyInjector
+from vrchat_fishing_bot import SETTINGS_FILE, VRChatFishingBot
+
+# Поведение игры по умолчанию: уровни пикового индикатора и времена (секунды)
+GAME_DEFAULTS = {
+    'noise_level': 0.003,  # Фоновый шум
+    'noise_jitter': 0.001,
+    'ambient_trace': "",  # Трейс фона (.csv timestamp,peak), проигрывается по кругу вместо шума
+    'ambient_spike_rate': 0.2,  # Случайные громкие звуки окружения в минуту
+    'ambient_spike_level': 0.08,
+    'ambient_spike_duration': 0.15,
+    'ambient_spike_pan': 1.0,  # Звуки окружения со случайной стороны в [-x, x] (-1 слева, +1 справа)
+    'bobber_pan': 0.4,  # Сторона всплеска и клева; музыка и фон - по центру
+    'min_cast_hold': 0.2,  # Более короткое нажатие E не забрасывает удочку
+    'splash_delay': 0.6,  # От отпускания E до всплеска поплавка
+    'splash_level': 0.12,
+    'splash_duration': 0.3,
+    'bite_delay_min': 5.0,  # От всплеска до клева
+    'bite_delay_max': 40.0,
+    'bite_trace': "",  # Трейс звука клева вместо синтетического
+    'bite_level': 0.2,
+    'bite_duration': 0.2,
+    'hook_window': 1.0,  # Сколько после начала клева можно подсечь
+    'music_trace': "",  # Трейс музыки подсечки вместо синтетической
+    'music_delay': 0.5,  # От нажатия E до начала музыки
+    'music_level': 0.06,
+    'music_min': 6.0,
+    'music_max': 15.0,
+    'music_gap_rate': 0.0,  # Пауз тишины внутри синтетической музыки в минуту
+    'music_gap_duration': 0.4,
+    'music_fade': 0.0,  # Затухание в конце синтетической музыки (секунды)
+    'catch_sound_level': 0.1,  # Звук улова после отпускания E
+    'catch_sound_duration': 1.0,
+    'ready_delay': 1.5,  # После вытаскивания удочки новый заброс возможен не раньше
+}
+
+# Окно и процесс VRChat в симуляции
+SIM_WINDOW = 1
+SIM_PID = 1000
+
+
+class VirtualClock:
+    """Виртуальные часы: время идёт только при advance_to и sleep"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def advance_to(self, moment):
+        if moment > self.now:
+            self.now = moment
+
+
+class SoundClip:
+    """Звук игры как огибающая пиковой громкости от начала звука"""
+
+    def __init__(self, times, levels):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.duration = float(self.times[-1]) if len(self.times) else 0.0
+
+    @classmethod
+    def constant(cls, duration, level):
+        return cls([0.0, duration], [level, level])
+
+    @classmethod
+    def from_trace(cls, path):
+        timestamps, peaks = load_trace(path)
+        return cls(timestamps - timestamps[0], peaks)
+
+    def level(self, offset):
+        if offset < 0 or offset > self.duration:
+            return 0.0
+        return float(np.interp(offset, self.times, self.levels))
+
+
+class SimulatedGame:
+    """Мини-игра рыбалки, реагирующая на нажатия E
+
+    Заброс - удержание E не короче min_cast_hold; после всплеска через
+    случайное время клюёт рыба. Нажатие E в течение hook_window после клева
+    запускает музыку подсечки; рыба поймана, если E отпущена после конца
+    музыки, иначе она сорвалась. Нажатие E без клева сматывает удочку.
+    """
+
+    def __init__(self, clock, settings, rng):
+        self.clock = clock
+        self.settings = settings
+        self.rng = rng
+        self.state = "ready"
+        self.ready_at = 0.0
+        self.cast_down_at = None
+        self.bite_at = None
+        self.music_end = None
+        self.sounds = []  # (начало, SoundClip, сторона)
+
+        self.ambient_clip = SoundClip.from_trace(settings['ambient_trace']) if settings['ambient_trace'] else None
+        self.bite_clip = (SoundClip.from_trace(settings['bite_trace']) if settings['bite_trace']
+                          else SoundClip.constant(settings['bite_duration'], settings['bite_level']))
+        self.music_clip = SoundClip.from_trace(settings['music_trace']) if settings['music_trace'] else None
+        self.splash_clip = SoundClip.constant(settings['splash_duration'], settings['splash_level'])
+        self.spike_clip = SoundClip.constant(settings['ambient_spike_duration'], settings['ambient_spike_level'])
+        self.catch_clip = SoundClip.constant(settings['catch_sound_duration'], settings['catch_sound_level'])
+        self.next_spike = self._next_spike(0.0)
+
+        self.stats = dict.fromkeys(("casts", "bites", "caught", "escaped", "missed", "empty_reels",
+                                    "ignored_casts"), 0)
+
+    def _next_spike(self, now):
+        rate = self.settings['ambient_spike_rate']
+        return now + self.rng.exponential(60.0 / rate) if rate > 0 else float('inf')
+
+    def _schedule_bite(self, after):
+        s = self.settings
+        self.bite_at = after + self.rng.uniform(s['bite_delay_min'], s['bite_delay_max'])
+
+    def play(self, clip, start, pan=0.0):
+        self.sounds.append((start, clip, pan))
+
+    def on_key(self, timestamp, vk_code, action):
+        """Слушатель FakeKeyInjector"""
+        self.update(timestamp)
+        s = self.settings
+        if action == "down":
+            if self.state == "ready":
+                if timestamp >= self.ready_at:
+                    self.state = "charging"
+                    self.cast_down_at = timestamp
+                else:
+                    self.stats['ignored_casts'] += 1
+            elif self.state == "biting":
+                self.state = "hooked"
+                music_start = timestamp + s['music_delay']
+                if self.music_clip is not None:
+                    self.play(self.music_clip, music_start)
+                    self.music_end = music_start + self.music_clip.duration
+                else:
+                    duration = self.rng.uniform(s['music_min'], s['music_max'])
+                    self.play(self._music_clip(duration), music_start)
+                    self.music_end = music_start + duration
+            elif self.state == "waiting":
+                # Подсечка без клева сматывает удочку
+                self.state = "reeling_empty"
+                self.stats['empty_reels'] += 1
+        else:
+            if self.state == "charging":
+                if timestamp - self.cast_down_at >= s['min_cast_hold']:
+                    self.state = "waiting"
+                    self.stats['casts'] += 1
+                    splash_at = timestamp + s['splash_delay']
+                    self.play(self.splash_clip, splash_at, s['bobber_pan'])
+                    self._schedule_bite(splash_at)
+                else:
+                    self.state = "ready"
+            elif self.state == "hooked":
+                if timestamp >= self.music_end:
+                    self.stats['caught'] += 1
+                    self.play(self.catch_clip, timestamp)
+                else:
+                    self.stats['escaped'] += 1
+                    # Музыка обрывается вместе с подсечкой
+                    self.sounds = [(start, clip, pan) for start, clip, pan in self.sounds
+                                   if start + clip.duration < timestamp]
+                self.state = "ready"
+                self.ready_at = timestamp + s['ready_delay']
+            elif self.state == "reeling_empty":
+                self.state = "ready"
+                self.ready_at = timestamp + s['ready_delay']
+
+    def _music_clip(self, duration):
+        """Синтетическая музыка подсечки: ровный уровень, паузы и затухание в конце"""
+        s = self.settings
+        level = s['music_level']
+        gap = s['music_gap_duration']
+        fade = min(s['music_fade'], duration)
+        times, levels = [0.0], [level]
+
+        # Паузы не попадают в первую секунду и в затухание
+        end = duration - fade - gap
+        count = self.rng.poisson(s['music_gap_rate'] * duration / 60) if end > 1.0 else 0
+        last = 0.0
+        for start in np.sort(self.rng.uniform(1.0, end, count)) if count else ():
+            if start < last + 0.1:
+                continue
+            times += [start, start + 0.01, start + gap - 0.01, start + gap]
+            levels += [level, 0.0, 0.0, level]
+            last = start + gap
+        times += [duration - fade, duration]
+        levels += [level, 0.0 if fade else level]
+        return SoundClip(times, levels)
+
+    def update(self, now):
+        if self.state == "waiting" and now >= self.bite_at:
+            self.state = "biting"
+            self.stats['bites'] += 1
+            self.play(self.bite_clip, self.bite_at, self.settings['bobber_pan'])
+        if self.state == "biting" and now > self.bite_at + self.settings['hook_window']:
+            # Не успели подсечь - рыба ушла, клюнет следующая
+            self.state = "waiting"
+            self.stats['missed'] += 1
+            self._schedule_bite(now)
+
+    def level(self, now):
+        """Пиковая громкость игры в момент now"""
+        return max(self.channel_levels(now))
+
+    def channel_levels(self, now):
+        """Пики левого и правого каналов в момент now"""
+        self.update(now)
+        s = self.settings
+
+        if self.ambient_clip is not None and self.ambient_clip.duration > 0:
+            level = self.ambient_clip.level(now % self.ambient_clip.duration)
+        else:
+            level = max(self.rng.normal(s['noise_level'], s['noise_jitter']), 0.0)
+        left = right = level
+
+        if now >= self.next_spike:
+            spread = s['ambient_spike_pan']
+            self.play(self.spike_clip, self.next_spike, self.rng.uniform(-spread, spread))
+            self.next_spike = self._next_spike(now)
+
+        if self.sounds:
+            active = []
+            for start, clip, pan in self.sounds:
+                if now <= start + clip.duration:
+                    active.append((start, clip, pan))
+                    # Сторона ослабляет дальний канал, пик звука не меняется
+                    level = clip.level(now - start)
+                    left = max(left, level * min(1.0, 1.0 - pan))
+                    right = max(right, level * min(1.0, 1.0 + pan))
+            self.sounds = active
+        return left, right
+
+
+class Simulation:
+    """Полный цикл бота (fishing_cycle, детектор, ввод) против SimulatedGame по виртуальным часам
+
+    Цикл рыбалки бота работает как есть, вместо ожидания отсчётов он
+    вызывает sleep: виртуальное время идёт до таймера автомата или до
+    следующего отсчёта громкости, который сразу обрабатывается детектором.
+    """
+
+    def __init__(self, settings_file=SETTINGS_FILE, game_settings=None, seed=0):
+        self.clock = VirtualClock()
+        self.injector = FakeKeyInjector(clock=self.clock, sleep=self.clock.sleep)
+        discovery = DiscoveryService(FakeWindowProvider({SIM_WINDOW: ("VRChat", SIM_PID)}),
+                                     FakeSessionProvider({SIM_PID: "simulated"}), clock=self.clock)
+        self.bot = VRChatFishingBot(settings_file, self.injector, discovery, clock=self.clock, sleep=self.sleep)
+        if self.bot.bite_detector != "peak":
+            # PCM для спектрального детектора симуляция не генерирует
+            self.bot.bite_detector = "peak"
+
+        settings = dict(GAME_DEFAULTS)
+        settings.update(game_settings or {})
+        self.game = SimulatedGame(self.clock, settings, np.random.default_rng(seed))
+        self.injector.listeners.append(self.game.on_key)
+        self.bot.transition_listeners.append(self.on_transition)
+        self.cycle_starts = []
+
+        self.stop_event = threading.Event()
+        self.end = None
+        self.detector = None
+        self.source = None
+        self.next_sample = None
+        self.samples = 0
+
+    def on_transition(self, timestamp, previous, state, reason):
+        if state == STATE_CASTING:
+            self.cycle_starts.append(timestamp)
+
+    def run(self, duration):
+        """Симуляция duration виртуальных секунд, возвращает отчёт"""
+        bot = self.bot
+        clock = self.clock
+        self.detector = bot.create_detector()
+        self.source = FakeChannelMeterSource(self.game.channel_levels, clock)
+        self.end = clock() + duration
+        self.next_sample = clock()
+        self.samples = 0
+        self.stop_event.clear()
+
+        started = time.perf_counter()
+        bot.running = True
+        bot.fishing_cycle(self.stop_event)
+        bot.running = False
+        elapsed = time.perf_counter() - started
+        return self.report(duration, elapsed, self.samples)
+
+    def sleep(self, timeout):
+        """Сон цикла рыбалки: виртуальное время идёт до конца сна или до следующего отсчёта"""
+        bot = self.bot
+        clock = self.clock
+        now = clock()
+        if now >= self.end:
+            self.stop_event.set()
+            return
+        # Частота опроса могла вырасти при смене фазы
+        self.next_sample = min(self.next_sample, now + 1.0 / bot.phase_sample_rate(bot.phase))
+        if now + timeout < self.next_sample:
+            clock.advance_to(now + timeout)
+            return
+
+        clock.advance_to(self.next_sample)
+        bot.process_sample(self.detector, *self.source.read())
+        self.samples += 1
+        self.next_sample = clock() + 1.0 / bot.phase_sample_rate(bot.phase)
+
+    def report(self, duration, elapsed, samples):
+        cycle_times = np.diff(self.cycle_starts) if len(self.cycle_starts) > 1 else np.array([])
+        hours = duration / 3600
+        snapshot = self.bot.metrics.snapshot()
+        return {
+            'simulated_hours': hours,
+            'realtime_factor': duration / elapsed if elapsed else None,
+            'samples': samples,
+            'fish_per_hour': self.game.stats['caught'] / hours if hours else None,
+            'game': dict(self.game.stats),
+            'bot': snapshot['counters'],
+            'cycle_time': _distribution(cycle_times),
+            'phase_mean': {name: phase['mean'] for name, phase in snapshot['phases'].items()},
+        }
+
+
+def _distribution(values):
+    if not len(values):
+        return None
+    return {
+        'count': int(len(values)),
+        'mean': float(np.mean(values)),
+        'median': float(np.median(values)),
+        'p95': float(np.percentile(values, 95)),
+        'min': float(np.min(values)),
+        'max': float(np.max(values)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ускоренная симуляция цикла рыбалки по виртуальным часам")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="Файл настроек бота")
+    parser.add_argument("--game", help="JSON с параметрами игры (см. GAME_DEFAULTS)")
+    parser.add_argument("--hours", type=float, default=1.0, help="Длительность симуляции в часах")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора случайных чисел")
+    parser.add_argument("-o", "--output", help="Файл результата JSON")
+    parser.add_argument("--verbose", action="store_true", help="Выводить лог бота")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("vrchat_fishing_bot").setLevel(logging.WARNING)
+
+    game_settings = {}
+    if args.game:
+        with open(args.game, 'r', encoding='utf-8') as f:
+            game_settings = json.load(f)
+        unknown = set(game_settings) - set(GAME_DEFAULTS)
+        if unknown:
+            parser.error(f"Неизвестные параметры игры: {', '.join(sorted(unknown))}")
+
+    simulation = Simulation(args.settings, game_settings, args.seed)
+    result = simulation.run(args.hours * 3600)
+
+    print(f"Симуляция {result['simulated_hours']:.2f} ч за {args.hours * 3600 / result['realtime_factor']:.1f} с "
+          f"(x{result['realtime_factor']:.0f})")
+    print(f"Рыбы в час: {result['fish_per_hour']:.1f}")
+    print("Игра: " + ", ".join(f"{k} {v}" for k, v in result['game'].items()))
+    print("Бот: " + ", ".join(f"{k} {v:.0f}" for k, v in result['bot'].items()))
+    if result['cycle_time']:
+        c = result['cycle_time']
+        print(f"Время цикла: медиана {c['median']:.1f} с, среднее {c['mean']:.1f} с, "
+              f"p95 {c['p95']:.1f} с, мин {c['min']:.1f} с, макс {c['max']:.1f} с")
+    print("Средняя длительность фаз: " + ", ".join(
+        f"{name} {mean:.2f} с" for name, mean in sorted(result['phase_mean'].items()) if mean is not None))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f"Результат сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import time
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Параметры анализа по умолчанию
+DEFAULT_FRAME_SIZE = 1024
+DEFAULT_HOP = 512
+DEFAULT_BANDS = 32
+MIN_FREQUENCY = 100.0
+MAX_FREQUENCY = 10000.0
+# Кадры тише этого уровня (дБ относительно полной шкалы) не сравниваются с шаблоном
+DEFAULT_MIN_LEVEL_DB = -50.0
+# Для шаблона берутся кадры не тише максимума минус это значение (дБ)
+TEMPLATE_LEVEL_RANGE_DB = 20.0
+EPSILON = 1e-12
+
+
+def read_wav(path):
+    """Чтение WAV файла: (моно сигнал float32 в диапазоне -1..1, частота дискретизации)"""
+    with wave.open(path, 'rb') as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    return pcm_to_float(raw, width, channels), sample_rate
+
+
+def pcm_to_float(raw, width, channels):
+    """Преобразование PCM байтов в моно float32"""
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 3:
+        bytes_ = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        ints = (bytes_[:, 0].astype(np.int32) | (bytes_[:, 1].astype(np.int32) << 8)
+                | (bytes_[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        data = ints.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        data = np.frombuffer(raw, dtype='<i4').astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"Неподдерживаемая разрядность WAV: {width * 8} бит")
+
+    if channels > 1:
+        data = data[:len(data) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return data
+
+
+def band_matrix(sample_rate, frame_size, bands=DEFAULT_BANDS,
+                min_frequency=MIN_FREQUENCY, max_frequency=MAX_FREQUENCY):
+    """Матрица суммирования бинов спектра в логарифмически расположенные полосы"""
+    frequencies = np.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+    max_frequency = min(max_frequency, sample_rate / 2)
+    edges = np.geomspace(min_frequency, max_frequency, bands + 1)
+    index = np.searchsorted(edges, frequencies, side='right') - 1
+    matrix = np.zeros((len(frequencies), bands), dtype=np.float32)
+    valid = (index >= 0) & (index < bands)
+    matrix[np.nonzero(valid)[0], index[valid]] = 1.0
+    return matrix
+
+
+class SpectralAnalyzer:
+    """Векторизованное кратковременное преобразование Фурье по полосам"""
+
+    def __init__(self, sample_rate, frame_size=DEFAULT_FRAME_SIZE, hop=DEFAULT_HOP, bands=DEFAULT_BANDS):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop = hop
+        self.bands = bands
+        self.window = np.hanning(frame_size).astype(np.float32)
+        self.band_matrix = band_matrix(sample_rate, frame_size, bands)
+        # Нормировка уровня: синус полной амплитуды даёт около 0 дБ
+        self.level_reference = float(self.window.sum() / 2) ** 2
+
+    def frames(self, signal):
+        """Кадры сигнала с шагом hop (без копирования)"""
+        if len(signal) < self.frame_size:
+            return np.empty((0, self.frame_size), dtype=np.float32)
+        return sliding_window_view(signal, self.frame_size)[::self.hop]
+
+    def analyze(self, signal):
+        """Признаки всех кадров сигнала: (профили полос, уровни в дБ)
+
+        Профиль - логарифм энергии полос без среднего, нормированный по длине,
+        поэтому сравнение с шаблоном не зависит от громкости.
+        """
+        frames = self.frames(np.asarray(signal, dtype=np.float32))
+        if len(frames) == 0:
+            return np.empty((0, self.bands), dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        spectrum = np.fft.rfft(frames * self.window, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        band_energy = power @ self.band_matrix
+
+        levels = 10.0 * np.log10(band_energy.sum(axis=1) / self.level_reference + EPSILON)
+        profiles = np.log(band_energy + EPSILON)
+        profiles -= profiles.mean(axis=1, keepdims=True)
+        profiles /= np.linalg.norm(profiles, axis=1, keepdims=True) + EPSILON
+        return profiles.astype(np.float32), levels.astype(np.float32)
+
+
+class SpectralTemplate:
+    """Спектральный шаблон звука (средний профиль полос)"""
+
+    def __init__(self, name, profile, sample_rate, frame_size=DEFAULT_FRAME_SIZE, hop=DEFAULT_HOP):
+        self.name = name
+        self.profile = np.asarray(profile, dtype=np.float32)
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop = hop
+
+    @classmethod
+    def from_signal(cls, name, signal, sample_rate, frame_size=DEFAULT_FRAME_SIZE, hop=DEFAULT_HOP,
+                    bands=DEFAULT_BANDS):
+        """Построение шаблона по записи звука"""
+        analyzer = SpectralAnalyzer(sample_rate, frame_size, hop, bands)
+        profiles, levels = analyzer.analyze(signal)
+        if len(profiles) == 0:
+            raise ValueError("Запись слишком короткая для построения шаблона")
+
+        # Усредняем только громкую часть записи
+        loud = levels >= levels.max() - TEMPLATE_LEVEL_RANGE_DB
+        profile = profiles[loud].mean(axis=0)
+        profile /= np.linalg.norm(profile) + EPSILON
+        return cls(name, profile, sample_rate, frame_size, hop)
+
+    @classmethod
+    def from_wav(cls, name, path, start=None, end=None, **kwargs):
+        """Построение шаблона по WAV файлу (опционально по отрезку в секундах)"""
+        signal, sample_rate = read_wav(path)
+        first = int(start * sample_rate) if start is not None else 0
+        last = int(end * sample_rate) if end is not None else len(signal)
+        return cls.from_signal(name, signal[first:last], sample_rate, **kwargs)
+
+    def save(self, path):
+        """Сохранение шаблона в .npz"""
+        np.savez(path, name=self.name, profile=self.profile, sample_rate=self.sample_rate,
+                 frame_size=self.frame_size, hop=self.hop)
+
+    @classmethod
+    def load(cls, path):
+        """Загрузка шаблона из .npz"""
+        with np.load(path) as data:
+            return cls(str(data['name']), data['profile'], int(data['sample_rate']),
+                       int(data['frame_size']), int(data['hop']))
+
+
+def check_templates(templates):
+    """Проверка, что шаблоны построены с одинаковыми параметрами анализа"""
+    first = templates[0]
+    expected = (first.sample_rate, first.frame_size, first.hop, len(first.profile))
+    for template in templates[1:]:
+        actual = (template.sample_rate, template.frame_size, template.hop, len(template.profile))
+        if actual != expected:
+            raise ValueError(f"Шаблон '{template.name}' построен с параметрами (частота, кадр, шаг, полосы) "
+                             f"{actual}, а шаблон '{first.name}' - с {expected}")
+
+
+class SpectralDetector:
+    """Потоковый детектор звуков по спектральным шаблонам
+
+    Принимает сырые PCM кадры произвольной длины, считает признаки всех
+    полных кадров за один вызов и сравнивает их со всеми шаблонами
+    косинусной мерой. Событие выдаётся по переднему фронту совпадения.
+    """
+
+    def __init__(self, templates, sample_rate, frame_size=DEFAULT_FRAME_SIZE, hop=DEFAULT_HOP,
+                 similarity_threshold=0.8, min_level_db=DEFAULT_MIN_LEVEL_DB, cooldown=0.5):
+        self.templates = list(templates)
+        self.analyzer = SpectralAnalyzer(sample_rate, frame_size, hop,
+                                         len(self.templates[0].profile) if self.templates else DEFAULT_BANDS)
+        self.template_matrix = np.stack([t.profile for t in self.templates], axis=1)
+        self.similarity_threshold = similarity_threshold
+        self.min_level_db = min_level_db
+        self.cooldown = cooldown
+        self.reset()
+
+    def reset(self):
+        """Сброс состояния потока"""
+        self.carry = np.empty(0, dtype=np.float32)
+        self.samples_consumed = 0  # Номер первого отсчёта в carry
+        self.active = np.zeros(len(self.templates), dtype=bool)
+        self.last_event_time = np.full(len(self.templates), -np.inf)
+
+    def scores(self, signal):
+        """Сходство каждого кадра с каждым шаблоном: (scores [кадры x шаблоны], уровни)"""
+        profiles, levels = self.analyzer.analyze(signal)
+        scores = profiles @ self.template_matrix
+        scores[levels < self.min_level_db] = 0.0
+        return scores, levels
+
+    def process(self, pcm):
+        """Обработка очередного блока PCM, возвращает список (время_с, имя_шаблона, сходство)"""
+        signal = np.concatenate((self.carry, np.asarray(pcm, dtype=np.float32)))
+        frame_size = self.analyzer.frame_size
+        hop = self.analyzer.hop
+        if len(signal) < frame_size:
+            self.carry = signal
+            return []
+
+        frame_count = (len(signal) - frame_size) // hop + 1
+        scores, _ = self.scores(signal[:(frame_count - 1) * hop + frame_size])
+        frame_times = (self.samples_consumed + np.arange(frame_count) * hop + frame_size) \
+            / self.analyzer.sample_rate
+
+        # Оставляем хвост для следующего вызова
+        consumed = frame_count * hop
+        self.carry = signal[consumed:]
+        self.samples_consumed += consumed
+
+        return self._events(scores, frame_times)
+
+    def _events(self, scores, frame_times):
+        """Поиск передних фронтов совпадений с учётом cooldown"""
+        events = []
+        matches = scores >= self.similarity_threshold
+        for column, template in enumerate(self.templates):
+            column_matches = matches[:, column]
+            previous = np.concatenate(([self.active[column]], column_matches[:-1]))
+            for frame in np.nonzero(column_matches & ~previous)[0]:
+                frame_time = frame_times[frame]
+                if frame_time - self.last_event_time[column] > self.cooldown:
+                    events.append((float(frame_time), template.name, float(scores[frame, column])))
+                    self.last_event_time[column] = frame_time
+            if len(column_matches):
+                self.active[column] = column_matches[-1]
+        events.sort()
+        return events
+
+
+class LinearResampler:
+    """Потоковая линейная передискретизация блоков float32 без разрывов между блоками"""
+
+    def __init__(self, source_rate, target_rate):
+        self.step = source_rate / target_rate
+        self.offset = 1.0  # Позиция следующего выходного отсчёта относительно последнего входного
+        self.last = 0.0
+
+    def process(self, block):
+        if self.step == 1.0:
+            return block
+        data = np.concatenate(([self.last], block))
+        positions = np.arange(self.offset, len(data) - 1, self.step)
+        end = len(data) - 1
+        self.offset = (positions[-1] + self.step if len(positions) else self.offset) - end
+        self.last = data[-1]
+        return np.interp(positions, np.arange(len(data)), data).astype(np.float32)
+
+
+class LoopbackPcmSource:
+    """Захват звука, который воспроизводит устройство вывода по умолчанию (WASAPI loopback)
+
+    Нужен pyaudiowpatch (pyaudio с поддержкой loopback, только Windows).
+    Захват идёт на частоте устройства и передискретизируется к частоте
+    шаблона. Звук других программ на том же устройстве тоже попадает в
+    захват.
+    """
+
+    def __init__(self, sample_rate=44100, chunk_size=DEFAULT_FRAME_SIZE):
+        import pyaudiowpatch
+
+        self.audio = pyaudiowpatch.PyAudio()
+        device = self.audio.get_default_wasapi_loopback()
+        self.device_name = device['name']
+        self.channels = int(device['maxInputChannels'])
+        device_rate = int(device['defaultSampleRate'])
+        self.chunk_size = max(int(round(chunk_size * device_rate / sample_rate)), 1)
+        self.resampler = LinearResampler(device_rate, sample_rate)
+        self.stream = self.audio.open(format=pyaudiowpatch.paInt16, channels=self.channels, rate=device_rate,
+                                      input=True, input_device_index=device['index'],
+                                      frames_per_buffer=self.chunk_size)
+
+    def read(self):
+        """Чтение одного блока в виде моно float32 на частоте шаблона"""
+        raw = self.stream.read(self.chunk_size, exception_on_overflow=False)
+        return self.resampler.process(pcm_to_float(raw, 2, self.channels))
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+
+class PyAudioPcmSource:
+    """Захват PCM с устройства ввода через pyaudio
+
+    Запасной вариант без loopback: устройство записи выхода
+    (например, "Стерео микшер" или виртуальный кабель) по индексу.
+    """
+
+    def __init__(self, device_index=None, sample_rate=44100, chunk_size=DEFAULT_FRAME_SIZE, channels=2):
+        import pyaudio
+
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.channels = channels
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(format=pyaudio.paInt16, channels=channels, rate=sample_rate,
+                                      input=True, input_device_index=device_index,
+                                      frames_per_buffer=chunk_size)
+
+    def read(self):
+        """Чтение одного блока в виде моно float32"""
+        raw = self.stream.read(self.chunk_size, exception_on_overflow=False)
+        return pcm_to_float(raw, 2, self.channels)
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+
+def scan_wav(path, templates, similarity_threshold=0.8, min_level_db=DEFAULT_MIN_LEVEL_DB,
+             block_size=DEFAULT_FRAME_SIZE * 64):
+    """Офлайн прогон WAV файла через потоковый детектор"""
+    check_templates(templates)
+    signal, sample_rate = read_wav(path)
+    first = templates[0]
+    if first.sample_rate != sample_rate:
+        raise ValueError(f"Частота файла {sample_rate} Гц не совпадает с шаблоном {first.sample_rate} Гц")
+
+    detector = SpectralDetector(templates, sample_rate, first.frame_size, first.hop,
+                                similarity_threshold, min_level_db)
+    events = []
+    for start in range(0, len(signal), block_size):
+        events.extend(detector.process(signal[start:start + block_size]))
+    return events, len(signal) / sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Спектральный детектор звуков рыбалки")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    template_parser = subparsers.add_parser("template", help="Построить шаблон по WAV файлу")
+    template_parser.add_argument("wav")
+    template_parser.add_argument("-o", "--output", required=True, help="Файл шаблона .npz")
+    template_parser.add_argument("--name", default="bite", help="Имя шаблона (bite, music)")
+    template_parser.add_argument("--start", type=float, help="Начало отрезка (сек)")
+    template_parser.add_argument("--end", type=float, help="Конец отрезка (сек)")
+
+    scan_parser = subparsers.add_parser("scan", help="Найти звуки в WAV файле")
+    scan_parser.add_argument("wav")
+    scan_parser.add_argument("templates", nargs="+", help="Файлы шаблонов .npz")
+    scan_parser.add_argument("--similarity", type=float, default=0.8)
+    scan_parser.add_argument("--min-level", type=float, default=DEFAULT_MIN_LEVEL_DB)
+
+    args = parser.parse_args()
+
+    if args.command == "template":
+        template = SpectralTemplate.from_wav(args.name, args.wav, args.start, args.end)
+        template.save(args.output)
+        print(f"Шаблон '{template.name}' сохранён в {args.output}")
+    else:
+        templates = [SpectralTemplate.load(path) for path in args.templates]
+        started = time.perf_counter()
+        events, duration = scan_wav(args.wav, templates, args.similarity, args.min_level)
+        elapsed = time.perf_counter() - started
+        for event_time, name, score in events:
+            print(f"{event_time:10.3f}  {name:<10} {score:.3f}")
+        print(f"Обработано {duration:.1f} с аудио за {elapsed:.2f} с "
+              f"({duration / max(elapsed, EPSILON):.0f}x реального времени)")
+
+
+if __name__ == "__main__":
+    main()
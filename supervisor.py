@@ -0,0 +1,198 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед первым перезапуском и её предел (секунды)
+INITIAL_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+# Сколько поток должен проработать без сбоев, чтобы задержка сбросилась (секунды)
+HEALTHY_RESET = 60.0
+# Период проверки потоков (секунды)
+CHECK_INTERVAL = 0.1
+
+
+class SupervisedWorker:
+    """Рабочий поток под наблюдением супервизора
+
+    target вызывается как target(stop_event) и должен завершаться, когда
+    stop_event установлен. Возврат True - штатное завершение (перезапуск не
+    нужен), False или исключение - сбой. progress - необязательная функция,
+    возвращающая счётчик работы (например, число отсчётов громкости): если
+    он не меняется stall_timeout секунд, поток считается зависшим. None
+    вместо счётчика - поток ждёт внешний ресурс, проверка приостановлена.
+    """
+
+    def __init__(self, name, target, progress=None, stall_timeout=None, required=False):
+        self.name = name
+        self.target = target
+        self.progress = progress
+        self.stall_timeout = stall_timeout
+        self.required = required  # Без этого потока цикл рыбалки ставится на паузу
+
+        self.thread = None
+        self.stop_event = None
+        self.finished = False  # Поток завершился штатно
+        self.failed = False  # Последний запуск закончился сбоем
+        self.restarts = 0
+        self.failures = 0
+        self.stalls = 0
+        self.backoff = INITIAL_BACKOFF
+        self.restart_at = None  # Момент запланированного перезапуска
+        self.started_at = None
+        self.last_progress = None
+        self.last_progress_time = None
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self, stop_event):
+        try:
+            result = self.target(stop_event)
+        except Exception as e:
+            logger.exception(f"Поток {self.name} завершился с ошибкой: {e}")
+            result = False
+        # Результат устаревшего (заменённого) потока не учитываем
+        if stop_event is self.stop_event:
+            if result:
+                self.finished = True
+            else:
+                self.failed = True
+
+
+class Supervisor:
+    """Запуск рабочих потоков, обнаружение падения и зависания, перезапуск с нарастающей задержкой
+
+    input_ready установлен, пока все обязательные потоки работают и выдают данные.
+    """
+
+    def __init__(self, on_log=None, clock=time.monotonic, check_interval=CHECK_INTERVAL):
+        self.on_log = on_log or logger.info
+        self.clock = clock
+        self.check_interval = check_interval
+        self.workers = []
+        self.input_ready = threading.Event()
+        self.running = False
+        self.thread = None
+        self.unavailable_since = None
+        self.unavailable_time = 0.0  # Суммарное время без входных данных (секунды)
+
+    def add(self, worker):
+        self.workers.append(worker)
+        return worker
+
+    def start(self):
+        """Запуск всех потоков и наблюдения за ними"""
+        self.running = True
+        for worker in self.workers:
+            self._start_worker(worker)
+        self._update_input()
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        """Остановка наблюдения и всех потоков"""
+        self.running = False
+        for worker in self.workers:
+            if worker.stop_event is not None:
+                worker.stop_event.set()
+        # Будим ожидающих входные данные, чтобы они увидели остановку
+        self.input_ready.set()
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.thread.join(timeout=timeout)
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+
+    def _watch(self):
+        while self.running:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def check(self):
+        """Один проход проверки потоков"""
+        now = self.clock()
+        for worker in self.workers:
+            if worker.finished:
+                continue
+
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    worker.restarts += 1
+                    self.on_log(f"Перезапуск потока {worker.name} (попытка {worker.restarts})")
+                    self._start_worker(worker)
+                continue
+
+            if not worker.is_alive() or worker.failed:
+                worker.failures += 1
+                self._schedule_restart(worker, now, "остановился")
+            elif self._is_stalled(worker, now):
+                worker.stalls += 1
+                # Зависший поток нельзя прервать - просим его завершиться и запускаем новый
+                worker.stop_event.set()
+                self._schedule_restart(worker, now, f"не выдаёт данные {worker.stall_timeout:.1f}с")
+            elif now - worker.started_at >= HEALTHY_RESET:
+                worker.backoff = INITIAL_BACKOFF
+
+        self._update_input()
+
+    def _is_stalled(self, worker, now):
+        if worker.progress is None or not worker.stall_timeout:
+            return False
+        value = worker.progress()
+        if value is None or value != worker.last_progress:
+            worker.last_progress = value
+            worker.last_progress_time = now
+            return False
+        return now - worker.last_progress_time > worker.stall_timeout
+
+    def _schedule_restart(self, worker, now, reason):
+        self.on_log(f"Поток {worker.name} {reason}, перезапуск через {worker.backoff:.1f}с")
+        worker.restart_at = now + worker.backoff
+        worker.backoff = min(worker.backoff * 2, MAX_BACKOFF)
+
+    def _start_worker(self, worker):
+        now = self.clock()
+        worker.stop_event = threading.Event()
+        worker.failed = False
+        worker.restart_at = None
+        worker.started_at = now
+        worker.last_progress = worker.progress() if worker.progress else None
+        worker.last_progress_time = now
+        worker.thread = threading.Thread(target=worker._run, args=(worker.stop_event,),
+                                         name=worker.name, daemon=True)
+        worker.thread.start()
+
+    def _update_input(self):
+        available = self.running and all(
+            worker.restart_at is None and worker.is_alive()
+            for worker in self.workers if worker.required)
+        now = self.clock()
+        if available:
+            if self.unavailable_since is not None:
+                self.unavailable_time += now - self.unavailable_since
+                self.unavailable_since = None
+                self.on_log("Входные данные снова доступны")
+            self.input_ready.set()
+        elif self.running:
+            if self.unavailable_since is None:
+                self.unavailable_since = now
+            self.input_ready.clear()
+
+    def stats(self):
+        """Перезапуски, сбои и зависания по потокам и время без входных данных"""
+        unavailable = self.unavailable_time
+        if self.unavailable_since is not None:
+            unavailable += self.clock() - self.unavailable_since
+        return {
+            'workers': {
+                worker.name: {
+                    'restarts': worker.restarts,
+                    'failures': worker.failures,
+                    'stalls': worker.stalls,
+                }
+                for worker in self.workers
+            },
+            'unavailable': unavailable,
+        }
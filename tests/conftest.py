@@ -0,0 +1,20 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    """Создание файла настроек бота: settings_file(**overrides) -> путь"""
+    def create(**overrides):
+        settings = {'log_file': ""}
+        settings.update(overrides)
+        path = tmp_path / "settings.json"
+        path.write_text(json.dumps(settings, indent=4, ensure_ascii=False), encoding='utf-8')
+        return str(path)
+    return create
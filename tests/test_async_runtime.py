@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from async_runtime import AsyncFishingRuntime, ExecutorKeyInjector
+from discovery import DiscoveryService, FakeSessionProvider, FakeWindowProvider
+from fishing_machine import FishingStateMachine
+from input_injection import VK_E, FakeKeyInjector, ForegroundLock, SharedKeyInjector
+from vrchat_fishing_bot import VRChatFishingBot
+
+
+def test_executor_injector_reports_activation_result():
+    injector = FakeKeyInjector()
+    lock = ForegroundLock()
+    other = object()
+    lock.acquire(other, 0)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        wrapped = ExecutorKeyInjector(SharedKeyInjector(injector, lock), executor)
+
+        # Ввод занят другим клиентом - окно не активировано
+        assert not wrapped.ensure_foreground(1, wait=0.01)
+        lock.release(other)
+        assert wrapped.ensure_foreground(1, wait=0.01)
+        wrapped.key_down(VK_E)
+        wrapped.key_up(VK_E)
+
+    assert injector.foreground == 1
+    assert [action for _, _, action in injector.events] == ["down", "up"]
+
+
+def test_window_activated_outside_event_loop(settings_file):
+    discovery = DiscoveryService(FakeWindowProvider({1: ("VRChat", 10)}), FakeSessionProvider({10: "session"}))
+    bot = VRChatFishingBot(settings_file(), FakeKeyInjector(), discovery)
+    runtime = AsyncFishingRuntime(bot)
+    threads = []
+    activate = bot.activate_vrchat_window
+
+    def recording_activate(wait=None):
+        threads.append(threading.current_thread())
+        return activate(wait)
+
+    bot.activate_vrchat_window = recording_activate
+
+    async def main():
+        runtime.loop = asyncio.get_running_loop()
+        runtime.input_executor = ThreadPoolExecutor(max_workers=1)
+        runtime.machine = FishingStateMachine(bot, bot.clock)
+        result = runtime.loop.create_future()
+        runtime.activate_window(None, result.set_result)
+        try:
+            return await asyncio.wait_for(result, 5), threading.current_thread()
+        finally:
+            runtime.input_executor.shutdown(wait=True)
+
+    activated, loop_thread = asyncio.run(main())
+
+    assert activated
+    assert bot.injector.foreground == 1
+    assert threads and threads[0] is not loop_thread
@@ -0,0 +1,62 @@
+import numpy as np
+
+from audio_sources import FakeChannelMeterSource, TraceFileSource, load_trace, save_trace
+from vrchat_fishing_bot import VRChatFishingBot
+
+
+def make_trace(path, rate=200, duration=3.0, spike_at=1.0):
+    """Трейс шума с одним громким звуком (клевом)"""
+    timestamps = np.arange(0.0, duration, 1.0 / rate)
+    peaks = np.full(len(timestamps), 0.003)
+    peaks[(timestamps >= spike_at) & (timestamps < spike_at + 0.2)] = 0.2
+    save_trace(path, timestamps, peaks)
+    return timestamps, peaks
+
+
+def test_trace_roundtrip(tmp_path):
+    path = tmp_path / "trace.csv"
+    timestamps, peaks = make_trace(path)
+
+    loaded_timestamps, loaded_peaks = load_trace(path)
+
+    np.testing.assert_allclose(loaded_timestamps, timestamps, atol=1e-6)
+    np.testing.assert_allclose(loaded_peaks, peaks, atol=1e-6)
+
+
+def test_trace_source_reads_in_order_and_rewinds(tmp_path):
+    path = tmp_path / "trace.csv"
+    timestamps, _ = make_trace(path, duration=1.0)
+    source = TraceFileSource(path, realtime=False)
+
+    samples = []
+    while (sample := source.read()) is not None:
+        samples.append(sample)
+
+    assert len(samples) == len(source) == len(timestamps)
+    assert [timestamp for timestamp, _ in samples] == sorted(timestamp for timestamp, _ in samples)
+    assert source.duration == samples[-1][0] - samples[0][0]
+    source.rewind()
+    assert source.read() == samples[0]
+
+
+def test_trace_replay_detects_bite(tmp_path, settings_file):
+    path = tmp_path / "trace.csv"
+    make_trace(path, spike_at=1.0)
+    bot = VRChatFishingBot(settings_file(audio_threshold=0.05, spike_cooldown=0.5))
+    detector = bot.create_detector()
+    events = bot.events.subscribe()
+    source = TraceFileSource(path, realtime=False)
+
+    while (sample := source.read()) is not None:
+        bot.process_sample(detector, *sample)
+
+    detections = [event for event in events.drain() if event.kind == 'sound_detected']
+    assert len(detections) == 1
+    assert 1.0 <= detections[0].timestamp < 1.1
+    assert bot.samples.count == len(source)
+
+
+def test_fake_channel_source_reports_loudest_channel():
+    source = FakeChannelMeterSource(lambda now: (0.1, now), clock=lambda: 0.3)
+
+    assert source.read() == (0.3, 0.3, (0.1, 0.3))
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+from audio_sources import save_trace
+from benchmark import DEFAULT_SETTINGS, find_music_release, match_detections, run_benchmark, summarize
+
+NOISE = 0.003
+BITES = [10.0, 40.0]
+MUSIC = [[11.0, 16.0], [41.0, 46.0]]
+FALSE_SPIKE = 25.0
+
+
+def labelled_trace(directory):
+    """Трейс 60 с (20 Гц): два клева с музыкой подсечки и один посторонний всплеск"""
+    timestamps = np.arange(0.0, 60.0, 0.05)
+    peaks = np.full(len(timestamps), NOISE)
+    for bite in BITES + [FALSE_SPIKE]:
+        peaks[(timestamps >= bite) & (timestamps < bite + 0.3)] = 0.2
+    for start, end in MUSIC:
+        peaks[(timestamps >= start) & (timestamps < end)] = 0.06
+    save_trace(directory / "session.csv", timestamps, peaks)
+    (directory / "session.json").write_text(json.dumps({'bites': BITES, 'music': MUSIC}), encoding='utf-8')
+
+
+def test_match_detections():
+    detections = [9.95, 10.5, 12.0, 25.0, 40.3]
+
+    latencies, false_positives = match_detections(detections, BITES, [tuple(m) for m in MUSIC])
+
+    # 9.95 - в окне до клева, 10.5 - повтор, 12.0 - во время музыки
+    assert latencies == pytest.approx([-0.05, 0.3])
+    assert false_positives == 2
+
+
+def test_find_music_release():
+    timestamps = np.arange(0.0, 30.0, 0.05)
+    smoothed = np.where((timestamps >= 6.0) & (timestamps < 12.0), 0.06, NOISE)
+    settings = dict(DEFAULT_SETTINGS, min_reel_time=5.0, additional_wait=1.5)
+
+    release = find_music_release(timestamps, smoothed, 0.0, settings)
+
+    # Последний громкий отсчёт 11.95, тишина дольше additional_wait
+    assert release == pytest.approx(11.95 + 1.5 + 0.05)
+    assert find_music_release(timestamps, np.full(len(timestamps), NOISE), 0.0, settings) is None
+
+
+def test_benchmark_on_labelled_trace(tmp_path):
+    labelled_trace(tmp_path)
+
+    summary, per_recording = run_benchmark(str(tmp_path), dict(DEFAULT_SETTINGS))
+
+    result = per_recording["session.csv"]
+    assert result['bites'] == 2
+    assert result['false_positives'] == 1
+    assert len(result['latencies']) == 2
+    assert all(0.0 <= latency <= 0.1 for latency in result['latencies'])
+    # E отпускается после additional_wait тишины и затухания сглаженной громкости
+    # (затухание 0.06 -> music_threshold за 0.2 с, затем 1.5 с тишины и отсчёт после неё)
+    assert result['music_latencies'] == pytest.approx([1.75, 1.75])
+
+    assert summary['true_positives'] == 2
+    assert summary['recall'] == 1.0
+    assert summary['precision'] == pytest.approx(2 / 3)
+    assert summary['false_positives_per_hour'] == pytest.approx(1 / (result['duration'] / 3600))
+    assert summary['latency_median_ms'] == pytest.approx(np.median(result['latencies']) * 1000)
+
+
+def test_summarize_without_detections():
+    summary = summarize([{'samples': 0, 'duration': 0.0, 'elapsed': 0.0, 'bites': 0, 'detections': 0,
+                          'latencies': [], 'false_positives': 0, 'music_latencies': []}])
+
+    assert summary['precision'] is None
+    assert summary['recall'] is None
+    assert summary['latency_median_ms'] is None
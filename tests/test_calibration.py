@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from calibration import P2Quantile, ThresholdCalibrator
+from phases import PHASE_COOLDOWN
+from vrchat_fishing_bot import VRChatFishingBot
+
+
+def test_p2_median_matches_numpy():
+    values = np.random.default_rng(0).lognormal(size=2000)
+    estimator = P2Quantile(0.5)
+    for value in values:
+        estimator.add(value)
+
+    assert estimator.value() == pytest.approx(np.median(values), rel=0.05)
+
+
+def test_calibration_needs_window_duration():
+    calibrator = ThresholdCalibrator(audio_factor=4.0, music_factor=2.0, band=4.0, min_duration=1.0)
+    for step in range(10):
+        calibrator.add(step * 0.05, 0.01)
+
+    # Десять отсчётов за полсекунды - мало
+    assert calibrator.calibrate(0.05, 0.01) is None
+
+    for step in range(10, 25):
+        calibrator.add(step * 0.05, 0.01)
+    audio, music, floor = calibrator.calibrate(0.05, 0.01)
+    assert floor == pytest.approx(0.01)
+    assert audio == pytest.approx(0.04)
+    # Пороги в пределах band от ручных: шум * множитель
+    assert music == pytest.approx(0.02)
+
+    calibrator.reset()
+    assert calibrator.duration == 0.0
+    assert calibrator.calibrate(0.05, 0.01) is None
+
+
+@pytest.mark.parametrize("noise, expected", [
+    (0.2, (0.2, 0.04)),  # Громкий шум: не выше ручного значения * band
+    (0.0001, (0.0125, 0.0025)),  # Почти тишина: не ниже ручного значения / band
+])
+def test_calibrated_thresholds_clamped_to_band(noise, expected):
+    calibrator = ThresholdCalibrator(audio_factor=4.0, music_factor=2.0, band=4.0, min_duration=0.5)
+    for step in range(20):
+        calibrator.add(step * 0.05, noise)
+
+    audio, music, floor = calibrator.calibrate(0.05, 0.01)
+
+    assert floor == pytest.approx(noise)
+    assert (audio, music) == pytest.approx(expected)
+
+
+def test_cooldown_sampled_faster_with_auto_calibration(settings_file):
+    bot = VRChatFishingBot(settings_file(auto_calibrate=False))
+    slow = bot.phase_sample_rate(PHASE_COOLDOWN)
+    bot.auto_calibrate = True
+
+    rate = bot.phase_sample_rate(PHASE_COOLDOWN)
+
+    assert rate > slow
+    # Самая короткая пауза после заброса даёт калибровке достаточно отсчётов
+    assert bot.min_cooldown_after_cast - 1.0 / rate >= bot.calibrator.min_duration
+    assert rate * bot.calibrator.min_duration >= bot.calibrator.min_samples
@@ -0,0 +1,126 @@
+import pytest
+
+from channel_balance import BALANCE_WINDOW, MIN_BITES, BalanceGate, ChannelBalance, channel_balance
+from phases import PHASE_BITE_WAIT
+from vrchat_fishing_bot import VRChatFishingBot
+
+RATE = 200
+
+
+def pan(balance, level=0.2):
+    """Пики каналов звука с заданным балансом"""
+    return level * (1 - balance), level * (1 + balance)
+
+
+def check(gate, start, channels):
+    """Срабатывание в момент start и отсчёты каналов до решения гейта"""
+    held = gate.begin(start, 0.2, start)
+    step = 0
+    while True:
+        timestamp = start + step / RATE
+        decision = gate.add(timestamp, channels(step) if callable(channels) else channels)
+        if timestamp - start >= BALANCE_WINDOW:
+            return held, decision
+        step += 1
+
+
+def learned_gate(balance=0.4):
+    """Гейт, запомнивший MIN_BITES пойманных клевов с одной стороны"""
+    gate = BalanceGate()
+    for index in range(MIN_BITES):
+        check(gate, index * 10.0, pan(balance))
+        gate.confirm()
+    assert gate.ready
+    return gate
+
+
+def test_channel_balance():
+    assert channel_balance((1.0, 0.0)) == (-1.0, 1.0)
+    assert channel_balance((0.1, 0.1)) == (0.0, pytest.approx(0.2))
+    assert channel_balance((0.0, 0.0)) is None
+
+
+def test_balance_weighted_by_loudness():
+    feature = ChannelBalance()
+    feature.add(pan(-1.0, 0.01))  # Тихий фон слева
+    feature.add(pan(0.5, 0.2))
+    assert feature.mean == pytest.approx(0.5, abs=0.01)
+    assert feature.jitter < 0.1
+
+
+def test_gate_passes_bites_until_learned():
+    gate = BalanceGate()
+
+    held, decision = check(gate, 0.0, pan(-0.9))
+
+    # Пока образцов нет, событие не удерживается и не отклоняется
+    assert not held
+    assert decision is None
+    assert gate.candidate == pytest.approx(-0.9)
+
+
+def test_gate_accepts_bite_from_same_side():
+    gate = learned_gate(0.4)
+
+    held, decision = check(gate, 100.0, pan(0.45))
+
+    assert held
+    timestamp, value, wall_time, accepted = decision
+    assert (timestamp, value, wall_time) == (100.0, 0.2, 100.0)
+    assert accepted
+
+
+def test_gate_rejects_sound_from_other_side():
+    gate = learned_gate(0.4)
+
+    _, decision = check(gate, 100.0, pan(-0.5))
+
+    assert not decision[3]
+    balance, _ = gate.last
+    assert balance == pytest.approx(-0.5)
+
+
+def test_gate_rejects_unsteady_balance():
+    gate = learned_gate(0.4)
+
+    # Средний баланс как у клева, но звук мечется между каналами
+    _, decision = check(gate, 100.0, lambda step: pan(0.4 + (0.6 if step % 2 else -0.6)))
+
+    assert not decision[3]
+    assert gate.last[1] > gate.max_jitter
+
+
+def test_only_confirmed_bites_become_reference():
+    gate = learned_gate(0.4)
+
+    check(gate, 100.0, pan(0.3))
+    check(gate, 110.0, pan(-0.5))  # Отклонён - не кандидат
+    gate.confirm()
+
+    assert list(gate.bites)[-1] == pytest.approx(0.3)
+    center, tolerance = gate.reference()
+    assert center == pytest.approx(0.4)
+    assert tolerance == gate.tolerance
+
+
+def test_bot_holds_bite_until_balance_checked(settings_file):
+    bot = VRChatFishingBot(settings_file(audio_threshold=0.05, spike_cooldown=0.5), clock=lambda: 0.0)
+    bot.balance_gate = learned_gate(0.4)
+    bot.set_phase(PHASE_BITE_WAIT)
+    detector = bot.create_detector()
+    events = bot.events.subscribe()
+
+    def play(start, channels):
+        for step in range(int(0.3 * RATE)):
+            timestamp = start + step / RATE
+            left, right = channels if step < 0.2 * RATE else (0.003, 0.003)
+            bot.process_sample(detector, timestamp, max(left, right), (left, right))
+
+    play(1.0, pan(-0.6))  # Игрок рядом с другой стороны
+    assert not events.drain()
+    assert bot.metrics.counters['balance_rejections'] == 1
+
+    play(5.0, pan(0.4))
+    detections = events.drain()
+    assert [event.kind for event in detections] == ['sound_detected']
+    assert detections[0].timestamp == pytest.approx(5.0, abs=0.05)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from audio_sources import TraceFileSource, save_trace
+from detection import create_detector, run_detector
+
+BITE_START = 2.0
+SETTINGS = {
+    'smoothing_alpha': 0.3,
+    'audio_threshold': 0.05,
+    'spike_cooldown': 0.5,
+}
+
+
+def test_envelope_detects_noisy_plateau_once(tmp_path):
+    # Тишина, затем шумное плато клева около порога на 3 с (100 Гц)
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(0.0, 6.0, 0.01)
+    plateau = (timestamps >= BITE_START) & (timestamps < BITE_START + 3.0)
+    peaks = np.where(plateau, 0.06 + rng.uniform(-0.03, 0.03, len(timestamps)), 0.003)
+    path = tmp_path / "bite.csv"
+    save_trace(path, timestamps, peaks)
+
+    results = {}
+    for kind in ("ema", "envelope"):
+        detector = create_detector(dict(SETTINGS, peak_detector=kind))
+        _, _, detections = run_detector(TraceFileSource(str(path), realtime=False), detector)
+        results[kind] = detections
+
+    ema, envelope = results["ema"], results["envelope"]
+    assert ema[0] >= BITE_START and envelope[0] >= BITE_START
+    # Огибающая замечает клев быстрее и без повторов на плато
+    assert envelope[0] - BITE_START < 0.05
+    assert envelope[0] < ema[0]
+    assert len(envelope) == 1
+    assert len(ema) > 1
@@ -0,0 +1,167 @@
+import threading
+import time
+
+from audio_sources import AudioMeterSource
+from discovery import (ClientClaims, DiscoveryService, FakeSessionProvider, FakeWindowProvider,
+                       SESSION_RETRY_INTERVAL)
+from simulator import VirtualClock
+from vrchat_fishing_bot import VRChatFishingBot
+
+
+def make_discovery(windows, sessions, claims=None):
+    clock = VirtualClock()
+    window_provider = FakeWindowProvider(windows)
+    session_provider = FakeSessionProvider(sessions)
+    discovery = DiscoveryService(window_provider, session_provider, clock=clock, claims=claims)
+    return discovery, window_provider, session_provider, clock
+
+
+class RebindableSource(AudioMeterSource):
+    def __init__(self):
+        self.sessions = []
+
+    def rebind(self, session):
+        self.sessions.append(session)
+        return True
+
+
+def test_binding_cached_between_calls():
+    discovery, windows, sessions, _ = make_discovery({1: ("VRChat", 10)}, {10: "session"})
+
+    first = discovery.ensure_bound()
+    second = discovery.ensure_bound()
+
+    assert second is first
+    assert (first.hwnd, first.pid, first.session) == (1, 10, "session")
+    assert sessions.lookups == 1
+    assert discovery.stats() == {'rebinds': 0, 'downtime': 0.0, 'bound': True}
+
+
+def test_session_lost_rebinds_to_new_session_of_same_process():
+    discovery, _, sessions, clock = make_discovery({1: ("VRChat", 10)}, {10: "old"})
+    discovery.ensure_bound()
+
+    sessions.sessions[10] = None  # Сессия пересоздаётся
+    assert discovery.session_lost().session is None
+    clock.sleep(0.5)
+    # Повторный поиск сессии не чаще SESSION_RETRY_INTERVAL
+    assert discovery.ensure_bound().session is None
+    assert sessions.lookups == 2
+
+    sessions.sessions[10] = "new"
+    clock.sleep(SESSION_RETRY_INTERVAL)
+    binding = discovery.ensure_bound()
+
+    assert binding.session == "new"
+    stats = discovery.stats()
+    assert stats['rebinds'] == 1
+    assert stats['downtime'] == 0.5 + SESSION_RETRY_INTERVAL
+    assert stats['bound']
+
+
+def test_session_lost_after_game_restart_finds_new_window():
+    discovery, windows, sessions, clock = make_discovery({1: ("VRChat", 10)}, {10: "old"})
+    discovery.ensure_bound()
+
+    windows.windows = {2: ("VRChat", 20)}
+    sessions.sessions = {20: "new"}
+    clock.sleep(3.0)
+    binding = discovery.session_lost()
+
+    assert (binding.hwnd, binding.pid, binding.session) == (2, 20, "new")
+    assert discovery.stats()['rebinds'] == 1
+
+
+def test_ensure_bound_without_window():
+    discovery, windows, _, _ = make_discovery({}, {})
+
+    assert discovery.ensure_bound() is None
+    assert not discovery.stats()['bound']
+
+
+def test_claims_give_each_service_own_client():
+    claims = ClientClaims()
+    windows = {1: ("VRChat", 10), 2: ("VRChat", 20)}
+    sessions = {10: "first", 20: "second"}
+    first, _, _, _ = make_discovery(windows, sessions, claims)
+    second, _, _, _ = make_discovery(windows, sessions, claims)
+
+    assert first.ensure_bound().pid == 10
+    assert second.ensure_bound().pid == 20
+    claims.release(first)
+    assert claims.claim(10, second)
+
+
+def test_bot_rebinds_audio_source_after_session_lost(settings_file):
+    discovery, _, sessions, clock = make_discovery({1: ("VRChat", 10)}, {10: "old"})
+    bot = VRChatFishingBot(settings_file(), discovery=discovery, clock=clock)
+    bot.running = True
+    bot.update_binding(discovery.ensure_bound())
+    source = RebindableSource()
+
+    sessions.sessions[10] = "new"
+    assert bot.rebind_audio_source(source, threading.Event())
+
+    assert source.sessions == ["new"]
+    assert bot.vrchat_audio_session == "new"
+    assert not bot.rebinding
+
+
+def test_bot_waits_for_session_while_rebinding(settings_file):
+    discovery, _, sessions, clock = make_discovery({1: ("VRChat", 10)}, {10: "old"})
+    bot = VRChatFishingBot(settings_file(), discovery=discovery, clock=clock)
+    discovery.ensure_bound()
+    source = RebindableSource()
+
+    sessions.sessions[10] = None
+    assert bot.try_rebind_audio_source(source, discovery.session_lost()) is None
+    # Пока сессии нет, супервизор не должен считать поток аудио зависшим
+    assert bot.rebinding
+
+    sessions.sessions[10] = "new"
+    clock.sleep(SESSION_RETRY_INTERVAL)
+    assert bot.try_rebind_audio_source(source, discovery.ensure_bound())
+    assert not bot.rebinding
+
+
+class SlowSessionProvider(FakeSessionProvider):
+    """Поиск сессии занимает время; считает одновременные поиски"""
+
+    def __init__(self, sessions):
+        super().__init__(sessions)
+        self.active = 0
+        self.max_active = 0
+
+    def find_session(self, pid):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.001)
+        self.active -= 1
+        return super().find_session(pid)
+
+
+def test_concurrent_rebind_from_two_threads():
+    sessions = SlowSessionProvider({10: "session"})
+    discovery = DiscoveryService(FakeWindowProvider({1: ("VRChat", 10)}), sessions)
+    discovery.ensure_bound()
+    calls = 30
+
+    # Поток аудио теряет сессию, поток цикла в это же время активирует окно
+    def audio():
+        for _ in range(calls):
+            assert discovery.session_lost().session == "session"
+
+    def cycle():
+        for _ in range(calls):
+            assert discovery.ensure_bound() is not None
+
+    threads = [threading.Thread(target=audio), threading.Thread(target=audio), threading.Thread(target=cycle)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = discovery.stats()
+    assert sessions.max_active == 1
+    assert stats['rebinds'] == 2 * calls
+    assert stats['bound']
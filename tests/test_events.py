@@ -0,0 +1,52 @@
+import threading
+
+from events import EventChannel
+
+
+def test_each_subscriber_gets_each_event_once():
+    channel = EventChannel()
+    first = channel.subscribe()
+    second = channel.subscribe()
+
+    for i in range(5):
+        channel.publish('sound_detected', 0.1 * i, float(i))
+
+    assert [event.timestamp for event in first.drain()] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert first.drain() == []
+    assert [second.get_nowait().timestamp for _ in range(5)] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert second.get_nowait() is None
+
+
+def test_concurrent_publishers_deliver_exactly_once():
+    channel = EventChannel()
+    subscriptions = [channel.subscribe(maxlen=4000) for _ in range(3)]
+
+    def publish(thread_index):
+        for i in range(1000):
+            channel.publish('sound_detected', 0.0, thread_index * 1000 + i)
+
+    threads = [threading.Thread(target=publish, args=(index,)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for subscription in subscriptions:
+        timestamps = [event.timestamp for event in subscription.drain()]
+        assert sorted(timestamps) == list(range(3000))
+        assert subscription.dropped == 0
+
+
+def test_unsubscribed_and_overflowing_subscribers():
+    channel = EventChannel()
+    closed = channel.subscribe()
+    small = channel.subscribe(maxlen=2)
+    closed.close()
+
+    for i in range(5):
+        channel.publish('sound_detected', 0.0, float(i))
+
+    assert closed.drain() == []
+    # Переполненная очередь хранит последние события и считает потерянные
+    assert [event.timestamp for event in small.drain()] == [3.0, 4.0]
+    assert small.dropped == 3
@@ -0,0 +1,317 @@
+import pytest
+
+from discovery import DiscoveryService, FakeSessionProvider, FakeWindowProvider
+from fishing_machine import (BITE_TIMEOUT, MAX_RECASTS, REEL_TIMEOUT, STATE_CASTING, STATE_COOLDOWN, STATE_IDLE,
+                             STATE_MUSIC_TAIL, STATE_PAUSE, STATE_REELING, STATE_WAITING_FOR_BITE,
+                             FishingStateMachine)
+from input_injection import FakeKeyInjector, ForegroundLock, SharedKeyInjector
+from simulator import VirtualClock
+from vrchat_fishing_bot import VRChatFishingBot
+
+NOISE = 0.003
+MUSIC = 0.06
+
+# Фиксированные паузы без переходов по звуку
+FIXED_SETTINGS = {
+    'cast_duration': 0.5,
+    'post_cast_wait': 1.0,
+    'cooldown_after_cast': 5.0,
+    'min_reel_time': 2.0,
+    'music_threshold': 0.01,
+    'additional_wait': 1.5,
+    'predict_music_end': False,
+    'post_reel_wait': 3.0,
+    'audio_transitions': False,
+}
+
+
+class MachineHarness:
+    """Автомат с ботом на виртуальных часах: отсчёты громкости подаются напрямую"""
+
+    def __init__(self, settings_file, **settings):
+        self.clock = VirtualClock()
+        self.injector = FakeKeyInjector(clock=self.clock, sleep=self.clock.sleep)
+        self.injector.foreground = 1  # Окно уже активно: нажатия без задержки активации
+        discovery = DiscoveryService(FakeWindowProvider({1: ("VRChat", 10)}), FakeSessionProvider({10: "session"}),
+                                     clock=self.clock)
+        self.bot = VRChatFishingBot(settings_file(**dict(FIXED_SETTINGS, **settings)), self.injector, discovery,
+                                    clock=self.clock)
+        self.bot.bite_events = self.bot.events.subscribe()
+        self.machine = FishingStateMachine(self.bot, self.clock)
+        self.sample_seq = 0
+
+    @property
+    def states(self):
+        return [state for _, _, state, _ in self.machine.transitions]
+
+    @property
+    def counters(self):
+        return self.bot.metrics.counters
+
+    def run_until(self, moment, level=NOISE, rate=20):
+        """Отсчёты сглаженной громкости level (число или функция времени) и таймеры автомата до moment"""
+        clock = self.clock
+        while clock() < moment:
+            deadline = self.machine.timers.next_deadline()
+            step = min(clock() + 1.0 / rate, moment)
+            if deadline is not None and deadline < step:
+                step = deadline
+            clock.advance_to(step)
+            now = clock()
+            self.bot.samples.append(now, level(now) if callable(level) else level)
+            self.sample_seq = self.bot.feed_machine(self.machine, self.bot.bite_events.drain(), self.sample_seq)
+
+    def bite(self, value=0.2):
+        now = self.clock()
+        self.bot.events.publish('sound_detected', value, now, now)
+        self.sample_seq = self.bot.feed_machine(self.machine, self.bot.bite_events.drain(), self.sample_seq)
+
+    def wait_for_bite(self):
+        """Заброс и паузы до начала ожидания клева"""
+        self.machine.start_cycle()
+        settings = FIXED_SETTINGS
+        self.run_until(settings['cast_duration'] + settings['post_cast_wait'] + settings['cooldown_after_cast'])
+
+
+def music(start, duration):
+    return lambda now: MUSIC if start <= now < start + duration else NOISE
+
+
+@pytest.fixture
+def harness(settings_file):
+    return MachineHarness(settings_file)
+
+
+def test_cycle_with_fixed_waits(harness):
+    harness.machine.start_cycle()
+    assert harness.machine.state == STATE_CASTING
+    harness.run_until(0.5)
+    assert harness.injector.holds() == [(0.0, 0.5)]
+    harness.run_until(1.4)
+    assert harness.machine.state == STATE_CASTING
+    harness.run_until(1.5)
+    assert harness.machine.state == STATE_COOLDOWN
+    harness.run_until(6.5)
+    assert harness.machine.state == STATE_WAITING_FOR_BITE
+
+    harness.run_until(10.0)
+    harness.bite()
+    assert harness.machine.state == STATE_REELING
+    assert harness.machine.key_held
+    # Музыка 6 секунд через полсекунды после нажатия E
+    harness.run_until(20.0, music(10.5, 6.0))
+
+    assert harness.states == [STATE_CASTING, STATE_COOLDOWN, STATE_WAITING_FOR_BITE, STATE_REELING,
+                              STATE_MUSIC_TAIL, STATE_PAUSE]
+    reel = harness.injector.holds()[1]
+    # E отпущена через additional_wait после конца музыки
+    assert reel[0] == 10.0
+    assert reel[0] + reel[1] == pytest.approx(16.5 + 1.5, abs=0.06)
+    assert harness.counters['catches'] == 1
+
+    harness.run_until(reel[0] + reel[1] + 3.0)
+    assert harness.machine.state == STATE_CASTING
+    assert harness.machine.cycle_count == 2
+
+
+def test_bite_ignored_during_cooldown(harness):
+    harness.machine.start_cycle()
+    harness.run_until(2.0)
+    assert harness.machine.state == STATE_COOLDOWN
+
+    harness.bite()
+
+    assert harness.machine.state == STATE_COOLDOWN
+    assert not harness.machine.key_held
+
+
+def test_music_resumes_after_pause(harness):
+    harness.wait_for_bite()
+    start = harness.clock()
+    harness.bite()
+    first, second = music(start + 0.5, 4.0), music(start + 5.0, 4.0)
+
+    harness.run_until(start + 15.0, lambda now: max(first(now), second(now)))
+
+    # Пауза 0.5 с короче additional_wait: подсечка продолжилась до конца второй части музыки
+    assert harness.states.count(STATE_REELING) == 2
+    reel = harness.injector.holds()[1]
+    assert reel[0] + reel[1] == pytest.approx(start + 9.0 + 1.5, abs=0.06)
+    assert harness.counters['catches'] == 1
+
+
+def test_bite_timeout_recasts(harness):
+    harness.wait_for_bite()
+
+    harness.run_until(harness.machine.wait_started + BITE_TIMEOUT + 0.1, rate=2)
+
+    assert harness.counters['bite_timeouts'] == 1
+    assert harness.machine.cycle_count == 2
+    assert harness.states[-1] == STATE_CASTING
+
+
+def test_reel_timeout_without_music_is_false_hook(harness):
+    harness.wait_for_bite()
+    start = harness.clock()
+    harness.bite()
+
+    harness.run_until(start + REEL_TIMEOUT + 0.1, rate=5)
+
+    assert harness.machine.state == STATE_PAUSE
+    assert not harness.machine.key_held
+    assert harness.counters['reel_timeouts'] == 1
+    assert harness.counters['false_hooks'] == 1
+    assert harness.counters['catches'] == 0
+
+
+def test_reel_timeout_with_endless_music_is_empty_reel(harness):
+    harness.wait_for_bite()
+    start = harness.clock()
+    harness.bite()
+
+    harness.run_until(start + REEL_TIMEOUT + 0.1, MUSIC, rate=5)
+
+    assert harness.counters['reel_timeouts'] == 1
+    assert harness.counters['empty_reels'] == 1
+    assert harness.counters['catches'] == 0
+
+
+def test_short_sound_is_not_catch(harness):
+    harness.wait_for_bite()
+    start = harness.clock()
+    harness.bite()
+
+    # Одиночный громкий звук после min_reel_time, а не музыка подсечки
+    harness.run_until(start + 6.0, music(start + 3.0, 0.3))
+
+    assert harness.machine.state == STATE_PAUSE
+    assert harness.counters['catches'] == 0
+    assert harness.counters['empty_reels'] == 1
+    assert not harness.bot.music_end_model.durations
+
+
+def test_stop_releases_key(harness):
+    harness.wait_for_bite()
+    harness.bite()
+    assert harness.machine.key_held
+
+    harness.machine.stop("пауза")
+
+    assert harness.machine.state == STATE_IDLE
+    assert not harness.machine.key_held
+    assert harness.injector.events[-1][2] == "up"
+    assert harness.machine.timers.next_deadline() is None
+
+
+def defer_activations(harness):
+    """Окно активируется сразу, а результат приходит, когда тест его отдаст"""
+    pending = []
+    harness.machine.activator = lambda wait, callback: pending.append(
+        (callback, harness.bot.activate_vrchat_window(wait)))
+    return pending
+
+
+def test_stale_activation_ignored(harness):
+    harness.wait_for_bite()
+    pending = defer_activations(harness)
+    harness.bite()
+    # Таймаут клева, пока окно активировалось для подсечки
+    harness.machine.bite_timeout()
+    assert len(pending) == 2
+    downs = len(harness.injector.events)
+
+    callback, activated = pending[0]
+    callback(activated)
+
+    assert harness.machine.state == STATE_CASTING
+    assert not harness.machine.key_held
+    assert len(harness.injector.events) == downs
+
+    callback, activated = pending[1]
+    callback(activated)
+
+    assert harness.injector.events[downs][2] == "down"
+    assert not harness.machine.activating
+
+
+def test_discarded_activation_releases_input(harness):
+    lock = ForegroundLock(harness.clock)
+    harness.bot.injector = SharedKeyInjector(harness.injector, lock)
+    harness.wait_for_bite()
+    pending = defer_activations(harness)
+    harness.bite()
+    assert lock.owner is harness.bot.injector
+
+    harness.machine.stop("пауза")
+    callback, activated = pending[0]
+    callback(activated)
+
+    assert lock.owner is None
+    assert not harness.machine.key_held
+
+
+def transition_time(harness, state, start=0.0):
+    return next(timestamp for timestamp, _, to, _ in harness.machine.transitions if to == state and timestamp >= start)
+
+
+def splash(now):
+    # Всплеск поплавка через 0.6 с после отпускания E
+    return 0.12 if 1.1 <= now < 1.4 else NOISE
+
+
+def test_audio_transitions_keep_minimum_waits(settings_file):
+    harness = MachineHarness(settings_file, audio_transitions=True, settle_time=0.5)
+    bot = harness.bot
+    harness.machine.start_cycle()
+    harness.run_until(8.0, splash)
+
+    cooldown = transition_time(harness, STATE_COOLDOWN)
+    waiting = transition_time(harness, STATE_WAITING_FOR_BITE)
+    assert bot.min_post_cast_wait <= cooldown - 0.5 < bot.post_cast_wait
+    assert bot.min_cooldown_after_cast <= waiting - cooldown < bot.cooldown_after_cast
+
+    harness.bite()
+    start = harness.clock()
+    harness.run_until(start + 15.0, music(start + 0.5, 6.0))
+
+    # Тишина сразу после подсечки не сокращает паузу ниже min_post_reel_wait
+    pause = transition_time(harness, STATE_PAUSE)
+    next_cast = transition_time(harness, STATE_CASTING, pause)
+    assert bot.min_post_reel_wait <= next_cast - pause < bot.post_reel_wait
+    assert harness.counters['saved_seconds'] > 0
+
+
+def test_recast_without_splash(settings_file):
+    harness = MachineHarness(settings_file, audio_transitions=True)
+    harness.machine.start_cycle()
+
+    # Игра не приняла заброс: всплеска нет
+    harness.run_until(8.0)
+
+    assert harness.counters['recasts'] == 1
+    assert harness.machine.cycle_count == 2
+    assert STATE_WAITING_FOR_BITE not in harness.states
+    # Потерянный заброс вычитается из сэкономленного времени
+    assert harness.counters['saved_seconds'] < 0
+
+
+def test_quiet_splash_is_heard(settings_file):
+    harness = MachineHarness(settings_file, audio_transitions=True, audio_threshold=0.05)
+
+    # Всплеск тише порога клева, но громче порога музыки
+    harness.machine.start_cycle()
+    harness.run_until(8.0, lambda now: 0.04 if 1.1 <= now < 1.4 else NOISE)
+
+    assert harness.counters['recasts'] == 0
+    assert harness.machine.state == STATE_WAITING_FOR_BITE
+
+
+def test_recasts_capped(settings_file):
+    harness = MachineHarness(settings_file, audio_transitions=True)
+    harness.machine.start_cycle()
+
+    harness.run_until(40.0)
+
+    assert harness.counters['recasts'] == MAX_RECASTS
+    assert harness.machine.cycle_count == MAX_RECASTS + 1
+    assert harness.machine.state == STATE_WAITING_FOR_BITE
@@ -0,0 +1,43 @@
+from input_injection import ACTIVATION_DELAY, VK_E, FakeKeyInjector
+from simulator import VirtualClock
+
+
+def make_injector():
+    clock = VirtualClock()
+    return FakeKeyInjector(clock=clock, sleep=clock.sleep), clock
+
+
+def test_window_activated_only_when_not_foreground():
+    injector, clock = make_injector()
+
+    assert injector.ensure_foreground(1)
+    assert clock() == ACTIVATION_DELAY
+    assert injector.ensure_foreground(1)
+    assert injector.ensure_foreground(1)
+
+    assert injector.foreground == 1
+    assert injector.activations == 1
+    assert injector.foreground_hits == 2
+    # Окно уже активно - задержки активации нет
+    assert clock() == ACTIVATION_DELAY
+
+
+def test_window_activated_again_after_focus_loss():
+    injector, _ = make_injector()
+    injector.ensure_foreground(1)
+
+    injector.foreground = 2  # Пользователь переключился на другое окно
+    injector.ensure_foreground(1)
+
+    assert injector.foreground == 1
+    assert injector.activations == 2
+    assert injector.foreground_hits == 0
+
+
+def test_press_holds_key_for_duration():
+    injector, _ = make_injector()
+
+    injector.press(VK_E, 0.5)
+    injector.press(VK_E)
+
+    assert injector.holds() == [(0.0, 0.5), (0.5, 0.0)]
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from meter_recorder import HEADER_SIZE, RECORD_DTYPE, MeterRecorder, load_recording, phase_names, read_header
+from phases import ALL_PHASES, PHASE_BITE_WAIT, PHASE_REELING
+
+
+def test_recording_round_trip(tmp_path):
+    recorder = MeterRecorder(str(tmp_path), chunk_records=8)
+    phases = [ALL_PHASES[i % len(ALL_PHASES)] for i in range(13)]
+    for i, phase in enumerate(phases):
+        recorder.append(i * 0.005, i * 0.01, i * 0.001, phase)
+
+    recorder.start()
+    recorder.stop()
+
+    # Первый файл заполнен целиком, второй обрезан до фактического числа записей
+    assert recorder.stats() == {'files': 2, 'written': 13, 'dropped': 0}
+    first, second = recorder.files
+    assert int(read_header(first)['count']) == 8
+    assert int(read_header(second)['count']) == 5
+    assert int(read_header(second)['chunk']) == 1
+    assert os.path.getsize(second) == HEADER_SIZE + 5 * RECORD_DTYPE.itemsize
+
+    records = np.concatenate([np.asarray(load_recording(path)) for path in recorder.files])
+    np.testing.assert_allclose(records['timestamp'], np.arange(13) * 0.005)
+    np.testing.assert_allclose(records['raw'], np.arange(13) * 0.01, rtol=1e-6)
+    np.testing.assert_allclose(records['smoothed'], np.arange(13) * 0.001, rtol=1e-6)
+    assert list(phase_names(records)) == phases
+    assert read_header(second)['clock_start'] == pytest.approx(8 * 0.005)
+
+
+def test_unknown_phase_recorded_as_first(tmp_path):
+    recorder = MeterRecorder(str(tmp_path), chunk_records=4)
+    recorder.append(0.0, 0.1, 0.1, PHASE_BITE_WAIT)
+    recorder.append(0.1, 0.1, 0.1, "unknown")
+    recorder.append(0.2, 0.1, 0.1, PHASE_REELING)
+    recorder.start()
+    recorder.stop()
+
+    records = load_recording(recorder.files[0])
+
+    assert list(phase_names(records)) == [PHASE_BITE_WAIT, ALL_PHASES[0], PHASE_REELING]
+
+
+def test_read_header_rejects_other_files(tmp_path):
+    path = tmp_path / "other.meter"
+    path.write_bytes(b"NOTMETER" + bytes(HEADER_SIZE))
+
+    with pytest.raises(ValueError, match="не является записью"):
+        read_header(str(path))
+
+    empty = tmp_path / "empty.meter"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError):
+        read_header(str(empty))
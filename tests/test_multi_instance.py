@@ -0,0 +1,104 @@
+import threading
+
+from audio_sources import AudioMeterSource
+from input_injection import VK_E, FakeKeyInjector, ForegroundLock, SharedKeyInjector
+from multi_instance import SharedMeterPoller
+from vrchat_fishing_bot import VRChatFishingBot
+
+
+class BlockingSource(AudioMeterSource):
+    """Источник, чтение которого ждёт разрешения теста"""
+
+    def __init__(self):
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self):
+        self.reading.set()
+        self.release.wait(5)
+        return None
+
+
+def test_foreground_lock_reentrant_for_owner():
+    lock = ForegroundLock()
+    first, second = object(), object()
+
+    assert lock.acquire(first, 0)
+    assert lock.acquire(first, 0)
+    assert not lock.acquire(second, 0.01)
+    lock.release(first)
+    assert lock.acquire(second, 0)
+
+    stats = lock.stats()
+    assert stats['acquisitions'] == 2
+    assert stats['contended'] == 1
+    assert stats['timeouts'] == 1
+
+
+def test_shared_injector_holds_lock_until_keys_released():
+    injector = FakeKeyInjector()
+    lock = ForegroundLock()
+    first = SharedKeyInjector(injector, lock)
+    second = SharedKeyInjector(injector, lock)
+
+    assert first.ensure_foreground(1)
+    first.key_down(VK_E)
+    # Второй клиент не может увести фокус, пока E зажата в первом окне
+    assert not second.ensure_foreground(2, wait=0.01)
+    assert injector.foreground == 1
+
+    first.key_up(VK_E)
+    assert second.ensure_foreground(2, wait=0.01)
+    assert injector.foreground == 2
+
+
+def test_shared_injector_serializes_clients():
+    injector = FakeKeyInjector()
+    lock = ForegroundLock()
+    presses = 50
+    overlaps = []
+
+    def client(hwnd):
+        shared = SharedKeyInjector(injector, lock)
+        for _ in range(presses):
+            assert shared.ensure_foreground(hwnd, wait=5)
+            shared.key_down(VK_E)
+            if injector.foreground != hwnd:
+                overlaps.append(hwnd)
+            shared.key_up(VK_E)
+
+    threads = [threading.Thread(target=client, args=(hwnd,)) for hwnd in (1, 2, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not overlaps
+    actions = [action for _, _, action in injector.events]
+    # Нажатия разных клиентов не перемежаются: каждое нажатие сразу отпускается
+    assert actions == ["down", "up"] * (presses * len(threads))
+    assert lock.owner is None
+
+
+def test_poller_does_not_hold_lock_while_reading(settings_file):
+    bot = VRChatFishingBot(settings_file())
+    bot.running = True
+    poller = SharedMeterPoller()
+    source = BlockingSource()
+    stop_event = threading.Event()
+    poller.start()
+    serving = threading.Thread(target=poller.serve, args=(bot, source, bot.create_detector(), stop_event))
+    serving.start()
+    try:
+        assert source.reading.wait(5)
+        # Пока источник читается, другие клиенты могут подключаться
+        assert poller.lock.acquire(timeout=1)
+        poller.lock.release()
+    finally:
+        source.release.set()
+        stop_event.set()
+        serving.join(5)
+        poller.stop()
+
+    assert not serving.is_alive()
+    assert not poller.channels
@@ -0,0 +1,86 @@
+import pytest
+
+from music_end import CHECK_INTERVAL, GAP_MARGIN, MIN_CONFIRM, MIN_OBSERVATIONS, MusicEndModel
+
+MUSIC = 0.06
+THRESHOLD = 0.01
+
+
+def play(model, start, duration, fade_level=MUSIC * 0.3):
+    """Музыка подсечки от start, последние 0.5 с затухает до fade_level; возвращает момент тишины"""
+    end = start + duration
+    t = start
+    while t < end:
+        model.add(t, MUSIC if t < end - 0.5 else fade_level, THRESHOLD)
+        t += 0.05
+    return end
+
+
+def reel(model, start, duration=10.0, **kwargs):
+    """Полная подсечка: музыка, тишина, конец"""
+    model.begin(start)
+    quiet = model.quiet(play(model, start, duration, **kwargs))
+    model.ended()
+    return quiet
+
+
+def trained(reels=MIN_OBSERVATIONS):
+    model = MusicEndModel()
+    for i in range(reels):
+        reel(model, i * 100.0)
+    return model
+
+
+def test_no_prediction_before_min_observations():
+    model = MusicEndModel()
+    for i in range(MIN_OBSERVATIONS):
+        assert reel(model, i * 100.0) is None
+
+    assert model.ready
+    assert reel(model, 1000.0) == MIN_CONFIRM
+
+
+def test_early_silence_is_pause():
+    model = trained()
+    model.begin(1000.0)
+
+    # Тишина через 3 с, а музыка всегда шла 10 с
+    assert model.quiet(play(model, 1000.0, 3.0)) is None
+    assert model.confirm_wait(1010.0, model.fade()) == MIN_CONFIRM
+
+
+def test_sound_unlike_past_endings_is_pause():
+    model = trained()
+    model.begin(1000.0)
+
+    # Прошлые концы затухали, а здесь музыка обрывается на полной громкости
+    assert model.quiet(play(model, 1000.0, 10.0, fade_level=MUSIC)) is None
+    assert model.quiet_fade == pytest.approx(1.0)
+
+
+def test_check_cycle_uses_fixed_rule():
+    model = trained(CHECK_INTERVAL - 1)
+    model.begin(5000.0)
+    assert model.checking
+
+    assert model.quiet(play(model, 5000.0, 10.0)) is None
+    # Предсказание считается, чтобы проверить его на этой подсечке
+    assert model.predicted == MIN_CONFIRM
+
+
+def test_resumed_music_flags_misprediction():
+    model = trained()
+    model.begin(1000.0)
+    quiet_since = play(model, 1000.0, 10.0)
+
+    wait = model.quiet(quiet_since)
+    assert wait == MIN_CONFIRM
+    # Музыка вернулась позже предсказанной тишины: E был бы отпущен рано
+    assert model.resumed(quiet_since + wait + 0.3)
+    assert list(model.gaps) == [pytest.approx(wait + 0.3)]
+
+    # Следующее предсказание учитывает самую длинную паузу
+    quiet_since = play(model, quiet_since + wait + 0.3, 1.0)
+    wait = model.quiet(quiet_since)
+    assert wait == pytest.approx((MIN_CONFIRM + 0.3) * GAP_MARGIN)
+    assert not model.resumed(quiet_since + wait - 0.1)
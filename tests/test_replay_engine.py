@@ -0,0 +1,61 @@
+import numpy as np
+
+from detection import PeakDetector
+from replay_engine import GRID_ORDER, detect_many, smooth_many, tune
+
+ALPHAS = [0.2, 0.5, 0.9]
+THRESHOLDS = [0.02, 0.05, 0.1]
+COOLDOWNS = [0.2, 1.0]
+
+
+def random_trace(seed=0, count=3000):
+    """Неравномерные интервалы, тишина ниже SILENCE_THRESHOLD и редкие всплески"""
+    rng = np.random.default_rng(seed)
+    timestamps = np.cumsum(rng.uniform(0.01, 0.1, count))
+    peaks = rng.uniform(0.0, 0.03, count)
+    peaks[rng.random(count) < 0.2] = 0.0005
+    peaks[rng.random(count) < 0.05] = rng.uniform(0.05, 0.3)
+    return timestamps, peaks
+
+
+def test_vectorized_replay_matches_peak_detector():
+    timestamps, peaks = random_trace()
+    smoothed = smooth_many(timestamps, peaks, ALPHAS)
+    rows, thresholds, cooldowns = (x.ravel() for x in np.meshgrid(np.arange(len(ALPHAS)), THRESHOLDS, COOLDOWNS,
+                                                                  indexing='ij'))
+
+    detections = detect_many(timestamps, smoothed, rows, thresholds, cooldowns)
+
+    for k, (row, threshold, cooldown) in enumerate(zip(rows, thresholds, cooldowns)):
+        detector = PeakDetector(ALPHAS[row], threshold, cooldown)
+        volumes = []
+        expected = []
+        for timestamp, peak in zip(timestamps, peaks):
+            volume, detected = detector.process(timestamp, peak)
+            volumes.append(volume)
+            if detected:
+                expected.append(timestamp)
+        np.testing.assert_allclose(smoothed[row], volumes, rtol=1e-12, atol=0)
+        np.testing.assert_array_equal(detections[k], expected)
+
+
+def test_tune_respects_false_hook_limit():
+    # Сетка из трёх порогов: быстрее всего тот, что даёт больше ложных подсечек
+    grid = {name: [1.0] for name in GRID_ORDER}
+    grid['audio_threshold'] = [0.02, 0.05, 0.1]
+    shape = tuple(len(grid[name]) for name in GRID_ORDER)
+    evaluation = {
+        'grid': grid,
+        'seconds_per_fish': np.array([30.0, 40.0, 60.0]).reshape(shape),
+        'false_hooks_per_hour': np.array([5.0, 0.8, 0.0]).reshape(shape),
+    }
+    for key in ('recall', 'early_release_rate', 'latency', 'reel_time'):
+        evaluation[key] = np.zeros(shape)
+
+    best = tune(evaluation, false_hook_limit=1.0)
+
+    assert [result['settings']['audio_threshold'] for result in best] == [0.05, 0.1]
+    assert best[0]['seconds_per_fish'] == 40.0
+    assert all(result['false_hooks_per_hour'] <= 1.0 for result in best)
+    assert [result['settings']['audio_threshold'] for result in tune(evaluation, 0.0)] == [0.1]
+    assert tune(evaluation, -1.0) == []
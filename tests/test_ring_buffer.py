@@ -0,0 +1,47 @@
+import numpy as np
+
+from ring_buffer import SampleRingBuffer
+
+
+def test_wraparound_keeps_latest_samples():
+    buffer = SampleRingBuffer(capacity=4)
+    for i in range(10):
+        buffer.append(float(i), i * 0.1)
+
+    timestamps, values = buffer.view()
+
+    np.testing.assert_array_equal(timestamps, [6.0, 7.0, 8.0, 9.0])
+    np.testing.assert_allclose(values, [0.6, 0.7, 0.8, 0.9])
+    assert buffer.latest() == (9.0, 0.9)
+    np.testing.assert_array_equal(buffer.view(2)[0], [8.0, 9.0])
+
+
+def test_read_since_returns_only_new_samples():
+    buffer = SampleRingBuffer(capacity=4)
+    for i in range(3):
+        buffer.append(float(i), 0.0)
+    timestamps, _, seq = buffer.read_since(0)
+    np.testing.assert_array_equal(timestamps, [0.0, 1.0, 2.0])
+
+    # Запись пересекает конец массива
+    for i in range(3, 6):
+        buffer.append(float(i), 0.0)
+    timestamps, _, seq = buffer.read_since(seq)
+
+    np.testing.assert_array_equal(timestamps, [3.0, 4.0, 5.0])
+    assert seq == 6
+    assert len(buffer.read_since(seq)[0]) == 0
+
+
+def test_read_since_after_overflow():
+    buffer = SampleRingBuffer(capacity=4)
+    buffer.append(0.0, 0.0)
+    _, _, seq = buffer.read_since(0)
+    for i in range(1, 11):
+        buffer.append(float(i), 0.0)
+
+    # Читатель отстал больше чем на ёмкость: только сохранившиеся отсчёты
+    timestamps, _, seq = buffer.read_since(seq)
+
+    np.testing.assert_array_equal(timestamps, [7.0, 8.0, 9.0, 10.0])
+    assert seq == 11
@@ -0,0 +1,46 @@
+import logging
+
+import pytest
+
+from simulator import Simulation, VirtualClock
+
+# Игра без посторонних звуков и с короткими клевами: улов зависит только от пауз цикла
+REGRESSION_GAME = {'bite_delay_min': 5.0, 'bite_delay_max': 15.0, 'ambient_spike_rate': 0.0}
+REGRESSION_HOURS = 0.25
+# Рыб в час на REGRESSION_GAME с фиксированными паузами (seed 0)
+BASELINE_FISH_PER_HOUR = 136.0
+
+
+@pytest.fixture(autouse=True)
+def quiet_bot_log():
+    logger = logging.getLogger("vrchat_fishing_bot")
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    yield
+    logger.setLevel(level)
+
+
+def simulate(settings_file, **overrides):
+    return Simulation(settings_file(**overrides), REGRESSION_GAME, seed=0).run(REGRESSION_HOURS * 3600)
+
+
+def test_virtual_clock():
+    clock = VirtualClock()
+    clock.sleep(1.5)
+    clock.advance_to(1.0)
+    assert clock() == 1.5
+    clock.advance_to(2.0)
+    assert clock() == 2.0
+
+
+def test_fish_per_hour_does_not_drop(settings_file):
+    fixed = simulate(settings_file, audio_transitions=False)
+    result = simulate(settings_file)
+
+    assert fixed['fish_per_hour'] >= BASELINE_FISH_PER_HOUR
+    # Переходы по звуку не должны терять рыбу относительно фиксированных пауз
+    assert result['fish_per_hour'] >= fixed['fish_per_hour']
+    # Игра не игнорировала забросы, бот засчитал ровно пойманную рыбу
+    assert result['game']['ignored_casts'] == 0
+    assert result['bot']['catches'] == result['game']['caught']
+    assert result['bot']['saved_seconds'] > 0
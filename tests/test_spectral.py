@@ -0,0 +1,91 @@
+import wave
+
+import numpy as np
+import pytest
+
+from spectral import LinearResampler, SpectralTemplate, check_templates, scan_wav
+from vrchat_fishing_bot import VRChatFishingBot
+
+RATE = 22050
+
+
+def tones(frequencies, duration, amplitude=0.3):
+    t = np.arange(int(duration * RATE)) / RATE
+    return sum(amplitude * np.sin(2 * np.pi * f * t) for f in frequencies).astype(np.float32)
+
+
+def write_wav(path, signal):
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(pcm.tobytes())
+
+
+def test_template_round_trip(tmp_path):
+    template = SpectralTemplate.from_signal("bite", tones([1200, 3400], 0.5), RATE, frame_size=512, hop=256)
+    path = tmp_path / "bite.npz"
+    template.save(path)
+
+    loaded = SpectralTemplate.load(path)
+
+    assert loaded.name == "bite"
+    assert (loaded.sample_rate, loaded.frame_size, loaded.hop) == (RATE, 512, 256)
+    np.testing.assert_array_equal(loaded.profile, template.profile)
+    assert np.linalg.norm(loaded.profile) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_scan_finds_embedded_sound(tmp_path):
+    bite = tones([1200, 3400], 0.4)
+    template = SpectralTemplate.from_signal("bite", bite, RATE)
+
+    # Тихий шум, посторонний тон на 2 с и звук клева на 5 с
+    rng = np.random.default_rng(0)
+    signal = rng.normal(0, 0.0005, 8 * RATE).astype(np.float32)
+    signal[2 * RATE:2 * RATE + len(bite)] += tones([300], 0.4)
+    signal[5 * RATE:5 * RATE + len(bite)] += bite
+    path = tmp_path / "trace.wav"
+    write_wav(path, signal)
+
+    events, duration = scan_wav(str(path), [template], block_size=3000)
+
+    assert duration == pytest.approx(8.0)
+    assert [name for _, name, _ in events] == ["bite"]
+    assert 5.0 <= events[0][0] <= 5.1
+    assert events[0][2] >= 0.8
+
+
+def test_resampler_continuous_across_blocks():
+    rng = np.random.default_rng(1)
+    signal = rng.normal(0, 0.3, 20000).astype(np.float32)
+    whole = LinearResampler(48000, 44100).process(signal)
+
+    resampler = LinearResampler(48000, 44100)
+    parts = []
+    start = 0
+    while start < len(signal):
+        size = int(rng.integers(1, 700))
+        parts.append(resampler.process(signal[start:start + size]))
+        start += size
+    streamed = np.concatenate(parts)
+
+    assert len(streamed) == len(whole)
+    np.testing.assert_allclose(streamed, whole, atol=1e-6)
+
+
+def test_mismatched_templates_rejected(tmp_path, settings_file):
+    bite = SpectralTemplate.from_signal("bite", tones([1200], 0.5), RATE)
+    music = SpectralTemplate.from_signal("music", tones([600], 0.5), RATE, hop=256)
+    bite_path, music_path = tmp_path / "bite.npz", tmp_path / "music.npz"
+    bite.save(bite_path)
+    music.save(music_path)
+
+    with pytest.raises(ValueError, match="music"):
+        check_templates([bite, music])
+
+    bot = VRChatFishingBot(settings_file(spectral_bite_template=str(bite_path),
+                                         spectral_music_template=str(music_path)))
+    # Ошибка до открытия источника звука
+    with pytest.raises(ValueError, match="шаг"):
+        bot.create_spectral_detector()
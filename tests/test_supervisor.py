@@ -0,0 +1,50 @@
+import pytest
+
+from simulator import VirtualClock
+from supervisor import SupervisedWorker, Supervisor
+
+
+@pytest.fixture
+def watched():
+    """Супервизор на виртуальных часах и поток, ждущий остановки; progress - изменяемый счётчик"""
+    clock = VirtualClock()
+    progress = [0]
+    supervisor = Supervisor(on_log=lambda message: None, clock=clock)
+    worker = supervisor.add(SupervisedWorker("audio", lambda stop_event: stop_event.wait(5),
+                                             progress=lambda: progress[0], stall_timeout=2.0))
+    supervisor._start_worker(worker)
+    yield supervisor, worker, clock, progress
+    worker.stop_event.set()
+    worker.thread.join(5)
+
+
+def test_worker_without_progress_is_stalled(watched):
+    supervisor, worker, clock, progress = watched
+
+    clock.sleep(1.0)
+    progress[0] += 1
+    supervisor.check()
+    clock.sleep(2.5)
+    supervisor.check()
+
+    assert worker.stalls == 1
+    assert worker.stop_event.is_set()
+
+
+def test_stall_check_paused_while_waiting_for_resource(watched):
+    supervisor, worker, clock, progress = watched
+
+    # Поток ждёт переподключения к аудио сессии дольше stall_timeout
+    progress[0] = None
+    for _ in range(10):
+        clock.sleep(1.0)
+        supervisor.check()
+    assert worker.stalls == 0
+
+    progress[0] = 5
+    clock.sleep(1.0)
+    supervisor.check()
+    clock.sleep(1.5)
+    supervisor.check()
+    assert worker.stalls == 0
+    assert not worker.stop_event.is_set()
@@ -0,0 +1,72 @@
+import heapq
+import itertools
+import time
+
+
+class Timer:
+    """Запланированный вызов; cancel() отменяет его без перестройки кучи"""
+
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler:
+    """Таймеры на двоичной куче: один поток спит до ближайшего дедлайна
+
+    Планировщик пассивный: вызывающий сам ждёт time_until_next() и затем
+    вызывает run_due(). Так им можно управлять и по виртуальным часам.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.heap = []
+        self.sequence = itertools.count()  # Порядок вызова таймеров с одинаковым дедлайном
+
+    def call_at(self, deadline, callback):
+        timer = Timer(deadline, callback)
+        heapq.heappush(self.heap, (deadline, next(self.sequence), timer))
+        return timer
+
+    def call_later(self, delay, callback):
+        return self.call_at(self.clock() + delay, callback)
+
+    def next_deadline(self):
+        """Ближайший неотменённый дедлайн или None"""
+        heap = self.heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def time_until_next(self, limit=None):
+        """Сколько ждать до ближайшего таймера (не больше limit)"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return limit
+        delay = max(deadline - self.clock(), 0.0)
+        return delay if limit is None else min(delay, limit)
+
+    def run_due(self):
+        """Вызов всех таймеров, чей дедлайн наступил; возвращает их число"""
+        heap = self.heap
+        fired = 0
+        now = self.clock()
+        while heap and heap[0][0] <= now:
+            _, _, timer = heapq.heappop(heap)
+            if timer.cancelled:
+                continue
+            timer.cancelled = True
+            timer.callback()
+            fired += 1
+        return fired
+
+    def cancel_all(self):
+        for _, _, timer in self.heap:
+            timer.cancelled = True
+        self.heap.clear()
@@ -1,40 +1,87 @@
+import argparse
+import signal
+import sys
 import time
 import threading
-import ctypes
-import ctypes.wintypes
-import numpy as np
-import pyaudio
-import tkinter as tk
-from tkinter import ttk, messagebox
-import win32gui
-import win32con
-import win32api
-import win32process
-import queue
 import logging
-from comtypes import CLSCTX_ALL
-from pycaw.pycaw import AudioUtilities, IAudioMeterInformation
-import struct
 import json
 import os
 
+from activity_log import LOG_FORMAT, start_file_logging
+from async_runtime import AsyncFishingRuntime
+from audio_sources import PycawMeterSource
+from bot_state import BotState
+from calibration import ThresholdCalibrator
+from channel_balance import BalanceGate
+from detection import create_detector
+from discovery import (DiscoveryService, PycawSessionProvider, Win32WindowProvider,
+                       SESSION_RETRY_INTERVAL)
+from events import EventChannel
+from fishing_machine import FishingStateMachine, TransitionFileLog, STATE_IDLE
+from input_injection import VK_E, Win32KeyInjector
+from meter_recorder import MeterRecorder
+from metrics import CycleMetrics, LatencyStats, MetricsServer, TIMING_ACTIVATE
+from music_end import MusicEndModel
+from phases import PHASE_IDLE, PHASE_COOLDOWN, PHASE_BITE_WAIT
+from ring_buffer import SampleRingBuffer
+from sampling import SamplingScheduler, PHASE_SAMPLE_RATES, SAMPLE_RATE_NORMAL
+from spectral import LoopbackPcmSource, PyAudioPcmSource, SpectralDetector, SpectralTemplate, check_templates
+from supervisor import SupervisedWorker, Supervisor
+
 # Настройка логирования
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 # Путь к файлу настроек
 SETTINGS_FILE = "fishing_bot_settings.json"
+# Максимальный сон потока рыбалки между проверками остановки и паузы (секунды)
+MACHINE_MAX_WAIT = 0.5
 
 class VRChatFishingBot:
-    def __init__(self):
+    def __init__(self, settings_file=SETTINGS_FILE, injector=None, discovery=None, clock=time.perf_counter,
+                 sleep=None):
+        self.settings_file = settings_file
+        self.clock = clock  # Часы цикла рыбалки (в симуляции - виртуальные)
+        # Сон цикла рыбалки вместо ожидания отсчётов и событий (в симуляции продвигает виртуальное время)
+        self.sleep = sleep
+        self.injector = injector  # Эмуляция клавиатуры (по умолчанию Win32KeyInjector)
+        self.listeners = []  # Слушатели статуса и лога (GUI, вывод в консоль)
+        self.status = "Готов к запуску"
+        self.state = BotState(self.status)  # Снимок состояния для GUI, обновляется без блокировок
         self.running = False
         self.paused = False
         self.vrchat_window = None
         self.vrchat_process_id = None
         self.vrchat_audio_session = None
-        self.audio_thread = None
-        self.bot_thread = None
-        self.audio_queue = queue.Queue()
+        self.supervisor = None  # Владеет потоками мониторинга и рыбалки
+        self.async_runtime = None  # Цикл событий asyncio, если runtime = "asyncio"
+        self.machine = None  # Автомат состояний текущего запуска
+        self.transition_listeners = []  # Подключаются к автомату каждого запуска: (время, из, в, причина)
+        # Отсчёты громкости для всех читателей и канал событий детектора
+        self.samples = SampleRingBuffer()
+        self.events = EventChannel()
+        self.rebinding = False  # Ждём новую аудио сессию: отсчётов нет, но поток не завис
+        self.bite_events = None  # Подписка потока рыбалки
+        self.reaction_stats = LatencyStats()  # Задержка от обнаружения клева до нажатия E
+        self.metrics = CycleMetrics(clock)  # Длительности фаз и счётчики циклов
+        self.metrics_server = None
+        self.recorder = None  # Запись сырого сигнала в файлы memmap
+        
+        # Текущая фаза цикла определяет частоту опроса громкости
+        self.phase = PHASE_IDLE
+        self.sampler = SamplingScheduler(PHASE_SAMPLE_RATES[PHASE_IDLE], clock=clock)
+        self.phase_started = clock()
+        self.sampling_stats = {}  # Статистика опроса по последним завершённым фазам
+        
+        self.calibrator = ThresholdCalibrator()
+        self.calibrated_thresholds = None  # (порог клева, порог музыки) последней калибровки
+        self.cycle_saved = 0.0  # Секунды, сэкономленные на переходах в текущем цикле
+        self.music_end_model = MusicEndModel()  # Длительность и паузы музыки прошлых подсечек
+        self.balance_gate = BalanceGate()  # Баланс каналов у звуков прошлых клевов
+        self.meter_source = None  # Внешний источник громкости (например, TraceFileSource)
+        self.audio_poller = None  # Общий поток опроса громкости нескольких клиентов (SharedMeterPoller)
+        self.name = ""  # Имя клиента в логе при нескольких клиентах в одном процессе
+        self.discovery = discovery  # Поиск окна и аудио сессии (по умолчанию Win32 + pycaw)
         
         # Настройки для рыбалки (значения по умолчанию)
         self.cast_duration = 0.5  # Время зажатия E для заброса (секунды)
@@ -42,10 +89,66 @@ class VRChatFishingBot:
         self.audio_threshold = 0.05  # Порог громкости для детекции звука клева
         self.music_threshold = 0.01  # Порог громкости для музыки подсечки
         self.additional_wait = 1.5  # Дополнительное время после окончания музыки (секунды)
+        self.predict_music_end = True  # Отпускать E раньше additional_wait, если конец музыки предсказан
         self.cooldown_after_cast = 5.0  # Время игнорирования звуков после заброса (секунды)
         self.spike_cooldown = 0.5  # Минимальный интервал между обнаружениями звуков (секунды)
         self.smoothing_alpha = 0.3  # Коэффициент сглаживания аудио (0.1-0.9)
         
+        # Детектор по пиковой громкости: "ema" - сглаживание smoothing_alpha и порог,
+        # "envelope" - быстрая и медленная огибающие, начало звука, гистерезис
+        self.peak_detector = "ema"
+        self.envelope_fast_time = 0.005  # Постоянная времени быстрой огибающей (секунды)
+        self.envelope_slow_time = 0.5  # Постоянная времени медленной огибающей (секунды)
+        self.hysteresis_ratio = 0.5  # Повторное срабатывание после спада ниже порога * коэффициент
+        self.onset_detection = True  # Срабатывание по росту громкости (быстрая минус медленная)
+        
+        # Поканальные пики: звук клева должен идти с той же стороны, что у прошлых пойманных рыб
+        self.channel_balance = True
+        self.balance_tolerance = 0.3  # Допустимое отклонение баланса (-1 левый канал, +1 правый)
+        self.balance_max_jitter = 0.3  # Допустимый разброс баланса за время звука
+        
+        # Детектор клева: "peak" - по пиковой громкости, "spectral" - по спектральному шаблону
+        self.bite_detector = "peak"
+        self.spectral_bite_template = ""  # Файл шаблона звука клева (.npz)
+        self.spectral_music_template = ""  # Файл шаблона музыки подсечки (.npz), необязательно
+        self.spectral_similarity = 0.8  # Минимальное сходство с шаблоном (0-1)
+        self.spectral_input_device = None  # Индекс устройства записи pyaudio (None - loopback вывода по умолчанию)
+        
+        # Автокалибровка порогов по уровню шума в паузе после заброса
+        self.auto_calibrate = False
+        self.calibration_audio_factor = 4.0  # Порог клева = шум * коэффициент
+        self.calibration_music_factor = 2.0  # Порог музыки = шум * коэффициент
+        self.calibration_band = 4.0  # Пороги в пределах [ручной / band, ручной * band]
+        
+        # Переходы по звуку: фиксированные паузы становятся верхними границами,
+        # фаза заканчивается, когда громкость settle_time держится ниже порога музыки,
+        # но не раньше нижней границы (min_*)
+        self.audio_transitions = True
+        self.settle_time = 0.5
+        self.post_cast_wait = 1.0  # Пауза после заброса до начала ожидания (секунды)
+        self.post_reel_wait = 3.0  # Пауза между циклами (секунды)
+        self.min_post_cast_wait = 0.5
+        self.min_cooldown_after_cast = 1.0
+        self.min_post_reel_wait = 2.0  # Игра принимает новый заброс не сразу после подсечки
+        
+        # Мониторинг аудио перезапускается, если отсчёты не приходят дольше этого времени (секунды)
+        self.audio_stall_timeout = 2.0
+        
+        # Метрики: JSON снимок после каждого цикла ("" - не писать) и HTTP порт на localhost (0 - выключен)
+        self.metrics_file = ""
+        self.metrics_port = 0
+        
+        # Файл лога с ротацией ("" - не писать)
+        self.log_file = "fishing_bot.log"
+        # Переходы автомата состояний в JSON lines ("" - не писать)
+        self.transitions_file = ""
+        
+        # Среда выполнения: "threads" - потоки под супервизором, "asyncio" - один цикл событий
+        self.runtime = "threads"
+        
+        # Каталог записи сырого и сглаженного сигнала с фазами цикла ("" - не записывать)
+        self.meter_recording_dir = ""
+        
         # Загружаем настройки из файла
         self.load_settings()
         
@@ -53,169 +156,13 @@ class VRChatFishingBot:
         self.chunk_size = 1024
         
         # Windows API константы
-        self.VK_E = 0x45
-        self.KEYEVENTF_KEYUP = 0x0002
-        
-        # Инициализация GUI
-        self.setup_gui()
-        
-    def setup_gui(self):
-        """Создание графического интерфейса"""
-        self.root = tk.Tk()
-        self.root.title("VRChat Fishing Bot")
-        self.root.geometry("540x700")
-        self.root.resizable(False, False)
-        
-        # Главный фрейм
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # Заголовок
-        title_label = ttk.Label(main_frame, text="VRChat Fishing Bot", 
-                               font=("Arial", 16, "bold"))
-        title_label.grid(row=0, column=0, columnspan=2, pady=(0, 20))
-        
-        # Настройки
-        settings_frame = ttk.LabelFrame(main_frame, text="Настройки", padding="10")
-        settings_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
-        
-        # Время заброса
-        ttk.Label(settings_frame, text="Время заброса (сек):").grid(row=0, column=0, sticky=tk.W)
-        self.cast_duration_var = tk.DoubleVar(value=self.cast_duration)
-        cast_spinbox = ttk.Spinbox(settings_frame, from_=0.1, to=2.0, increment=0.1, 
-                                  textvariable=self.cast_duration_var, width=10)
-        cast_spinbox.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Минимальное время подсечки
-        ttk.Label(settings_frame, text="Мин. время до музыки (сек):").grid(row=1, column=0, sticky=tk.W)
-        self.min_reel_time_var = tk.DoubleVar(value=self.min_reel_time)
-        reel_spinbox = ttk.Spinbox(settings_frame, from_=5.0, to=30.0, increment=1.0, 
-                                  textvariable=self.min_reel_time_var, width=10)
-        reel_spinbox.grid(row=1, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Порог громкости для клева
-        ttk.Label(settings_frame, text="Порог клева:").grid(row=2, column=0, sticky=tk.W)
-        self.audio_threshold_var = tk.DoubleVar(value=self.audio_threshold)
-        threshold_spinbox = ttk.Spinbox(settings_frame, from_=0.01, to=1.0, increment=0.01, 
-                                       textvariable=self.audio_threshold_var, width=10,
-                                       command=self.on_threshold_changed)
-        threshold_spinbox.grid(row=2, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Порог громкости для музыки
-        ttk.Label(settings_frame, text="Порог музыки:").grid(row=3, column=0, sticky=tk.W)
-        self.music_threshold_var = tk.DoubleVar(value=self.music_threshold)
-        music_spinbox = ttk.Spinbox(settings_frame, from_=0.01, to=1.0, increment=0.01, 
-                                   textvariable=self.music_threshold_var, width=10)
-        music_spinbox.grid(row=3, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Дополнительное время после музыки
-        ttk.Label(settings_frame, text="Доп. время после музыки (сек):").grid(row=4, column=0, sticky=tk.W)
-        self.additional_wait_var = tk.DoubleVar(value=self.additional_wait)
-        wait_spinbox = ttk.Spinbox(settings_frame, from_=1.0, to=15.0, increment=0.5, 
-                                  textvariable=self.additional_wait_var, width=10)
-        wait_spinbox.grid(row=4, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Пауза после заброса
-        ttk.Label(settings_frame, text="Пауза после заброса (сек):").grid(row=5, column=0, sticky=tk.W)
-        self.cooldown_after_cast_var = tk.DoubleVar(value=self.cooldown_after_cast)
-        cooldown_spinbox = ttk.Spinbox(settings_frame, from_=0.0, to=15.0, increment=0.5, 
-                                      textvariable=self.cooldown_after_cast_var, width=10)
-        cooldown_spinbox.grid(row=5, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Интервал между звуками
-        ttk.Label(settings_frame, text="Интервал между звуками (сек):").grid(row=6, column=0, sticky=tk.W)
-        self.spike_cooldown_var = tk.DoubleVar(value=self.spike_cooldown)
-        spike_spinbox = ttk.Spinbox(settings_frame, from_=0.1, to=2.0, increment=0.1, 
-                                   textvariable=self.spike_cooldown_var, width=10)
-        spike_spinbox.grid(row=6, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Сглаживание аудио
-        ttk.Label(settings_frame, text="Сглаживание аудио (0.1-0.9):").grid(row=7, column=0, sticky=tk.W)
-        self.smoothing_alpha_var = tk.DoubleVar(value=self.smoothing_alpha)
-        smooth_spinbox = ttk.Spinbox(settings_frame, from_=0.1, to=0.9, increment=0.1, 
-                                    textvariable=self.smoothing_alpha_var, width=10)
-        smooth_spinbox.grid(row=7, column=1, sticky=tk.W, padx=(10, 0))
-        
-        # Привязываем событие изменения
-        self.audio_threshold_var.trace_add('write', lambda *args: self.on_threshold_changed())
-        
-        # Кнопки управления
-        control_frame = ttk.Frame(main_frame)
-        control_frame.grid(row=2, column=0, columnspan=2, pady=10)
-        
-        self.start_button = ttk.Button(control_frame, text="Запустить бота", 
-                                      command=self.start_bot, style="Accent.TButton")
-        self.start_button.grid(row=0, column=0, padx=(0, 5))
-        
-        self.stop_button = ttk.Button(control_frame, text="Остановить бота", 
-                                     command=self.stop_bot, state="disabled")
-        self.stop_button.grid(row=0, column=1, padx=(5, 5))
-        
-        self.save_button = ttk.Button(control_frame, text="Сохранить настройки", 
-                                     command=self.save_settings_from_gui)
-        self.save_button.grid(row=0, column=2, padx=(5, 0))
-        
-        # Статус
-        self.status_var = tk.StringVar(value="Готов к запуску")
-        status_label = ttk.Label(main_frame, textvariable=self.status_var, 
-                                font=("Arial", 10, "italic"))
-        status_label.grid(row=3, column=0, columnspan=2, pady=10)
-        
-        # Визуализация громкости
-        volume_frame = ttk.LabelFrame(main_frame, text="Мониторинг звука", padding="10")
-        volume_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
-        
-        # Метка текущей громкости
-        volume_info_frame = ttk.Frame(volume_frame)
-        volume_info_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
-        
-        ttk.Label(volume_info_frame, text="Текущая громкость:").grid(row=0, column=0, sticky=tk.W)
-        self.current_volume_label = ttk.Label(volume_info_frame, text="0.000", 
-                                             font=("Arial", 10, "bold"), foreground="blue")
-        self.current_volume_label.grid(row=0, column=1, sticky=tk.W, padx=(10, 20))
-        
-        ttk.Label(volume_info_frame, text="Порог:").grid(row=0, column=2, sticky=tk.W)
-        self.threshold_label = ttk.Label(volume_info_frame, text="0.150", 
-                                        font=("Arial", 10, "bold"), foreground="red")
-        self.threshold_label.grid(row=0, column=3, sticky=tk.W, padx=(10, 0))
-        
-        # Canvas для визуализации
-        self.volume_canvas = tk.Canvas(volume_frame, height=60, bg="white", highlightthickness=1, 
-                                      highlightbackground="gray")
-        self.volume_canvas.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
-        
-        # Метка статуса обнаружения
-        self.detection_label = ttk.Label(volume_frame, text="● Ожидание звука...", 
-                                        font=("Arial", 9), foreground="gray")
-        self.detection_label.grid(row=2, column=0, columnspan=2, pady=(5, 0))
-        
-        # Лог
-        log_frame = ttk.LabelFrame(main_frame, text="Лог активности", padding="5")
-        log_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
-        
-        self.log_text = tk.Text(log_frame, height=6, width=50, state="disabled")
-        scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=scrollbar.set)
-        
-        self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        
-        # Настройка весов для растягивания
-        main_frame.columnconfigure(1, weight=1)
-        main_frame.rowconfigure(5, weight=1)
-        log_frame.columnconfigure(0, weight=1)
-        log_frame.rowconfigure(0, weight=1)
-        volume_frame.columnconfigure(0, weight=1)
-        
-        # Переменные для визуализации
-        self.volume_history = []
-        self.max_history = 100  # Храним последние 100 значений
-    
+        self.VK_E = VK_E
+        
     def load_settings(self):
         """Загрузка настроек из файла"""
         try:
-            if os.path.exists(SETTINGS_FILE):
-                with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            if os.path.exists(self.settings_file):
+                with open(self.settings_file, 'r', encoding='utf-8') as f:
                     settings = json.load(f)
                     
                 self.cast_duration = settings.get('cast_duration', self.cast_duration)
@@ -223,11 +170,43 @@ class VRChatFishingBot:
                 self.audio_threshold = settings.get('audio_threshold', self.audio_threshold)
                 self.music_threshold = settings.get('music_threshold', self.music_threshold)
                 self.additional_wait = settings.get('additional_wait', self.additional_wait)
+                self.predict_music_end = settings.get('predict_music_end', self.predict_music_end)
                 self.cooldown_after_cast = settings.get('cooldown_after_cast', self.cooldown_after_cast)
                 self.spike_cooldown = settings.get('spike_cooldown', self.spike_cooldown)
                 self.smoothing_alpha = settings.get('smoothing_alpha', self.smoothing_alpha)
+                self.peak_detector = settings.get('peak_detector', self.peak_detector)
+                self.envelope_fast_time = settings.get('envelope_fast_time', self.envelope_fast_time)
+                self.envelope_slow_time = settings.get('envelope_slow_time', self.envelope_slow_time)
+                self.hysteresis_ratio = settings.get('hysteresis_ratio', self.hysteresis_ratio)
+                self.onset_detection = settings.get('onset_detection', self.onset_detection)
+                self.channel_balance = settings.get('channel_balance', self.channel_balance)
+                self.balance_tolerance = settings.get('balance_tolerance', self.balance_tolerance)
+                self.balance_max_jitter = settings.get('balance_max_jitter', self.balance_max_jitter)
+                self.bite_detector = settings.get('bite_detector', self.bite_detector)
+                self.spectral_bite_template = settings.get('spectral_bite_template', self.spectral_bite_template)
+                self.spectral_music_template = settings.get('spectral_music_template', self.spectral_music_template)
+                self.spectral_similarity = settings.get('spectral_similarity', self.spectral_similarity)
+                self.spectral_input_device = settings.get('spectral_input_device', self.spectral_input_device)
+                self.auto_calibrate = settings.get('auto_calibrate', self.auto_calibrate)
+                self.calibration_audio_factor = settings.get('calibration_audio_factor', self.calibration_audio_factor)
+                self.calibration_music_factor = settings.get('calibration_music_factor', self.calibration_music_factor)
+                self.calibration_band = settings.get('calibration_band', self.calibration_band)
+                self.audio_transitions = settings.get('audio_transitions', self.audio_transitions)
+                self.settle_time = settings.get('settle_time', self.settle_time)
+                self.post_cast_wait = settings.get('post_cast_wait', self.post_cast_wait)
+                self.post_reel_wait = settings.get('post_reel_wait', self.post_reel_wait)
+                self.min_post_cast_wait = settings.get('min_post_cast_wait', self.min_post_cast_wait)
+                self.min_cooldown_after_cast = settings.get('min_cooldown_after_cast', self.min_cooldown_after_cast)
+                self.min_post_reel_wait = settings.get('min_post_reel_wait', self.min_post_reel_wait)
+                self.audio_stall_timeout = settings.get('audio_stall_timeout', self.audio_stall_timeout)
+                self.metrics_file = settings.get('metrics_file', self.metrics_file)
+                self.metrics_port = settings.get('metrics_port', self.metrics_port)
+                self.log_file = settings.get('log_file', self.log_file)
+                self.transitions_file = settings.get('transitions_file', self.transitions_file)
+                self.runtime = settings.get('runtime', self.runtime)
+                self.meter_recording_dir = settings.get('meter_recording_dir', self.meter_recording_dir)
                 
-                logger.info(f"Настройки загружены из {SETTINGS_FILE}")
+                logger.info(f"Настройки загружены из {self.settings_file}")
         except Exception as e:
             logger.warning(f"Не удалось загрузить настройки: {e}")
     
@@ -240,168 +219,102 @@ class VRChatFishingBot:
                 'audio_threshold': self.audio_threshold,
                 'music_threshold': self.music_threshold,
                 'additional_wait': self.additional_wait,
+                'predict_music_end': self.predict_music_end,
                 'cooldown_after_cast': self.cooldown_after_cast,
                 'spike_cooldown': self.spike_cooldown,
-                'smoothing_alpha': self.smoothing_alpha
+                'smoothing_alpha': self.smoothing_alpha,
+                'peak_detector': self.peak_detector,
+                'envelope_fast_time': self.envelope_fast_time,
+                'envelope_slow_time': self.envelope_slow_time,
+                'hysteresis_ratio': self.hysteresis_ratio,
+                'onset_detection': self.onset_detection,
+                'channel_balance': self.channel_balance,
+                'balance_tolerance': self.balance_tolerance,
+                'balance_max_jitter': self.balance_max_jitter,
+                'bite_detector': self.bite_detector,
+                'spectral_bite_template': self.spectral_bite_template,
+                'spectral_music_template': self.spectral_music_template,
+                'spectral_similarity': self.spectral_similarity,
+                'spectral_input_device': self.spectral_input_device,
+                'auto_calibrate': self.auto_calibrate,
+                'calibration_audio_factor': self.calibration_audio_factor,
+                'calibration_music_factor': self.calibration_music_factor,
+                'calibration_band': self.calibration_band,
+                'audio_transitions': self.audio_transitions,
+                'settle_time': self.settle_time,
+                'post_cast_wait': self.post_cast_wait,
+                'post_reel_wait': self.post_reel_wait,
+                'min_post_cast_wait': self.min_post_cast_wait,
+                'min_cooldown_after_cast': self.min_cooldown_after_cast,
+                'min_post_reel_wait': self.min_post_reel_wait,
+                'audio_stall_timeout': self.audio_stall_timeout,
+                'metrics_file': self.metrics_file,
+                'metrics_port': self.metrics_port,
+                'log_file': self.log_file,
+                'transitions_file': self.transitions_file,
+                'runtime': self.runtime,
+                'meter_recording_dir': self.meter_recording_dir
             }
             
-            with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
+            with open(self.settings_file, 'w', encoding='utf-8') as f:
                 json.dump(settings, f, indent=4, ensure_ascii=False)
                 
-            logger.info(f"Настройки сохранены в {SETTINGS_FILE}")
+            logger.info(f"Настройки сохранены в {self.settings_file}")
         except Exception as e:
             logger.error(f"Ошибка сохранения настроек: {e}")
         
+    def add_listener(self, listener):
+        """Подключение слушателя с методами on_log, on_status и on_running_changed"""
+        self.listeners.append(listener)
+    
+    def set_status(self, status):
+        """Обновление строки статуса"""
+        self.status = status
+        self.state.set_status(status)
+        for listener in self.listeners:
+            listener.on_status(status)
+    
     def log_message(self, message):
         """Добавление сообщения в лог"""
-        self.log_text.config(state="normal")
-        self.log_text.insert(tk.END, f"{time.strftime('%H:%M:%S')} - {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state="disabled")
-        logger.info(message)
-    
-    def on_threshold_changed(self):
-        """Обработка изменения порога громкости"""
-        try:
-            self.audio_threshold = self.audio_threshold_var.get()
-            self.threshold_label.config(text=f"{self.audio_threshold:.3f}")
-        except Exception as e:
-            pass  # Игнорируем ошибки при инициализации
+        timestamp = time.strftime('%H:%M:%S')
+        for listener in self.listeners:
+            listener.on_log(timestamp, message)
+        logger.info(f"[{self.name}] {message}" if self.name else message)
     
-    def save_settings_from_gui(self):
-        """Сохранение настроек из GUI"""
-        try:
-            # Обновляем все настройки из GUI
-            self.cast_duration = self.cast_duration_var.get()
-            self.min_reel_time = self.min_reel_time_var.get()
-            self.audio_threshold = self.audio_threshold_var.get()
-            self.music_threshold = self.music_threshold_var.get()
-            self.additional_wait = self.additional_wait_var.get()
-            self.cooldown_after_cast = self.cooldown_after_cast_var.get()
-            self.spike_cooldown = self.spike_cooldown_var.get()
-            self.smoothing_alpha = self.smoothing_alpha_var.get()
-            
-            # Сохраняем в файл
-            self.save_settings()
-            
-            self.log_message("Настройки сохранены!")
-            messagebox.showinfo("Успех", "Настройки успешно сохранены!")
-        except Exception as e:
-            self.log_message(f"Ошибка сохранения настроек: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось сохранить настройки: {e}")
+    def create_discovery(self):
+        """Сервис поиска окна и аудио сессии VRChat (по умолчанию через Win32 и pycaw)"""
+        if self.discovery is None:
+            self.discovery = DiscoveryService(Win32WindowProvider(), PycawSessionProvider())
+        return self.discovery
     
-    def update_volume_visualization(self, volume):
-        """Обновление визуализации громкости"""
-        try:
-            # Обновляем метку текущей громкости
-            self.current_volume_label.config(text=f"{volume:.3f}")
-            
-            # Обновляем метку порога
-            self.threshold_label.config(text=f"{self.audio_threshold:.3f}")
-            
-            # Добавляем значение в историю
-            self.volume_history.append(volume)
-            if len(self.volume_history) > self.max_history:
-                self.volume_history.pop(0)
-            
-            # Очищаем canvas
-            self.volume_canvas.delete("all")
-            
-            canvas_width = self.volume_canvas.winfo_width()
-            canvas_height = self.volume_canvas.winfo_height()
-            
-            if canvas_width <= 1:  # Canvas еще не отрисован
-                canvas_width = 480
-            if canvas_height <= 1:
-                canvas_height = 60
-            
-            # Рисуем сетку
-            for i in range(0, 11):
-                y = canvas_height - (i * canvas_height / 10)
-                self.volume_canvas.create_line(0, y, canvas_width, y, 
-                                              fill="#e0e0e0", width=1)
-            
-            # Рисуем линию порога
-            threshold_y = canvas_height - (self.audio_threshold * canvas_height)
-            self.volume_canvas.create_line(0, threshold_y, canvas_width, threshold_y, 
-                                          fill="red", width=2, dash=(5, 3))
-            self.volume_canvas.create_text(canvas_width - 5, threshold_y - 10, 
-                                          text=f"Порог: {self.audio_threshold:.2f}", 
-                                          anchor="e", fill="red", font=("Arial", 8))
-            
-            # Рисуем график громкости
-            if len(self.volume_history) > 1:
-                points = []
-                for i, vol in enumerate(self.volume_history):
-                    x = (i / max(len(self.volume_history) - 1, 1)) * canvas_width
-                    y = canvas_height - (min(vol, 1.0) * canvas_height)
-                    points.append((x, y))
-                
-                # Рисуем линию графика
-                for i in range(len(points) - 1):
-                    x1, y1 = points[i]
-                    x2, y2 = points[i + 1]
-                    
-                    # Цвет зависит от того, превышает ли порог
-                    if self.volume_history[i] > self.audio_threshold:
-                        color = "#00cc00"  # Зеленый, если выше порога
-                        width = 2
-                    else:
-                        color = "#3366ff"  # Синий, если ниже
-                        width = 1
-                    
-                    self.volume_canvas.create_line(x1, y1, x2, y2, 
-                                                  fill=color, width=width, smooth=True)
-            
-            # Рисуем текущее значение
-            current_y = canvas_height - (min(volume, 1.0) * canvas_height)
-            self.volume_canvas.create_oval(canvas_width - 8, current_y - 4, 
-                                          canvas_width - 2, current_y + 4, 
-                                          fill="blue", outline="darkblue", width=2)
-            
-            # Обновляем статус обнаружения
-            if volume > self.audio_threshold:
-                self.detection_label.config(text="● ЗВУК ОБНАРУЖЕН!", foreground="green")
-                self.current_volume_label.config(foreground="green")
-            else:
-                self.detection_label.config(text="● Ожидание звука...", foreground="gray")
-                self.current_volume_label.config(foreground="blue")
-                
-        except Exception as e:
-            logger.error(f"Ошибка визуализации: {e}")
+    def update_binding(self, binding):
+        """Сохранение найденной связки окно -> процесс -> аудио сессия"""
+        if binding is None:
+            self.vrchat_window = None
+            self.vrchat_process_id = None
+            self.vrchat_audio_session = None
+            return
         
+        if binding.hwnd != self.vrchat_window:
+            self.log_message(f"Найдено окно VRChat: {binding.title} (PID: {binding.pid})")
+        if binding.session is not None and binding.session is not self.vrchat_audio_session:
+            self.log_message("Найдена аудио сессия VRChat")
+        
+        self.vrchat_window = binding.hwnd
+        self.vrchat_process_id = binding.pid
+        self.vrchat_audio_session = binding.session
+    
     def find_vrchat_window(self):
         """Поиск окна VRChat"""
         try:
-            # Попробуем найти окно VRChat по заголовку
-            hwnd = win32gui.FindWindow(None, "VRChat")
-            if hwnd == 0:
-                # Если не найдено, попробуем найти по частичному совпадению
-                def enum_windows_callback(hwnd, results):
-                    window_text = win32gui.GetWindowText(hwnd)
-                    if "vrchat" in window_text.lower():
-                        results.append(hwnd)
-                
-                results = []
-                win32gui.EnumWindows(enum_windows_callback, results)
-                
-                if results:
-                    hwnd = results[0]
-                else:
-                    return None
-            
-            self.vrchat_window = hwnd
+            binding = self.create_discovery().ensure_bound()
+            self.update_binding(binding)
+            if binding is None:
+                return None
             
-            # Получаем ID процесса VRChat
-            _, process_id = win32process.GetWindowThreadProcessId(hwnd)
-            self.vrchat_process_id = process_id
-            
-            self.log_message(f"Найдено окно VRChat: {win32gui.GetWindowText(hwnd)} (PID: {process_id})")
-            
-            # Ищем аудио сессию VRChat
-            self.find_vrchat_audio_session()
-            
-            return hwnd
+            if binding.session is None:
+                self.log_message("Аудио сессия VRChat не найдена")
+            return binding.hwnd
             
         except Exception as e:
             self.log_message(f"Ошибка поиска окна VRChat: {e}")
@@ -410,37 +323,31 @@ class VRChatFishingBot:
     def find_vrchat_audio_session(self):
         """Поиск аудио сессии VRChat"""
         try:
-            sessions = AudioUtilities.GetAllSessions()
-            for session in sessions:
-                if session.Process and session.Process.pid == self.vrchat_process_id:
-                    self.vrchat_audio_session = session
-                    self.log_message(f"Найдена аудио сессия VRChat: {session.Process.name()}")
-                    return True
-            
-            self.log_message("Аудио сессия VRChat не найдена")
-            return False
+            binding = self.create_discovery().ensure_bound()
+            self.update_binding(binding)
+            if binding is None or binding.session is None:
+                self.log_message("Аудио сессия VRChat не найдена")
+                return False
+            return True
             
         except Exception as e:
             self.log_message(f"Ошибка поиска аудио сессии: {e}")
             return False
     
-    def activate_vrchat_window(self):
-        """Активация окна VRChat"""
-        if not self.vrchat_window:
-            if not self.find_vrchat_window():
-                return False
-        
+    def activate_vrchat_window(self, wait=None):
+        """Активация окна VRChat (wait - сколько ждать, пока ввод занят другим клиентом)"""
         try:
-            # Проверяем, существует ли еще окно
-            if not win32gui.IsWindow(self.vrchat_window):
-                self.vrchat_window = None
-                if not self.find_vrchat_window():
-                    return False
+            started = self.clock()
+            # Кэшированное окно проверяется дёшево, полный поиск - только если оно пропало
+            binding = self.create_discovery().ensure_bound()
+            self.update_binding(binding)
+            if binding is None:
+                return False
             
-            # Активируем окно
-            win32gui.SetForegroundWindow(self.vrchat_window)
-            time.sleep(0.1)  # Небольшая задержка для активации
-            return True
+            # Активируем окно, только если оно ещё не на переднем плане
+            activated = self.injector.ensure_foreground(binding.hwnd, wait)
+            self.metrics.observe(TIMING_ACTIVATE, self.clock() - started)
+            return activated
             
         except Exception as e:
             self.log_message(f"Ошибка активации окна VRChat: {e}")
@@ -453,406 +360,630 @@ class VRChatFishingBot:
                 self.log_message("Не удалось активировать окно VRChat")
                 return False
             
-            # Нажимаем клавишу
-            win32api.keybd_event(vk_code, 0, 0, 0)
-            
-            if duration:
-                # Удерживаем клавишу указанное время
-                time.sleep(duration)
-                # Отпускаем клавишу
-                win32api.keybd_event(vk_code, 0, self.KEYEVENTF_KEYUP, 0)
-            else:
-                # Сразу отпускаем
-                win32api.keybd_event(vk_code, 0, self.KEYEVENTF_KEYUP, 0)
-            
+            # Нажимаем клавишу и удерживаем указанное время
+            self.injector.press(vk_code, duration)
             return True
             
         except Exception as e:
             self.log_message(f"Ошибка нажатия клавиши: {e}")
             return False
     
-    def cast_fishing_line(self):
-        """Заброс удочки"""
-        self.log_message("Закидываю удочку...")
-        self.status_var.set("Закидываю удочку...")
+    @property
+    def effective_audio_threshold(self):
+        """Действующий порог клева (калиброванный или ручной)"""
+        if self.auto_calibrate and self.calibrated_thresholds:
+            return self.calibrated_thresholds[0]
+        return self.audio_threshold
+    
+    @property
+    def effective_music_threshold(self):
+        """Действующий порог музыки (калиброванный или ручной)"""
+        if self.auto_calibrate and self.calibrated_thresholds:
+            return self.calibrated_thresholds[1]
+        return self.music_threshold
+    
+    def phase_sample_rate(self, phase):
+        """Частота опроса громкости в фазе"""
+        if phase == PHASE_COOLDOWN and self.auto_calibrate:
+            # Паузу после заброса калибровка использует как окно оценки шума
+            return SAMPLE_RATE_NORMAL
+        return PHASE_SAMPLE_RATES[phase]
+    
+    def apply_calibration(self):
+        """Расчёт порогов по шуму, накопленному за паузу после заброса"""
+        # Коэффициенты могли измениться после загрузки настроек
+        self.calibrator.audio_factor = self.calibration_audio_factor
+        self.calibrator.music_factor = self.calibration_music_factor
+        self.calibrator.band = self.calibration_band
+        result = self.calibrator.calibrate(self.audio_threshold, self.music_threshold)
+        if result is None:
+            self.log_message(f"Калибровка пропущена: мало данных о шуме ({self.calibrator.noise_floor.count} "
+                             f"отсчётов за {self.calibrator.duration:.1f}с), пороги не изменены")
+            return
         
-        success = self.press_key(self.VK_E, self.cast_duration)
-        if success:
-            self.log_message(f"Удочка заброшена (удержание {self.cast_duration}с)")
-        else:
-            self.log_message("Ошибка при забросе удочки")
+        audio, music, floor = result
+        self.calibrated_thresholds = (audio, music)
+        self.log_message(f"Калибровка: шум {floor:.4f}, порог клева {audio:.4f}, порог музыки {music:.4f}")
+    
+    def set_phase(self, phase):
+        """Переход к новой фазе цикла и смена частоты опроса"""
+        if phase == self.phase:
+            return
+        now = self.clock()
+        if self.phase != PHASE_IDLE:
+            self.metrics.observe(self.phase, now - self.phase_started)
+        self.phase_started = now
+        self.sampling_stats[self.phase] = self.sampler.stats()
+        if phase == PHASE_COOLDOWN:
+            self.calibrator.reset()
+        self.phase = phase
+        self.sampler.set_rate(self.phase_sample_rate(phase))
+    
+    def format_sampling_stats(self, phase):
+        """Строка с фактической частотой опроса и джиттером для фазы"""
+        stats = self.sampling_stats.get(phase)
+        if not stats or not stats['rate']:
+            return None
+        return (f"{stats['rate']:.1f}/{stats['target_rate']:.0f} Гц, "
+                f"джиттер {stats['jitter_ms']:.2f} мс, пропущено {stats['missed']}")
+    
+    def create_meter_source(self):
+        """Создание источника пиковой громкости (по умолчанию - аудио сессия VRChat)"""
+        if self.meter_source is not None:
+            return self.meter_source
         
-        return success
+        # После перезапуска потока сессия могла смениться
+        if self.discovery is not None:
+            self.update_binding(self.discovery.ensure_bound())
+        
+        if not self.vrchat_audio_session:
+            return None
+        
+        return PycawMeterSource(self.vrchat_audio_session, channels=self.channel_balance)
     
-    def start_audio_monitoring(self):
-        """Запуск мониторинга аудио из окна VRChat"""
+    def start_audio_monitoring(self, stop_event):
+        """Мониторинг аудио из окна VRChat, возвращает False при сбое (поток будет перезапущен)"""
         try:
-            if not self.vrchat_audio_session:
+            source = self.create_meter_source()
+            if source is None:
                 self.log_message("Аудио сессия VRChat не найдена!")
-                return
-            
-            # Получаем интерфейс для измерения громкости
-            volume_interface = self.vrchat_audio_session._ctl.QueryInterface(IAudioMeterInformation)
+                return False
             
             self.log_message("Запущен мониторинг аудио из VRChat")
             
-            # Переменные для сглаживания и фильтрации
-            smoothed_volume = 0.0
-            silence_threshold = 0.001  # Порог тишины
-            last_spike_time = 0
+            # Детектор со сглаживанием и фильтрацией
+            detector = self.create_detector()
+            
+            if self.audio_poller is not None:
+                # Отсчёты читает общий поток опроса, здесь только ждём остановки
+                completed = self.audio_poller.serve(self, source, detector, stop_event)
+                source.close()
+                self.log_message("Мониторинг аудио остановлен")
+                return completed
             
-            while self.running:
+            completed = True
+            while self.running and not stop_event.is_set():
                 try:
-                    # Получаем текущий уровень громкости от VRChat (от 0.0 до 1.0)
-                    peak_value = volume_interface.GetPeakValue()
-                    
-                    # Применяем экспоненциальное сглаживание с настраиваемым коэффициентом
-                    if peak_value > silence_threshold:
-                        smoothed_volume = self.smoothing_alpha * peak_value + (1 - self.smoothing_alpha) * smoothed_volume
-                    else:
-                        smoothed_volume *= 0.95  # Медленное затухание
-                    
-                    current_time = time.time()
-                    
-                    # Отправляем данные для визуализации
-                    self.audio_queue.put(('volume_update', smoothed_volume))
+                    # Получаем текущий уровень громкости (от 0.0 до 1.0)
+                    sample = source.read()
+                    if sample is None:
+                        self.log_message("Источник аудио исчерпан")
+                        break
                     
-                    # Обнаруживаем резкий скачок громкости (звук клева)
-                    if smoothed_volume > self.audio_threshold:
-                        # Проверяем cooldown чтобы избежать дублирования
-                        if current_time - last_spike_time > self.spike_cooldown:
-                            self.audio_queue.put(('sound_detected', smoothed_volume))
-                            last_spike_time = current_time
-                            logger.info(f"ЗВУК ОБНАРУЖЕН! Громкость: {smoothed_volume:.4f}, порог: {self.audio_threshold:.4f}")
+                    self.process_sample(detector, *sample)
                     
-                    time.sleep(0.05)  # Проверяем каждые 50мс
+                    if source.is_live:
+                        # Ждём следующий дедлайн, частота зависит от фазы цикла
+                        self.sampler.wait()
                     
                 except Exception as e:
-                    if self.running:
+                    if not self.running:
+                        break
+                    if not source.is_live or self.discovery is None:
                         self.log_message(f"Ошибка чтения аудио: {e}")
-                    break
+                        completed = False
+                        break
+                    # Игра перезапущена или сессия пересоздана: ждём и переподключаемся
+                    self.log_message(f"Аудио сессия VRChat потеряна: {e}")
+                    if not self.rebind_audio_source(source, stop_event):
+                        completed = False
+                        break
             
+            source.close()
             self.log_message("Мониторинг аудио остановлен")
+            # Остановка по запросу супервизора (зависание) - тоже сбой
+            return completed and not stop_event.is_set()
             
         except Exception as e:
             self.log_message(f"Ошибка инициализации аудио: {e}")
             self.log_message("Убедитесь, что VRChat воспроизводит звук")
+            return False
     
-    def wait_for_bite(self):
-        """Ожидание клева рыбы"""
-        self.log_message("Жду клев рыбы...")
-        self.status_var.set("Жду клев рыбы...")
-        
-        start_time = time.time()
-        
-        # Очищаем очередь от старых событий
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
-        
-        if self.cooldown_after_cast > 0:
-            self.log_message(f"Пауза {self.cooldown_after_cast:.0f} сек после заброса...")
-        
-        while self.running and not self.paused:
-            try:
-                elapsed = time.time() - start_time
-                
-                # Проверяем звуки только после cooldown периода
-                if elapsed > self.cooldown_after_cast:
-                    # Обрабатываем ВСЕ события в очереди
-                    events_to_process = []
-                    while True:
-                        try:
-                            event = self.audio_queue.get_nowait()
-                            events_to_process.append(event)
-                        except queue.Empty:
-                            break
-                    
-                    # Проверяем, есть ли событие sound_detected
-                    for event, volume in events_to_process:
-                        if event == 'sound_detected':
-                            self.log_message(f"Обнаружен звук клева! Громкость: {volume:.3f}")
-                            # Очищаем очередь и возвращаемся
-                            while not self.audio_queue.empty():
-                                try:
-                                    self.audio_queue.get_nowait()
-                                except queue.Empty:
-                                    break
-                            return True
-                else:
-                    # Во время cooldown очищаем очередь чтобы не накапливались события
-                    while not self.audio_queue.empty():
-                        try:
-                            self.audio_queue.get_nowait()
-                        except queue.Empty:
-                            break
-                    
-                    # Обновляем статус с обратным отсчётом
-                    remaining = self.cooldown_after_cast - elapsed
-                    if remaining > 0:
-                        self.status_var.set(f"Пауза после заброса... ({remaining:.1f}с)")
-                
-                # Таймаут для избежания бесконечного ожидания
-                if elapsed > 300:  # 5 минут максимум
-                    self.log_message("Таймаут ожидания клева")
-                    return False
-                
-                time.sleep(0.1)
+    def create_detector(self):
+        """Детектор по пиковой громкости в соответствии с настройками"""
+        return create_detector({
+            'peak_detector': self.peak_detector,
+            'smoothing_alpha': self.smoothing_alpha,
+            'audio_threshold': self.effective_audio_threshold,
+            'spike_cooldown': self.spike_cooldown,
+            'envelope_fast_time': self.envelope_fast_time,
+            'envelope_slow_time': self.envelope_slow_time,
+            'hysteresis_ratio': self.hysteresis_ratio,
+            'onset_detection': self.onset_detection,
+        })
+    
+    def process_sample(self, detector, timestamp, peak_value, channels=None):
+        """Обработка одного отсчёта пиковой громкости детектором (channels - пики каналов, если есть)"""
+        # Настройки могут меняться из GUI во время работы
+        if self.peak_detector == "ema":
+            detector.smoothing_alpha = self.smoothing_alpha
+        detector.audio_threshold = self.effective_audio_threshold
+        detector.spike_cooldown = self.spike_cooldown
+        
+        smoothed_volume, detected = detector.process(timestamp, peak_value)
+        
+        # В паузе после заброса накапливаем статистику шума
+        if self.auto_calibrate and self.phase == PHASE_COOLDOWN:
+            self.calibrator.add(timestamp, smoothed_volume)
+        
+        # Сохраняем отсчёт для визуализации и потока рыбалки
+        self.samples.append(timestamp, smoothed_volume)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.append(timestamp, peak_value, smoothed_volume, self.phase)
+        
+        # Обнаруживаем резкий скачок громкости (звук клева)
+        gate = self.balance_gate if self.channel_balance and channels is not None else None
+        if detected:
+            # После обучения клев подтверждается по балансу каналов за короткое окно
+            if gate is not None and self.phase == PHASE_BITE_WAIT and gate.begin(timestamp, smoothed_volume, self.clock()):
+                logger.info(f"Звук обнаружен, проверяю баланс каналов. Громкость: {smoothed_volume:.4f}")
+            else:
+                self.publish_detection(timestamp, smoothed_volume, self.clock())
+        if gate is not None:
+            gate.tolerance = self.balance_tolerance
+            gate.max_jitter = self.balance_max_jitter
+            decision = gate.add(timestamp, channels)
+            if decision is not None:
+                self.finish_balance_check(*decision)
+    
+    def publish_detection(self, timestamp, volume, wall_time):
+        self.events.publish('sound_detected', volume, timestamp, wall_time)
+        self.state.add_detection(volume)
+        logger.info(f"ЗВУК ОБНАРУЖЕН! Громкость: {volume:.4f}, порог: {self.effective_audio_threshold:.4f}")
+    
+    def finish_balance_check(self, timestamp, volume, wall_time, accepted):
+        """Решение по звуку, удержанному для проверки баланса каналов"""
+        if accepted:
+            self.publish_detection(timestamp, volume, wall_time)
+            return
+        balance, jitter = self.balance_gate.last
+        center, tolerance = self.balance_gate.reference()
+        self.metrics.increment('balance_rejections')
+        self.log_message(f"Звук отклонён по балансу каналов: {balance:+.2f} (клев {center:+.2f} ± {tolerance:.2f}), "
+                         f"разброс {jitter:.2f}")
+    
+    def rebind_audio_source(self, source, stop_event):
+        """Поиск новой аудио сессии и переключение источника без остановки бота"""
+        binding = self.discovery.session_lost()
+        try:
+            while self.running and not stop_event.is_set():
+                result = self.try_rebind_audio_source(source, binding)
+                if result is not None:
+                    return result
                 
-            except Exception as e:
-                self.log_message(f"Ошибка при ожидании клева: {e}")
+                stop_event.wait(SESSION_RETRY_INTERVAL)
+                binding = self.discovery.ensure_bound()
+            return False
+        finally:
+            self.rebinding = False
+    
+    def try_rebind_audio_source(self, source, binding):
+        """Одна попытка переключить источник на сессию из binding
+        
+        True - источник восстановлен, False - источник не умеет переподключаться,
+        None - сессии пока нет, нужно повторить позже.
+        """
+        # Пока ждём сессию, супервизор не считает поток аудио зависшим
+        self.rebinding = True
+        if binding is None or binding.session is None:
+            return None
+        try:
+            if not source.rebind(binding.session):
+                self.rebinding = False
                 return False
+        except Exception as e:
+            logger.info(f"Не удалось подключиться к аудио сессии: {e}")
+            self.discovery.session_lost()
+            return None
         
-        return False
+        self.rebinding = False
+        self.update_binding(binding)
+        stats = self.discovery.stats()
+        self.log_message(f"Аудио сессия VRChat восстановлена "
+                         f"(переподключений: {stats['rebinds']}, "
+                         f"простой: {stats['downtime']:.1f}с)")
+        return True
     
-    def reel_in_fish(self):
-        """Подсечка и вытаскивание рыбы"""
-        self.log_message("Начинаю подсечку...")
-        self.status_var.set("Подсекаю рыбу...")
-        
-        # Начинаем удерживать E
-        if not self.activate_vrchat_window():
-            return False
-        
-        # Нажимаем и удерживаем E
-        win32api.keybd_event(self.VK_E, 0, 0, 0)
-        
-        start_time = time.time()
-        last_sound_time = time.time()  # Время последнего обнаруженного звука
-        music_playing = False
-        fish_caught = False
-        
-        self.log_message(f"Слушаю музыку подсечки... (порог: {self.music_threshold:.3f}, доп. время: {self.additional_wait:.1f}с)")
-        
-        while self.running and not self.paused:
-            elapsed = time.time() - start_time
+    @property
+    def bite_event_kind(self):
+        """Тип события, которое считается клевом при текущем детекторе"""
+        return 'spectral_bite' if self.bite_detector == "spectral" else 'sound_detected'
+    
+    def create_spectral_detector(self):
+        """Источник PCM и спектральный детектор по шаблонам из настроек"""
+        templates = [SpectralTemplate.load(self.spectral_bite_template)]
+        templates[0].name = 'bite'
+        if self.spectral_music_template:
+            templates.append(SpectralTemplate.load(self.spectral_music_template))
+            templates[-1].name = 'music'
+        check_templates(templates)
+        
+        template = templates[0]
+        if self.spectral_input_device is None:
+            source = LoopbackPcmSource(template.sample_rate, self.chunk_size)
+            self.log_message(f"Захват звука вывода: {source.device_name}")
+        else:
+            source = PyAudioPcmSource(self.spectral_input_device, template.sample_rate, self.chunk_size)
+        detector = SpectralDetector(templates, template.sample_rate, template.frame_size,
+                                    template.hop, self.spectral_similarity,
+                                    cooldown=self.spike_cooldown)
+        return source, detector
+    
+    def publish_spectral_matches(self, matches):
+        """Публикация совпадений спектрального детектора как событий"""
+        for _, name, score in matches:
+            kind = 'spectral_bite' if name == 'bite' else 'spectral_music'
+            now = self.clock()
+            self.events.publish(kind, score, now, now)
+            logger.info(f"Спектральное совпадение '{name}': сходство {score:.3f}")
+    
+    def start_spectral_monitoring(self, stop_event):
+        """Спектральное обнаружение клева и музыки по PCM потоку"""
+        try:
+            source, detector = self.create_spectral_detector()
             
-            # Проверяем, прошло ли минимальное время
-            if elapsed >= self.min_reel_time:
-                # Обрабатываем ВСЕ события в очереди
-                current_volume = 0.0
-                events_to_process = []
-                
-                while True:
-                    try:
-                        event = self.audio_queue.get_nowait()
-                        events_to_process.append(event)
-                    except queue.Empty:
-                        break
-                
-                # Проверяем текущую громкость
-                for event, volume in events_to_process:
-                    if event == 'volume_update':
-                        current_volume = volume
-                    elif event == 'sound_detected':
-                        # Звук обнаружен - если это громкая музыка, обновляем время
-                        if volume > self.music_threshold:
-                            last_sound_time = time.time()
-                            music_playing = True
-                            self.log_message(f"Музыка играет! Громкость: {volume:.3f}")
-                
-                # Проверяем, играет ли музыка (громкость выше порога музыки)
-                if current_volume > self.music_threshold:
-                    last_sound_time = time.time()
-                    if not music_playing:
-                        music_playing = True
-                        self.log_message("Музыка началась - продолжаю подсечку")
-                
-                # Если музыка играла и прошло больше дополнительного времени после её окончания
-                time_since_last_sound = time.time() - last_sound_time
-                
-                if music_playing and time_since_last_sound > self.additional_wait:
-                    self.log_message(f"Музыка закончилась {time_since_last_sound:.1f} сек назад - завершаю подсечку")
-                    fish_caught = True
+            self.log_message("Запущен спектральный детектор клева")
+            
+            completed = True
+            while self.running and not stop_event.is_set():
+                try:
+                    self.publish_spectral_matches(detector.process(source.read()))
+                except Exception as e:
+                    if self.running:
+                        self.log_message(f"Ошибка спектрального анализа: {e}")
+                        completed = False
                     break
-                
-                # Обновляем статус
-                if music_playing:
-                    if time_since_last_sound < self.additional_wait:
-                        self.status_var.set(f"Музыка играет... ({time_since_last_sound:.1f}с)")
-                    else:
-                        self.status_var.set(f"Ожидание завершения... ({time_since_last_sound:.1f}/{self.additional_wait}с)")
             
-            # Таймаут для подсечки (максимум 120 секунд на всякий случай)
-            if elapsed > 120:
-                self.log_message("Таймаут подсечки (120 сек)")
-                break
+            source.close()
+            self.log_message("Спектральный детектор остановлен")
+            return completed
             
-            time.sleep(0.1)
-        
-        # Отпускаем клавишу E
-        win32api.keybd_event(self.VK_E, 0, self.KEYEVENTF_KEYUP, 0)
-        
-        # Очищаем очередь после завершения
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
-        
-        if fish_caught:
-            self.log_message(f"Рыба успешно поймана за {elapsed:.1f} секунд")
-        else:
-            self.log_message("Подсечка завершена без результата")
+        except Exception as e:
+            self.log_message(f"Ошибка инициализации спектрального детектора: {e}")
+            return False
+    
+    @property
+    def input_available(self):
+        """Работает ли источник громкости (без супервизора считается, что да)"""
+        return self.supervisor is None or self.supervisor.input_ready.is_set()
+    
+    def wait_for_input(self, stop_event):
+        """Пауза цикла, пока мониторинг аудио перезапускается"""
+        if self.input_available:
+            return True
         
-        return fish_caught
+        self.set_phase(PHASE_IDLE)
+        self.log_message("Нет данных о звуке, цикл приостановлен до восстановления мониторинга")
+        self.set_status("Жду восстановления аудио...")
+        while self.running and not stop_event.is_set():
+            if self.supervisor.input_ready.wait(timeout=0.5):
+                return self.running
+        return False
     
-    def fishing_cycle(self):
-        """Основной цикл рыбалки"""
+    def fishing_cycle(self, stop_event):
+        """Основной цикл рыбалки: один поток ведёт автомат состояний по событиям, отсчётам и таймерам"""
         self.log_message("Запущен цикл рыбалки")
         
-        cycle_count = 0
+        self.bite_events = self.events.subscribe()
+        machine = self.machine = FishingStateMachine(self, self.clock)
+        machine.transition_listeners.extend(self.transition_listeners)
+        transition_log = None
+        if self.transitions_file:
+            transition_log = TransitionFileLog(self.transitions_file)
+            machine.transition_listeners.append(transition_log.write)
+        sample_seq = self.samples.count
         
-        while self.running:
-            if self.paused:
-                time.sleep(1)
-                continue
-            
+        while self.running and not stop_event.is_set():
             try:
-                cycle_count += 1
-                self.log_message(f"=== Цикл рыбалки #{cycle_count} ===")
-                
-                # 1. Заброс удочки
-                if not self.cast_fishing_line():
-                    self.log_message("Ошибка заброса, пропускаю цикл")
-                    time.sleep(5)
+                if self.paused:
+                    machine.stop("пауза")
+                    stop_event.wait(1)
                     continue
                 
-                # Небольшая пауза после заброса
-                time.sleep(1)
+                if not self.input_available:
+                    machine.stop("нет данных о звуке")
+                    if not self.wait_for_input(stop_event):
+                        continue
                 
-                # 2. Ожидание клева
-                if not self.wait_for_bite():
-                    self.log_message("Клев не обнаружен, повторяю заброс")
-                    continue
+                if machine.state == STATE_IDLE:
+                    sample_seq = self.samples.count
+                    machine.start_cycle()
                 
-                # 3. Подсечка и вытаскивание
-                self.reel_in_fish()
+                # Спим до ближайшего таймера, события детектора или нового отсчёта;
+                # ограничение нужно только для проверки остановки и паузы
+                timeout = machine.timers.time_until_next(MACHINE_MAX_WAIT)
+                if self.sleep is not None:
+                    self.sleep(timeout)
+                    events = self.bite_events.drain()
+                elif machine.needs_samples:
+                    self.samples.wait_for_samples(sample_seq, timeout)
+                    events = self.bite_events.drain()
+                else:
+                    event = self.bite_events.wait(timeout)
+                    events = [event] + self.bite_events.drain() if event is not None else []
                 
-                # Пауза между циклами
-                self.log_message("Пауза перед следующим циклом...")
-                time.sleep(3)
+                sample_seq = self.feed_machine(machine, events, sample_seq)
                 
             except Exception as e:
                 self.log_message(f"Ошибка в цикле рыбалки: {e}")
-                time.sleep(5)
-        
+                machine.stop("ошибка")
+                stop_event.wait(5)
+        
+        machine.stop("остановка")
+        if transition_log is not None:
+            transition_log.close()
+        self.bite_events.close()
+        self.log_run_summary()
         self.log_message("Цикл рыбалки завершен")
+        return True
+    
+    def log_run_summary(self):
+        """Итоги запуска: улов, реакция, активации окна, переподключения и перезапуски"""
+        self.write_metrics_snapshot()
+        self.log_message(f"Рыбы в час: {self.metrics.fish_per_hour():.1f} "
+                         f"(поймано {self.metrics.counters['catches']} за {self.metrics.counters['cycles']} циклов)")
+        stats = self.reaction_stats.summary()
+        if stats['count']:
+            self.log_message(f"Реакция на клев: {stats['count']} подсечек, медиана {stats['median'] * 1000:.0f} мс, "
+                             f"p95 {stats['p95'] * 1000:.0f} мс, макс. {stats['max'] * 1000:.0f} мс")
+        if self.bite_events is not None and self.bite_events.dropped:
+            self.log_message(f"Потеряно событий детектора из-за переполнения очереди: {self.bite_events.dropped}")
+        counters = self.metrics.counters
+        if counters['music_end_predictions']:
+            self.log_message(f"Предсказание конца музыки: {counters['music_end_predictions']} подсечек, "
+                             f"сэкономлено {counters['music_end_saved_seconds']:.1f}с, "
+                             f"ошибок на проверочных подсечках {counters['music_end_mispredictions']}")
+        self.log_message(f"Активаций окна VRChat: {self.injector.activations}, "
+                         f"окно уже было активным: {self.injector.foreground_hits}")
+        if self.discovery is not None:
+            stats = self.discovery.stats()
+            self.log_message(f"Переподключений к VRChat: {stats['rebinds']}, "
+                             f"время без аудио сессии: {stats['downtime']:.1f}с")
+        if self.supervisor is not None:
+            stats = self.supervisor.stats()
+            for name, worker in stats['workers'].items():
+                if worker['restarts']:
+                    self.log_message(f"Поток {name}: перезапусков {worker['restarts']}, "
+                                     f"сбоев {worker['failures']}, зависаний {worker['stalls']}")
+            self.log_message(f"Время без данных о звуке: {stats['unavailable']:.1f}с")
+    
+    def feed_machine(self, machine, events, sample_seq):
+        """Передача автомату событий, отсчётов новее sample_seq и наступивших таймеров"""
+        for event in events:
+            machine.handle_event(event)
+        timestamps, values, sample_seq = self.samples.read_since(sample_seq)
+        machine.handle_samples(timestamps, values)
+        machine.timers.run_due()
+        return sample_seq
+    
+    def report_transition_savings(self):
+        """Учёт секунд, сэкономленных переходами по звуку в завершённом цикле (за вычетом повторных забросов)"""
+        self.metrics.increment('saved_seconds', self.cycle_saved)
+        cycles = self.metrics.counters['cycles']
+        if self.audio_transitions and cycles:
+            average = self.metrics.counters['saved_seconds'] / cycles
+            self.log_message(f"Переходы по звуку сэкономили {self.cycle_saved:.1f}с "
+                             f"(в среднем {average:.1f}с за цикл)")
+        self.cycle_saved = 0.0
+    
+    def report_music_end_savings(self, saved):
+        """Учёт секунд, сэкономленных предсказанием конца музыки в завершённой подсечке"""
+        if saved <= 0:
+            return
+        self.metrics.increment('music_end_predictions')
+        self.metrics.increment('music_end_saved_seconds', saved)
+        average = self.metrics.counters['music_end_saved_seconds'] / self.metrics.counters['catches']
+        self.log_message(f"Предсказание конца музыки сэкономило {saved:.1f}с "
+                         f"(в среднем {average:.1f}с за улов)")
+    
+    def write_metrics_snapshot(self):
+        """Запись JSON снимка метрик, если файл задан в настройках"""
+        if not self.metrics_file:
+            return
+        try:
+            self.metrics.write_snapshot(self.metrics_file)
+        except Exception as e:
+            logger.warning(f"Не удалось записать метрики: {e}")
     
     def start_bot(self):
-        """Запуск бота"""
-        # Обновляем настройки из GUI
-        self.cast_duration = self.cast_duration_var.get()
-        self.min_reel_time = self.min_reel_time_var.get()
-        self.audio_threshold = self.audio_threshold_var.get()
-        self.music_threshold = self.music_threshold_var.get()
-        self.additional_wait = self.additional_wait_var.get()
-        self.cooldown_after_cast = self.cooldown_after_cast_var.get()
-        self.spike_cooldown = self.spike_cooldown_var.get()
-        self.smoothing_alpha = self.smoothing_alpha_var.get()
-        
+        """Запуск бота, возвращает False, если VRChat не найден"""
         # Автоматически сохраняем настройки при запуске
         self.save_settings()
         
+        if self.injector is None:
+            self.injector = Win32KeyInjector()
+        
         # Проверяем наличие VRChat
         if not self.find_vrchat_window():
-            messagebox.showerror("Ошибка", "VRChat не найден! Убедитесь, что игра запущена.")
-            return
+            self.log_message("VRChat не найден! Убедитесь, что игра запущена.")
+            return False
         
         self.running = True
         self.paused = False
+        self.metrics = CycleMetrics(self.clock)
+        
+        if self.metrics_port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+                self.metrics_server.start()
+                self.log_message(f"Метрики: http://127.0.0.1:{self.metrics_server.port}/metrics")
+            except Exception as e:
+                self.metrics_server = None
+                self.log_message(f"Не удалось запустить сервер метрик: {e}")
+        
+        if self.meter_recording_dir:
+            self.recorder = MeterRecorder(self.meter_recording_dir, clock=self.clock)
+            self.recorder.start()
+            self.log_message(f"Запись сигнала в каталог {self.meter_recording_dir}")
+        
+        if self.runtime == "asyncio":
+            # Опрос, детекция, автомат и ввод в одном цикле событий
+            self.supervisor = None
+            self.async_runtime = AsyncFishingRuntime(self)
+            self.async_runtime.start()
+            self.mark_started()
+            return True
         
-        # Запускаем поток мониторинга аудио
-        self.audio_thread = threading.Thread(target=self.start_audio_monitoring, daemon=True)
-        self.audio_thread.start()
+        # Супервизор перезапускает упавшие и зависшие потоки
+        self.supervisor = Supervisor(on_log=self.log_message)
         
-        # Запускаем основной поток бота
-        self.bot_thread = threading.Thread(target=self.fishing_cycle, daemon=True)
-        self.bot_thread.start()
+        # Поток мониторинга аудио: зависшим считается, если нет новых отсчётов
+        # и он не ждёт переподключения к аудио сессии
+        self.supervisor.add(SupervisedWorker("audio", self.start_audio_monitoring,
+                                             progress=lambda: None if self.rebinding else self.samples.count,
+                                             stall_timeout=self.audio_stall_timeout,
+                                             required=True))
         
-        # Запускаем обработку очереди визуализации
-        self.process_audio_queue()
+        # Спектральный детектор работает параллельно с пиковым индикатором
+        if self.bite_detector == "spectral":
+            self.supervisor.add(SupervisedWorker("spectral", self.start_spectral_monitoring,
+                                                 required=True))
         
-        # Обновляем интерфейс
-        self.start_button.config(state="disabled")
-        self.stop_button.config(state="normal")
-        self.status_var.set("Бот запущен")
+        # Основной поток бота
+        self.supervisor.add(SupervisedWorker("fishing", self.fishing_cycle))
+        self.supervisor.start()
         
-        self.log_message("Бот запущен!")
+        self.mark_started()
+        return True
     
-    def process_audio_queue(self):
-        """Обработка очереди аудио событий в главном потоке GUI"""
-        try:
-            # Обрабатываем только события volume_update для визуализации
-            # События sound_detected обрабатываются в потоке бота
-            processed_count = 0
-            max_process = 10  # Ограничим количество за один вызов
-            
-            while not self.audio_queue.empty() and processed_count < max_process:
-                try:
-                    event, value = self.audio_queue.get_nowait()
-                    
-                    if event == 'volume_update':
-                        # Обновляем визуализацию
-                        self.update_volume_visualization(value)
-                        processed_count += 1
-                    else:
-                        # Возвращаем событие sound_detected обратно в очередь
-                        # для обработки в потоке бота
-                        self.audio_queue.put((event, value))
-                        break
-                        
-                except queue.Empty:
-                    break
-                    
-        except Exception as e:
-            logger.error(f"Ошибка обработки очереди: {e}")
+    def mark_started(self):
+        """Уведомление слушателей о запуске"""
+        self.state.set_running(True)
+        for listener in self.listeners:
+            listener.on_running_changed(True)
+        self.set_status("Бот запущен")
         
-        # Продолжаем обработку, если бот работает
-        if self.running:
-            self.root.after(50, self.process_audio_queue)  # Каждые 50мс
+        self.log_message("Бот запущен!")
     
     def stop_bot(self):
         """Остановка бота"""
         self.running = False
         self.paused = False
         
-        # Ждем завершения потоков
-        if self.audio_thread and self.audio_thread.is_alive():
-            self.audio_thread.join(timeout=2)
+        # Будим поток рыбалки, ожидающий событие
+        if self.bite_events:
+            self.bite_events.wake()
         
-        if self.bot_thread and self.bot_thread.is_alive():
-            self.bot_thread.join(timeout=2)
+        # Останавливаем потоки и ждем их завершения
+        if self.supervisor is not None:
+            self.supervisor.stop(timeout=2)
         
-        # Обновляем интерфейс
-        self.start_button.config(state="normal")
-        self.stop_button.config(state="disabled")
-        self.status_var.set("Бот остановлен")
+        if self.async_runtime is not None:
+            self.async_runtime.stop(timeout=2)
+            self.async_runtime = None
         
-        self.log_message("Бот остановлен!")
-    
-    def run(self):
-        """Запуск приложения"""
-        self.log_message("VRChat Fishing Bot готов к работе")
-        self.log_message("Убедитесь, что VRChat запущен и находится в режиме рыбалки")
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        
+        if self.recorder is not None:
+            self.recorder.stop()
+            stats = self.recorder.stats()
+            self.log_message(f"Записано отсчётов сигнала: {stats['written']} в {stats['files']} файл(ах), "
+                             f"потеряно: {stats['dropped']}")
+            self.recorder = None
         
-        # Обработка закрытия окна
-        def on_closing():
-            if self.running:
-                self.stop_bot()
-            self.root.destroy()
+        self.state.set_running(False)
+        for listener in self.listeners:
+            listener.on_running_changed(False)
+        self.set_status("Бот остановлен")
         
-        self.root.protocol("WM_DELETE_WINDOW", on_closing)
-        self.root.mainloop()
+        self.log_message("Бот остановлен!")
+    
+class JsonLinesReporter:
+    """Вывод статуса и лога в поток в формате JSON lines (для работы без GUI)"""
+    
+    def __init__(self, stream, instance=None, lock=None):
+        self.stream = stream
+        self.instance = instance  # Имя клиента при нескольких клиентах в одном процессе
+        self.lock = lock or threading.Lock()
+    
+    def write(self, record):
+        record['time'] = time.time()
+        if self.instance is not None:
+            record['instance'] = self.instance
+        with self.lock:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.stream.flush()
+    
+    def on_log(self, timestamp, message):
+        self.write({'type': 'log', 'message': message})
+    
+    def on_status(self, status):
+        self.write({'type': 'status', 'status': status})
+    
+    def on_running_changed(self, running):
+        self.write({'type': 'running', 'running': running})
+
+
+def run_headless(bot):
+    """Работа без GUI до Ctrl+C или SIGTERM, возвращает код выхода"""
+    bot.add_listener(JsonLinesReporter(sys.stdout))
+    
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_requested.set())
+    
+    if not bot.start_bot():
+        return 1
+    
+    try:
+        while bot.running and not stop_requested.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    
+    bot.stop_bot()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VRChat Fishing Bot")
+    parser.add_argument("--headless", action="store_true",
+                        help="Работа без GUI, статус и лог в stdout в формате JSON lines")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="Файл настроек")
+    args = parser.parse_args()
+    
+    bot = VRChatFishingBot(args.settings)
+    
+    # Запись в файл идёт в фоновом потоке, потоки бота не ждут диск
+    log_listener = start_file_logging(bot.log_file) if bot.log_file else None
+    try:
+        if args.headless:
+            sys.exit(run_headless(bot))
+        
+        # GUI импортируется только при необходимости, чтобы режим без GUI не зависел от Tk
+        from bot_gui import FishingBotGUI
+        FishingBotGUI(bot).run()
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
 
 if __name__ == "__main__":
     try:
-        bot = VRChatFishingBot()
-        bot.run()
+        main()
     except KeyboardInterrupt:
         print("Программа прервана пользователем")
     except Exception as e:
         print(f"Критическая ошибка: {e}")
-        input("Нажмите Enter для выхода...")
\ No newline at end of file
+        input("Нажмите Enter для выхода...")